@@ -64,6 +64,7 @@ def main():
     parser = argparse.ArgumentParser(description='ODD TTS Application')
     parser.add_argument('--host', type=str, default=None, help='Host address (default: from config)')
     parser.add_argument('--port', type=int, default=None, help='Port number (default: from config)')
+    parser.add_argument('--server-mode', type=str, default=None, choices=['wsgi', 'asgi'], help='Server mode (default: from config)')
     
     args = parser.parse_args()
     
@@ -86,14 +87,22 @@ O   O  d   d  d   d  M   M  e        t    a     a
 
         host = args.host if args.host else config.HOST
         port = args.port if args.port else config.PORT
+        server_mode = args.server_mode if args.server_mode else config.SERVER_MODE
 
-        print(f"Running TTS engine: {config.oddtts_cfg['tts_type'].name}")
+        print(f"Running TTS engine: {config.oddtts_cfg['tts_type'].name}, server mode: {server_mode}")
         print(f"Visit Web interface: http://{host}:{port}/")
 
         # 1. 设置 Hugging Face 镜像地址 (国内用户推荐)
         os.environ['HF_ENDPOINT'] = 'https://hf-mirror.com'
 
-        app.run(host=host, port=port, debug=config.Debug)
+        if server_mode == "asgi":
+            import uvicorn
+            from oddtts.oddtts_asgi import app as asgi_app
+            uvicorn.run(asgi_app, host=host, port=port, log_level="debug" if config.Debug else "info")
+        else:
+            from oddtts.oddtts import schedule_startup
+            schedule_startup()
+            app.run(host=host, port=port, debug=config.Debug)
     except Exception as e:
         print(f"Failed to start application: {e}")
         sys.exit(1)
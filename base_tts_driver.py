@@ -1,18 +1,53 @@
 from abc import ABC, abstractmethod
+import asyncio
+import importlib
 import logging
+import os
+import time
 
+import oddtts.oddtts_config as config
 from oddtts.oddtts_params import ODDTTS_TYPE, TTSParams
-
-from oddtts.tts_edge import EdgeTTSAPI
-from oddtts.tts_bert_vits2 import BertVits2API
-from oddtts.tts_bert_vits2_v2 import BertVits2V2API
-from oddtts.tts_odd_gptsovits import OddGptSovitsAPI
-from oddtts.tts_chattts import ChatTTSAPI
-from oddtts.tts_kokoro import KokoroAPI
-from oddtts.tts_kokoro_v11 import KokoroAPIV11
+from oddtts.oddtts_cache import SynthesisCache, create_synthesis_cache, make_cache_key, STREAM_CHUNK_SIZE
+from oddtts.oddtts_encoder import finalize_stream
+from oddtts.oddtts_runtime import run_blocking, get_inference_pool, get_cancellation_stats, InferenceBusyError
+from oddtts.oddtts_singleflight import SingleFlight
+from oddtts.oddtts_store import get_output_store
 
 logger = logging.getLogger(__name__)
 
+# 引擎类型 -> (模块, 类名)，选用时才导入对应模块，
+# 例如只用 EdgeTTS 时不会导入 torch/kokoro
+TTS_DRIVERS = {
+    ODDTTS_TYPE.ODDTTS_EDGETTS: ("oddtts.tts_edge", "EdgeTTSAPI"),
+    ODDTTS_TYPE.ODDTTS_CHATTTS: ("oddtts.tts_chattts", "ChatTTSAPI"),
+    ODDTTS_TYPE.ODDTTS_BERTVITS2: ("oddtts.tts_bert_vits2", "BertVits2API"),
+    ODDTTS_TYPE.ODDTTS_BERTVITS2_V2: ("oddtts.tts_bert_vits2_v2", "BertVits2V2API"),
+    ODDTTS_TYPE.ODDTTS_GPTSOVITS: ("oddtts.tts_odd_gptsovits", "OddGptSovitsAPI"),
+    ODDTTS_TYPE.ODDTTS_KOKORO: ("oddtts.tts_kokoro", "KokoroAPI"),
+    ODDTTS_TYPE.ODDTTS_KOKORO_V1_1: ("oddtts.tts_kokoro_v11", "KokoroAPIV11"),
+}
+
+
+def load_driver_class(type: ODDTTS_TYPE):
+    '''导入并返回引擎对应的驱动类，未知类型默认使用 EdgeTTS'''
+    module_name, class_name = TTS_DRIVERS.get(type, TTS_DRIVERS[ODDTTS_TYPE.ODDTTS_EDGETTS])
+    start_time = time.time()
+    module = importlib.import_module(module_name)
+    logger.debug(f"[系统] 加载TTS引擎模块 - 模块: {module_name}, 耗时: {time.time() - start_time:.3f}秒")
+    return getattr(module, class_name)
+
+
+def _read_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _write_temp_file(data: bytes, suffix: str) -> str:
+    path = get_output_store().new_path(suffix)
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
+
 class BaseTTS(ABC):
     '''合成语音统一抽象类'''
 
@@ -35,11 +70,61 @@ class BaseTTS(ABC):
         async for chunk in self.client.generate_tts_stream(text=text, tts_params=tts_params):
             yield chunk
 
+    def start_inference_processes(self, num_processes: int) -> bool:
+        '''启动预派生推理进程，引擎不支持时返回False'''
+        if not hasattr(self.client, "start_inference_processes"):
+            return False
+        self.client.start_inference_processes(num_processes)
+        return True
+
+    def preload(self) -> bool:
+        '''启动时加载模型，引擎不需要加载本地模型时返回False'''
+        if not hasattr(self.client, "preload"):
+            return False
+        self.client.preload()
+        return True
+
+    def stream_encoded(self) -> bool:
+        '''流式输出由流式编码器按请求的格式编码，拼接后即为完整音频；其他引擎的流式输出可能是引擎的原始格式'''
+        return getattr(self.client, "stream_encoded", False)
+
+    def has_inference_processes(self) -> bool:
+        '''已启动预派生推理进程，各推理进程在初始化时各自预热'''
+        return getattr(self.client, "process_pool", None) is not None
+
+    def is_ready(self) -> bool:
+        if not hasattr(self.client, "is_ready"):
+            return True
+        return self.client.is_ready()
+
+    def is_busy(self) -> bool:
+        '''引擎使用的推理队列（线程池或预派生进程池）已满，不使用本地推理的引擎总是返回False'''
+        if not hasattr(self.client, "is_busy"):
+            return False
+        return self.client.is_busy()
+
+    def inference_workers(self) -> int:
+        '''引擎可同时执行的推理任务数（推理线程数或预派生进程数）'''
+        if not hasattr(self.client, "inference_workers"):
+            return get_inference_pool().max_workers
+        return self.client.inference_workers()
+
+    def g2p_cache_stats(self) -> dict:
+        if not hasattr(self.client, "g2p_cache_stats"):
+            return None
+        return self.client.g2p_cache_stats()
+
 class OddTTSDriver:
     '''TTS驱动类'''
-    def __init__(self, type: ODDTTS_TYPE):
+    def __init__(self, type: ODDTTS_TYPE, cache: SynthesisCache = None):
         self.strategies: dict[ODDTTS_TYPE, BaseTTS] = {}
         self.tts = self.get_strategy(type)
+        self.cache = cache if cache is not None else create_synthesis_cache(config.cache_cfg, config.redis_cfg)
+        # 相同参数的并发请求合并为一次合成
+        self.single_flight = SingleFlight()
+        # 启动状态: starting -> ready / failed
+        self.state = "starting"
+        self.state_error = None
 
     async def get_voices(self, type: ODDTTS_TYPE) -> list[dict[str, str]]:
         if self.tts is None:
@@ -50,46 +135,203 @@ class OddTTSDriver:
     async def generate_tts_file(self, type: ODDTTS_TYPE, text: str, tts_params: TTSParams) -> list[str]:
         if self.tts is None:
             self.tts = self.get_strategy(type)
-        return await self.tts.generate_tts_file(text=text, tts_params=tts_params)
+        key = make_cache_key(type, text, tts_params)
+        return await self.single_flight.do(key, lambda: self._generate_tts_file(key, text, tts_params))
+
+    async def _generate_tts_file(self, key: str, text: str, tts_params: TTSParams) -> str:
+        if self.cache is None:
+            return await self.tts.generate_tts_file(text=text, tts_params=tts_params)
+
+        audio_bytes = await self.cache.get(key)
+        if audio_bytes is not None:
+            return await run_blocking(_write_temp_file, audio_bytes, tts_params.response_format)
+
+        async with self.cache.single_flight(key) as audio_bytes:
+            if audio_bytes is not None:
+                return await run_blocking(_write_temp_file, audio_bytes, tts_params.response_format)
+
+            audio_path = await self.tts.generate_tts_file(text=text, tts_params=tts_params)
+            if isinstance(audio_path, str) and os.path.isfile(audio_path):
+                await self.cache.put(key, await run_blocking(_read_file, audio_path))
+            return audio_path
 
     async def generate_tts_bytes(self, type: ODDTTS_TYPE, text: str, tts_params: TTSParams) -> bytes:
         if self.tts is None:
             self.tts = self.get_strategy(type)
-        return await self.tts.generate_tts_bytes(text=text, tts_params=tts_params)
+        key = make_cache_key(type, text, tts_params)
+        return await self.single_flight.do(key, lambda: self._generate_tts_bytes(key, text, tts_params))
+
+    async def _generate_tts_bytes(self, key: str, text: str, tts_params: TTSParams) -> bytes:
+        if self.cache is None:
+            return await self.tts.generate_tts_bytes(text=text, tts_params=tts_params)
+
+        audio_bytes = await self.cache.get(key)
+        if audio_bytes is not None:
+            return audio_bytes
+
+        async with self.cache.single_flight(key) as audio_bytes:
+            if audio_bytes is not None:
+                return audio_bytes
+
+            audio_bytes = await self.tts.generate_tts_bytes(text=text, tts_params=tts_params)
+            if isinstance(audio_bytes, (bytes, bytearray)):
+                await self.cache.put(key, bytes(audio_bytes))
+            return audio_bytes
     
     async def generate_tts_stream(self, type: ODDTTS_TYPE, text: str, tts_params: TTSParams):
         if self.tts is None:
             self.tts = self.get_strategy(type)
+        key = make_cache_key(type, text, tts_params)
+        stream = self.single_flight.stream(key, lambda: self._generate_tts_stream(key, text, tts_params))
+        try:
+            async for chunk in stream:
+                yield chunk
+        except (GeneratorExit, asyncio.CancelledError):
+            # 客户端断开：离开共享流，没有其他消费者时生产者被取消，剩余句段不再推理
+            get_cancellation_stats().record_stream()
+            logger.info(f"[系统] 客户端已断开，停止合成流 - 文本长度: {len(text)}")
+            raise
+        finally:
+            # 立即关闭内层生成器，不等垃圾回收时才由事件循环异步关闭
+            await stream.aclose()
+
+    async def _generate_tts_stream(self, key: str, text: str, tts_params: TTSParams):
+        if self.cache is None:
+            async for chunk in self.tts.generate_tts_stream(text=text, tts_params=tts_params):
+                yield chunk
+            return
+
+        audio_bytes = await self.cache.get(key)
+        if audio_bytes is not None:
+            for i in range(0, len(audio_bytes), STREAM_CHUNK_SIZE):
+                yield audio_bytes[i:i + STREAM_CHUNK_SIZE]
+            return
 
+        # 边转发边收集，完整生成后整理成完整音频写入缓存，供字节/文件接口共用；
+        # 超过内存缓存上限或不能代替完整音频的结果不缓存
+        chunks = [] if self.tts.stream_encoded() else None
+        total = 0
         async for chunk in self.tts.generate_tts_stream(text=text, tts_params=tts_params):
+            if chunks is not None:
+                chunks.append(chunk)
+                total += len(chunk)
+                if total > self.cache.memory.max_bytes:
+                    chunks = None
             yield chunk
 
+        audio_bytes = finalize_stream(tts_params.response_format, b"".join(chunks)) if chunks is not None else None
+        if audio_bytes is not None:
+            await self.cache.put(key, audio_bytes)
+
+    async def generate_tts_batch(self, type: ODDTTS_TYPE, items: list[tuple[str, TTSParams]], concurrency: int = 0, busy_timeout: float = 60):
+        '''
+        批量合成，按完成顺序产出 (序号, 音频字节)，失败的条目产出 (序号, 异常)
+
+        最多 concurrency 个条目同时合成，并且不超过推理线程数/进程数的一半（0 表示取这个上限），其余容量留给在线请求。
+        条目按音色排序后依次取出，只是让同时进行的条目尽量使用同一个音色，模型调用并不会合并成批。
+
+        推理队列已满时等待后重试：准入检查只在条目开始合成时进行一次，已准入条目的句段推理只排队不会被拒绝，
+        因此重试的只是尚未开始的条目，不会重复合成已经完成的句段。
+        一个条目持续 busy_timeout 秒仍未被准入时不再重试，以 InferenceBusyError 作为该条目的结果，
+        避免推理队列长期被在线请求占满时整个任务一直挂起
+        '''
+        if self.tts is None:
+            self.tts = self.get_strategy(type)
+
+        limit = max(1, self.tts.inference_workers() // 2)
+        concurrency = min(concurrency, limit) if concurrency > 0 else limit
+        pending = asyncio.Queue()
+        for index in sorted(range(len(items)), key=lambda i: (items[i][1].voice, i)):
+            pending.put_nowait(index)
+        finished = asyncio.Queue()
+
+        async def worker():
+            while not pending.empty():
+                index = pending.get_nowait()
+                text, tts_params = items[index]
+                deadline = time.monotonic() + busy_timeout
+                while True:
+                    try:
+                        result = await self.generate_tts_bytes(type, text, tts_params)
+                        break
+                    except InferenceBusyError as e:
+                        # 条目在准入时被拒绝，尚未提交任何句段
+                        if time.monotonic() >= deadline:
+                            result = e
+                            break
+                        await asyncio.sleep(0.5)
+                    except Exception as e:
+                        result = e
+                        break
+                await finished.put((index, result))
+
+        workers = [asyncio.ensure_future(worker()) for _ in range(min(concurrency, len(items)))]
+        try:
+            for _ in range(len(items)):
+                yield await finished.get()
+        finally:
+            for task in workers:
+                task.cancel()
+
+    def cache_stats(self) -> dict:
+        return self.cache.stats() if self.cache is not None else None
+
+    def single_flight_stats(self) -> dict:
+        return self.single_flight.stats()
+
+    def g2p_cache_stats(self) -> dict:
+        return self.tts.g2p_cache_stats()
+
+    def is_ready(self) -> bool:
+        return self.state == "ready" and self.tts.is_ready()
+
+    def is_busy(self) -> bool:
+        '''推理队列已满，流式接口据此在返回响应前拒绝请求'''
+        return self.tts.is_busy()
+
+    async def startup(self, preload: bool = True, warmup_texts: list[str] = None) -> None:
+        '''
+        启动阶段：加载模型，合成预热文本，完成后才标记为就绪
+        '''
+        start_time = time.time()
+        try:
+            # 预派生模式下模型已在 fork 前加载，预热由各推理进程完成，主进程不再经推理池重复预热
+            if not self.tts.has_inference_processes() and preload and await run_blocking(self.tts.preload):
+                await self.warmup(warmup_texts or [])
+
+            # 预派生推理进程在子进程中各自预热，等待全部就绪
+            while not self.tts.is_ready():
+                await asyncio.sleep(0.1)
+        except Exception as e:
+            self.state = "failed"
+            self.state_error = str(e)
+            logger.error(f"[错误] 启动失败 - 错误信息: {str(e)}")
+            return
+
+        self.state = "ready"
+        logger.info(f"[系统] 启动完成，服务就绪 - 耗时: {time.time() - start_time:.3f}秒")
+
+    async def warmup(self, texts: list[str]) -> None:
+        '''直接调用引擎合成预热文本，不经过缓存'''
+        if not texts:
+            return
+        voices = await self.tts.get_voices()
+        if not voices:
+            return
+        tts_params = TTSParams(voice=voices[0]['name'], rate=0, volume=0, pitch=0, locale=voices[0].get('locale', 'zh-CN'))
+        for text in texts:
+            start_time = time.time()
+            try:
+                await self.tts.generate_tts_bytes(text=text, tts_params=tts_params)
+                logger.info(f"[系统] 预热完成 - 文本长度: {len(text)}, 耗时: {time.time() - start_time:.3f}秒")
+            except Exception as e:
+                logger.warning(f"[系统] 预热失败 - 文本长度: {len(text)}, 错误信息: {str(e)}")
+
+    def start_inference_processes(self, num_processes: int) -> None:
+        if not self.tts.start_inference_processes(num_processes):
+            logger.warning(f"[系统] 当前TTS引擎不支持预派生推理进程，忽略配置 inference_processes={num_processes}")
+
     def get_strategy(self, type: ODDTTS_TYPE) -> BaseTTS:
         tts = BaseTTS()
-        if type == ODDTTS_TYPE.ODDTTS_EDGETTS:
-            tts.client = EdgeTTSAPI()
-            return tts
-        elif type == ODDTTS_TYPE.ODDTTS_CHATTTS:
-            tts.client = ChatTTSAPI()
-            return tts
-        elif type == ODDTTS_TYPE.ODDTTS_BERTVITS2:
-            tts.client = BertVits2API()
-            return tts
-        elif type == ODDTTS_TYPE.ODDTTS_BERTVITS2_V2:
-            tts.client = BertVits2V2API()
-            return tts
-        elif type == ODDTTS_TYPE.ODDTTS_GPTSOVITS:
-            tts.client = OddGptSovitsAPI()
-            return tts
-        elif type == ODDTTS_TYPE.ODDTTS_KOKORO:
-            tts.client = KokoroAPI()
-            return tts
-        elif type == ODDTTS_TYPE.ODDTTS_KOKORO_V1_1:
-            tts.client = KokoroAPIV11()
-            return tts
-        else:
-            #fallback: default use Edge TTS
-            tts.client = EdgeTTSAPI()
-            return tts
-            # raise ValueError("Unknown type")
-
+        tts.client = load_driver_class(type)()
+        return tts
@@ -1,14 +1,24 @@
-import asyncio
+import io
 import os
 import time
+import asyncio
 import logging
+import threading
 from flask import Flask, request, jsonify, send_file, Response, render_template_string
 from flask_cors import CORS
+from werkzeug.exceptions import RequestedRangeNotSatisfiable
 
 import oddtts.oddtts_config as config
 from oddtts.base_tts_driver import OddTTSDriver
+from oddtts.oddtts_base64 import TRANSPORT_MIME_TYPES, encode_base64_stream
+from oddtts.oddtts_batch import BatchJobManager
 from oddtts.oddtts_params import ODDTTS_TYPE, TTSParams
+from oddtts.oddtts_request import RequestError, parse_tts_request, parse_openai_speech, parse_batch_items, check_capacity, request_error, synthesis_error
 from oddtts.router.front import bp as front_bp
+from oddtts.oddtts_encoder import SAMPLE_RATE, audio_mime_type, audio_headers
+from oddtts.oddtts_ffmpeg import get_ffmpeg_pool
+from oddtts.oddtts_store import get_output_store
+from oddtts.oddtts_runtime import run_sync, iterate_sync, get_loop, get_inference_pool, get_cancellation_stats
 
 logging.basicConfig(
     level=logging.DEBUG,
@@ -19,14 +29,25 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
+app.config["USE_X_SENDFILE"] = config.store_cfg.get("x_sendfile", False)
 CORS(app)
 app.register_blueprint(front_bp)
 
 single_tts_driver = OddTTSDriver(config.oddtts_cfg['tts_type'])
+batch_jobs = BatchJobManager(
+    single_tts_driver,
+    output_dir=config.batch_cfg.get("output_dir", ""),
+    concurrency=config.batch_cfg.get("concurrency", 0),
+    job_ttl=config.batch_cfg.get("job_ttl", 24 * 3600),
+    busy_timeout=config.batch_cfg.get("busy_timeout", 60),
+)
 voices = []
 voice_map = {}
 voice_options = []
 voice_short_names = []
+# 后台加载模型和预热的任务，由 schedule_startup 启动
+_startup_future = None
+_startup_lock = threading.Lock()
 
 
 async def get_voices(type: ODDTTS_TYPE):
@@ -48,19 +69,68 @@ async def generate_tts_stream(type: ODDTTS_TYPE, text: str, voice: str, rate: in
     async for chunk in single_tts_driver.generate_tts_stream(type=type, text=text, tts_params=tts_params):
         yield chunk
 
-def load_voices():
+def build_openai_models(type: ODDTTS_TYPE, voice_list: list[dict[str, str]]) -> dict:
+    models = []
+    for v in voice_list:
+        if v.get("name"):
+            models.append({
+                "id": v["name"],
+                "object": "model",
+                "created": 1700000000,
+                "owned_by": "oddtts",
+                "permission": [],
+                "root": v["name"],
+                "parent": None
+            })
+
+    return {
+        "object": "list",
+        "data": models,
+        "model": type.value if hasattr(type, 'value') else str(type)
+    }
+
+async def startup():
+    '''加载语音列表，然后加载模型和预热'''
+    try:
+        await load_voices()
+    except Exception as e:
+        # 语音详情接口在列表为空时会重新加载
+        logger.warning(f"[系统] 语音列表加载失败 - 错误信息: {str(e)}")
+    await single_tts_driver.startup(
+        preload=config.oddtts_cfg.get("preload_model", True),
+        warmup_texts=config.oddtts_cfg.get("warmup_texts", []),
+    )
+
+def schedule_startup():
+    '''
+    在长驻事件循环中启动后台加载模型和预热的任务，完成前 /oddtts/health 返回 503，重复调用无效果
+
+    WSGI 模式由 app.main 在启动服务前调用（后台事件循环），ASGI 模式由 lifespan 在绑定服务器的事件循环后调用；
+    由其他 WSGI 服务器直接加载 app 时在第一个请求到达时启动。
+    导入本模块不启动任何线程或进程，配置了预派生推理进程时在这里 fork，此时还没有启动后台事件循环
+    '''
+    global _startup_future
+    with _startup_lock:
+        if _startup_future is None:
+            if config.oddtts_cfg.get("inference_processes", 0) > 0:
+                single_tts_driver.start_inference_processes(config.oddtts_cfg["inference_processes"])
+            _startup_future = asyncio.run_coroutine_threadsafe(startup(), get_loop())
+    return _startup_future
+
+async def load_voices():
     global voices, voice_map, voice_options
     logger.info("[系统] 开始加载语音列表")
     
-    import asyncio
     type = config.oddtts_cfg["tts_type"]
-    voices = asyncio.run(get_voices(type))
+    voices = await get_voices(type)
     voice_map = {v["name"]: v for v in voices if v.get("name")}
     voice_options = [v["name"] for v in voices if v.get("name")]
     
     logger.info(f"[系统] 语音列表加载完成 - 数量: {len(voices)}, 类型: {type}")
 
-load_voices()
+@app.before_request
+def ensure_startup():
+    schedule_startup()
 
 # 健康检查
 @app.route('/oddtts/health')
@@ -68,13 +138,38 @@ def health_check():
     start_time = time.time()
     logger.info("[请求] 健康检查接口")
     
-    result = jsonify({"status": "healthy", "message": "API服务运行正常"})
+    # 就绪检查：模型加载、预热完成前返回 503，负载均衡不会把请求转发到未就绪的实例
+    if single_tts_driver.is_ready():
+        result = jsonify({"status": "healthy", "message": "API服务运行正常"}), 200
+    elif single_tts_driver.state == "failed":
+        result = jsonify({"status": "failed", "message": f"API服务启动失败: {single_tts_driver.state_error}"}), 503
+    else:
+        result = jsonify({"status": "starting", "message": "API服务正在启动"}), 503
     
     elapsed_time = time.time() - start_time
-    logger.info(f"[响应] 健康检查完成 - 耗时: {elapsed_time:.3f}秒")
+    logger.info(f"[响应] 健康检查完成 - 状态: {single_tts_driver.state}, 耗时: {elapsed_time:.3f}秒")
     
     return result
 
+# 存活检查：进程能响应即返回 200，与是否就绪无关
+@app.route('/oddtts/health/live')
+def liveness_check():
+    return jsonify({"status": "alive"})
+
+# 运行指标
+@app.route('/oddtts/metrics')
+def metrics():
+    return jsonify({
+        "cache": single_tts_driver.cache_stats(),
+        "single_flight": single_tts_driver.single_flight_stats(),
+        "inference_pool": get_inference_pool().stats(),
+        "g2p_cache": single_tts_driver.g2p_cache_stats(),
+        "ffmpeg_pool": get_ffmpeg_pool().stats(),
+        "batch": batch_jobs.stats(),
+        "output_store": get_output_store().stats(),
+        "cancellation": get_cancellation_stats().stats(),
+    })
+
 # 1. 获取语音列表API
 @app.route('/v1/audio/voice/list', methods=['GET'])
 def api_get_voices():
@@ -82,7 +177,7 @@ def api_get_voices():
     logger.info("[请求] 获取语音列表接口")
     
     type = config.oddtts_cfg["tts_type"]
-    voices_list = asyncio.run(get_voices(type))
+    voices_list = run_sync(get_voices(type))
     
     elapsed_time = time.time() - start_time
     logger.info(f"[响应] 获取语音列表完成 - 语音数量: {len(voices_list)}, 耗时: {elapsed_time:.3f}秒")
@@ -97,7 +192,7 @@ def api_get_voice_details(voice_name):
     
     global voices
     if not voices:
-        load_voices()
+        run_sync(load_voices())
     
     for item in voices:
         if item.get("short_name") == voice_name:
@@ -109,36 +204,35 @@ def api_get_voice_details(voice_name):
     logger.warning(f"[响应] 语音未找到 - 语音名称: {voice_name}, 耗时: {elapsed_time:.3f}秒")
     return jsonify({"error": f"Voice '{voice_name}' not found"}), 404
 
+def _reject(e: RequestError, start_time: float):
+    body, status, headers = request_error(e, start_time)
+    return jsonify(body), status, headers
+
+def _failed(e: Exception, action: str, start_time: float):
+    body, status, headers = synthesis_error(e, action, start_time)
+    return jsonify(body), status, headers
+
 # 3. TTS生成API - 返回文件路径
 @app.route('/api/oddtts/file', methods=['POST'])
 def api_tts_file():
     start_time = time.time()
     logger.info("[请求] TTS文件生成接口")
     
-    global voices
-    data = request.json
-    text = data.get("text")
-    voice = data.get("voice")
-    rate = data.get("rate", 0)
-    volume = data.get("volume", 0)
-    pitch = data.get("pitch", 0)
-    locale = data.get("locale", "zh-CN")
-    response_format = data.get("response_format", "wav")
-    
-    logger.info(f"[参数] 文本长度: {len(text) if text else 0}, 语音: {voice}, 语速: {rate}, 音量: {volume}, 音调: {pitch}, 格式: {response_format}")
+    try:
+        req = parse_tts_request(request.get_json(silent=True))
+    except RequestError as e:
+        return _reject(e, start_time)
     
     type = config.oddtts_cfg["tts_type"]
     try:
-        audio_path = asyncio.run(generate_tts_file(type=type, text=text, voice=voice, rate=rate, volume=volume, pitch=pitch, locale=locale, response_format=response_format))
+        audio_path = run_sync(generate_tts_file(type=type, **req.params()))
         
         elapsed_time = time.time() - start_time
-        logger.info(f"[响应] TTS文件生成成功 - 文件路径: {audio_path}, 格式: {response_format}, 耗时: {elapsed_time:.3f}秒")
+        logger.info(f"[响应] TTS文件生成成功 - 文件路径: {audio_path}, 格式: {req.response_format}, 耗时: {elapsed_time:.3f}秒")
         
-        return jsonify({"status": "success", "file_path": audio_path, "format": response_format})
+        return jsonify({"status": "success", "file_path": audio_path, "file_id": get_output_store().file_id(audio_path), "format": req.response_format})
     except Exception as e:
-        elapsed_time = time.time() - start_time
-        logger.error(f"[错误] TTS文件生成失败 - 错误信息: {str(e)}, 耗时: {elapsed_time:.3f}秒")
-        return jsonify({"error": str(e)}), 500
+        return _failed(e, "TTS文件生成", start_time)
 
 # 4. TTS生成API - 返回Base64编码
 @app.route('/api/oddtts/base64', methods=['POST'])
@@ -147,30 +241,47 @@ def api_tts_base64():
     logger.info("[请求] TTS Base64接口")
     
     import base64
-    data = request.json
-    type = config.oddtts_cfg["tts_type"]
-    text = data.get("text")
-    voice = data.get("voice")
-    rate = data.get("rate", 0)
-    volume = data.get("volume", 0)
-    pitch = data.get("pitch", 0)
-    locale = data.get("locale", "zh-CN")
-    response_format = data.get("response_format", "wav")
-    
-    logger.info(f"[参数] 文本长度: {len(text) if text else 0}, 语音: {voice}, 语速: {rate}, 音量: {volume}, 音调: {pitch}, 格式: {response_format}")
+    try:
+        req = parse_tts_request(request.get_json(silent=True))
+    except RequestError as e:
+        return _reject(e, start_time)
     
+    type = config.oddtts_cfg["tts_type"]
     try:
-        audio_bytes = asyncio.run(generate_tts_bytes(type=type, text=text, voice=voice, rate=rate, volume=volume, pitch=pitch, locale=locale, response_format=response_format))
+        audio_bytes = run_sync(generate_tts_bytes(type=type, **req.params()))
         base64_str = base64.b64encode(audio_bytes).decode('utf-8')
         
         elapsed_time = time.time() - start_time
-        logger.info(f"[响应] TTS Base64生成成功 - 数据大小: {len(audio_bytes)} bytes, 格式: {response_format}, 耗时: {elapsed_time:.3f}秒")
+        logger.info(f"[响应] TTS Base64生成成功 - 数据大小: {len(audio_bytes)} bytes, 格式: {req.response_format}, 耗时: {elapsed_time:.3f}秒")
         
-        return jsonify({"status": "success", "base64": base64_str, "format": response_format})
+        return jsonify({"status": "success", "base64": base64_str, "format": req.response_format})
     except Exception as e:
-        elapsed_time = time.time() - start_time
-        logger.error(f"[错误] TTS Base64生成失败 - 错误信息: {str(e)}, 耗时: {elapsed_time:.3f}秒")
-        return jsonify({"error": str(e)}), 500
+        return _failed(e, "TTS Base64生成", start_time)
+
+# 4.1 TTS生成API - 流式返回Base64编码（NDJSON / SSE）
+@app.route('/api/oddtts/base64/stream', methods=['POST'])
+def api_tts_base64_stream():
+    start_time = time.time()
+    logger.info("[请求] TTS Base64流式接口")
+    
+    try:
+        req = parse_tts_request(request.get_json(silent=True), with_transport=True, accept=request.headers.get("Accept", ""))
+        check_capacity(single_tts_driver)
+    except RequestError as e:
+        return _reject(e, start_time)
+    
+    type = config.oddtts_cfg["tts_type"]
+    chunks = generate_tts_stream(type=type, **req.params())
+    
+    def generate():
+        for body in iterate_sync(encode_base64_stream(chunks, req.response_format, req.transport)):
+            yield body
+        generation_time = time.time() - start_time
+        logger.info(f"[完成] TTS Base64流式生成完成 - 格式: {req.response_format}, 传输: {req.transport}, 生成耗时: {generation_time:.3f}秒")
+    
+    elapsed_time = time.time() - start_time
+    logger.info(f"[响应] TTS Base64流式接口响应成功 - 传输: {req.transport}, 总耗时: {elapsed_time:.3f}秒")
+    return Response(generate(), mimetype=TRANSPORT_MIME_TYPES[req.transport], headers={"Cache-Control": "no-cache"})
 
 # 5. TTS生成API - 流式响应
 @app.route('/api/oddtts/stream', methods=['POST'])
@@ -179,37 +290,18 @@ def api_tts_stream():
     logger.info("[请求] TTS流式接口")
     
     try:
-        data = request.json
-    except Exception:
-        elapsed_time = time.time() - start_time
-        logger.warning(f"[响应] 请求格式错误 - 耗时: {elapsed_time:.3f}秒")
-        return jsonify({"error": "请求必须是JSON格式"}), 400
+        req = parse_tts_request(request.get_json(silent=True))
+        check_capacity(single_tts_driver)
+    except RequestError as e:
+        return _reject(e, start_time)
     
     type = config.oddtts_cfg["tts_type"]
-    text = data.get("text")
-    voice = data.get("voice")
-    rate = data.get("rate", 0)
-    volume = data.get("volume", 0)
-    pitch = data.get("pitch", 0)
-    locale = data.get("locale", "zh-CN")
-    response_format = data.get("response_format", "wav")
-    
-    logger.info(f"[参数] 文本长度: {len(text) if text else 0}, 语音: {voice}, 语速: {rate}, 音量: {volume}, 音调: {pitch}, 格式: {response_format}")
-    
-    if not text:
-        elapsed_time = time.time() - start_time
-        logger.warning(f"[响应] 缺少必需参数: text - 耗时: {elapsed_time:.3f}秒")
-        return jsonify({"error": "缺少必需参数: text"}), 400
-    if not voice:
-        elapsed_time = time.time() - start_time
-        logger.warning(f"[响应] 缺少必需参数: voice - 耗时: {elapsed_time:.3f}秒")
-        return jsonify({"error": "缺少必需参数: voice"}), 400
-    
+    response_format = req.response_format
     generation_start_time = time.time()
     
     async def async_generate():
         try:
-            async for chunk in generate_tts_stream(type=type, text=text, voice=voice, rate=rate, volume=volume, pitch=pitch, locale=locale, response_format=response_format):
+            async for chunk in generate_tts_stream(type=type, **req.params()):
                 yield chunk
         
             generation_time = time.time() - generation_start_time
@@ -217,56 +309,150 @@ def api_tts_stream():
         except Exception as e:
             generation_time = time.time() - generation_start_time
             logger.error(f"[错误] TTS流式生成失败 - 错误信息: {str(e)}, 生成耗时: {generation_time:.3f}秒")
-            yield str(e).encode('utf-8')
+            # 响应头和部分音频已经发出，无法再改状态码；中断响应让客户端感知失败，不把错误信息混进音频数据
+            raise
     
     def generate():
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            async_gen = async_generate()
-            while True:
-                try:
-                    chunk = loop.run_until_complete(async_gen.__anext__())
-                    yield chunk
-                except StopAsyncIteration:
-                    break
-                except Exception as e:
-                    yield str(e).encode('utf-8')
-                    break
-        finally:
-            loop.close()
+        for chunk in iterate_sync(async_generate()):
+            yield chunk
     
     try:
-        mimetype = "audio/mpeg" if response_format == "mp3" else "audio/wav"
+        mimetype = audio_mime_type(response_format)
         elapsed_time = time.time() - start_time
         logger.info(f"[响应] TTS流式接口响应成功 - MIME类型: {mimetype}, 总耗时: {elapsed_time:.3f}秒")
-        return Response(generate(), mimetype=mimetype)
+        return Response(generate(), mimetype=mimetype, headers=audio_headers(response_format, SAMPLE_RATE))
     except Exception as e:
         elapsed_time = time.time() - start_time
         logger.error(f"[错误] TTS流式接口响应失败 - 错误信息: {str(e)}, 总耗时: {elapsed_time:.3f}秒")
         return jsonify({"error": str(e)}), 500
 
+# 6. 批量合成API - 提交任务
+@app.route('/api/oddtts/batch', methods=['POST'])
+def api_tts_batch():
+    start_time = time.time()
+    logger.info("[请求] TTS批量合成接口")
+
+    try:
+        batch_items = parse_batch_items(request.get_json(silent=True), config.batch_cfg.get("max_items", 10000))
+    except RequestError as e:
+        return _reject(e, start_time)
+
+    job = batch_jobs.submit(config.oddtts_cfg["tts_type"], batch_items)
+
+    elapsed_time = time.time() - start_time
+    logger.info(f"[响应] TTS批量任务已提交 - 任务ID: {job.id}, 条目数: {job.total}, 耗时: {elapsed_time:.3f}秒")
+    return jsonify({**job.progress(), "status_url": f"/api/oddtts/batch/{job.id}", "download_url": f"/api/oddtts/batch/{job.id}/download"}), 202
+
+# 7. 批量合成API - 查询进度，完成后附带每个条目的结果清单
+@app.route('/api/oddtts/batch/<job_id>', methods=['GET'])
+def api_tts_batch_status(job_id):
+    job = batch_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": f"任务不存在: {job_id}"}), 404
+
+    result = job.progress()
+    if job.status in ("done", "failed"):
+        result["items"] = job.manifest()
+    return jsonify(result)
+
+# 8. 批量合成API - 下载 zip 归档（含 manifest.json）
+@app.route('/api/oddtts/batch/<job_id>/download', methods=['GET'])
+def api_tts_batch_download(job_id):
+    job = batch_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": f"任务不存在: {job_id}"}), 404
+    if job.archive_path is None:
+        return jsonify({"error": f"任务尚未完成: {job.status}", **job.progress()}), 409
+
+    logger.info(f"[响应] 批量任务下载 - 任务ID: {job.id}")
+    return send_file(job.archive_path, mimetype="application/zip", as_attachment=True, download_name=f"oddtts_batch_{job.id}.zip")
+
+class _StoredFile(io.BufferedReader):
+    '''托管存储中的音频文件，关闭时释放存储引用'''
+
+    def __init__(self, path: str, on_close) -> None:
+        super().__init__(io.FileIO(path, "rb"))
+        self._on_close = on_close
+
+    def close(self) -> None:
+        try:
+            super().close()
+        finally:
+            on_close, self._on_close = self._on_close, None
+            if on_close is not None:
+                on_close()
+
+
+def send_stored_file(file_id: str, as_attachment: bool = False):
+    '''
+    发送托管存储中的音频文件，文件不存在或已被回收时返回None
+
+    - 按扩展名返回正确的 Content-Type，带 Content-Length、Last-Modified 和 ETag，支持 If-None-Match 和 Range
+    - 文件对象交给 WSGI 服务器的 wsgi.file_wrapper（如 gunicorn 用 sendfile 发送），不经过 Python 缓冲；
+      配置 x_sendfile 后改由前置的 nginx/apache 通过 X-Sendfile 发送
+    - 发送期间持有引用，文件关闭（发送完成、304 或客户端断开）时释放，之后由后台回收
+    '''
+    store = get_output_store()
+    path = store.acquire(file_id)
+    if path is None:
+        return None
+
+    try:
+        stat = os.stat(path)
+        ext = os.path.splitext(file_id)[1].lstrip(".")
+        kwargs = {
+            "mimetype": audio_mime_type(ext),
+            "as_attachment": as_attachment,
+            "download_name": f"oddtts_audio.{ext}",
+            # 文件名唯一且写入后不再修改，文件ID加大小即可作为强校验的 ETag
+            "etag": f"{file_id}-{stat.st_size}",
+            "last_modified": stat.st_mtime,
+            "conditional": False,
+        }
+        if app.config["USE_X_SENDFILE"]:
+            response = send_file(path, **kwargs)
+            store.release(file_id)
+        else:
+            response = send_file(_StoredFile(path, lambda: store.release(file_id)), **kwargs)
+    except Exception:
+        store.release(file_id)
+        raise
+
+    # 传入文件对象时 send_file 不知道文件大小，这里补上 Content-Length 后再处理 If-None-Match 和 Range
+    response.content_length = stat.st_size
+    try:
+        return response.make_conditional(request.environ, accept_ranges=True, complete_length=stat.st_size)
+    except RequestedRangeNotSatisfiable:
+        response.close()
+        raise
+
+
+def resolve_file_id() -> str:
+    '''
+    从请求参数中取文件ID：优先 id；兼容旧的 path 参数，但只接受托管存储中的文件
+    '''
+    file_id = request.args.get('id', '')
+    if not file_id and request.args.get('path'):
+        file_id = get_output_store().file_id(request.args['path'])
+    return file_id or ''
+
 # 播放音频文件
 @app.route('/play')
 def play_audio():
     start_time = time.time()
     logger.info("[请求] 播放音频接口")
     
-    import urllib.parse
-    file_path = request.args.get('path', '')
-    
-    logger.info(f"[参数] 文件路径: {file_path}")
-    
-    if file_path:
-        file_path = urllib.parse.unquote(file_path)
-        if os.path.exists(file_path):
-            elapsed_time = time.time() - start_time
-            logger.info(f"[响应] 播放音频成功 - 文件: {file_path}, 耗时: {elapsed_time:.3f}秒")
-            return send_file(file_path, mimetype='audio/mpeg')
+    file_id = resolve_file_id()
+    logger.info(f"[参数] 文件ID: {file_id}, Range: {request.headers.get('Range', '')}")
     
+    response = send_stored_file(file_id)
     elapsed_time = time.time() - start_time
-    logger.warning(f"[响应] 文件未找到 - 路径: {file_path}, 耗时: {elapsed_time:.3f}秒")
-    return "File not found", 404
+    if response is None:
+        logger.warning(f"[响应] 文件未找到 - 文件ID: {file_id}, 耗时: {elapsed_time:.3f}秒")
+        return "File not found", 404
+
+    logger.info(f"[响应] 播放音频成功 - 文件ID: {file_id}, 状态码: {response.status_code}, 耗时: {elapsed_time:.3f}秒")
+    return response
 
 # 下载音频文件
 @app.route('/download')
@@ -274,21 +460,17 @@ def download_audio():
     start_time = time.time()
     logger.info("[请求] 下载音频接口")
     
-    import urllib.parse
-    file_path = request.args.get('path', '')
-    
-    logger.info(f"[参数] 文件路径: {file_path}")
-    
-    if file_path:
-        file_path = urllib.parse.unquote(file_path)
-        if os.path.exists(file_path):
-            elapsed_time = time.time() - start_time
-            logger.info(f"[响应] 下载音频成功 - 文件: {file_path}, 耗时: {elapsed_time:.3f}秒")
-            return send_file(file_path, as_attachment=True, download_name='oddtts_audio.mp3', mimetype='audio/mpeg')
+    file_id = resolve_file_id()
+    logger.info(f"[参数] 文件ID: {file_id}, Range: {request.headers.get('Range', '')}")
     
+    response = send_stored_file(file_id, as_attachment=True)
     elapsed_time = time.time() - start_time
-    logger.warning(f"[响应] 文件未找到 - 路径: {file_path}, 耗时: {elapsed_time:.3f}秒")
-    return "File not found", 404
+    if response is None:
+        logger.warning(f"[响应] 文件未找到 - 文件ID: {file_id}, 耗时: {elapsed_time:.3f}秒")
+        return "File not found", 404
+
+    logger.info(f"[响应] 下载音频成功 - 文件ID: {file_id}, 状态码: {response.status_code}, 耗时: {elapsed_time:.3f}秒")
+    return response
 
 # OpenAI兼容API
 @app.route('/v1/models', methods=['GET'])
@@ -297,28 +479,13 @@ def openai_list_models():
     logger.info("[请求] OpenAI模型列表接口")
     
     type = config.oddtts_cfg["tts_type"]
-    voice_list = asyncio.run(get_voices(type))
-    models = []
-    for v in voice_list:
-        if v.get("name"):
-            models.append({
-                "id": v["name"],
-                "object": "model",
-                "created": 1700000000,
-                "owned_by": "oddtts",
-                "permission": [],
-                "root": v["name"],
-                "parent": None
-            })
+    voice_list = run_sync(get_voices(type))
+    result = build_openai_models(type, voice_list)
     
     elapsed_time = time.time() - start_time
-    logger.info(f"[响应] OpenAI模型列表完成 - 模型数量: {len(models)}, 耗时: {elapsed_time:.3f}秒")
+    logger.info(f"[响应] OpenAI模型列表完成 - 模型数量: {len(result['data'])}, 耗时: {elapsed_time:.3f}秒")
     
-    return jsonify({
-        "object": "list",
-        "data": models,
-        "model": type.value if hasattr(type, 'value') else str(type)
-    })
+    return jsonify(result)
 
 @app.route('/v1/audio/speech', methods=['POST'])
 def openai_create_speech():
@@ -326,43 +493,18 @@ def openai_create_speech():
     logger.info("[请求] OpenAI speech接口")
     
     try:
-        data = request.json
-    except Exception:
-        elapsed_time = time.time() - start_time
-        logger.warning(f"[响应] 请求格式错误 - 耗时: {elapsed_time:.3f}秒")
-        return jsonify({"error": "请求必须是JSON格式"}), 400
-    
-    text = data.get("input")
-    if not text:
-        elapsed_time = time.time() - start_time
-        logger.warning(f"[响应] 缺少必需参数: input - 耗时: {elapsed_time:.3f}秒")
-        return jsonify({"error": "缺少必需参数: input"}), 400
-    
-    voice = data.get("voice")
-    if not voice:
-        elapsed_time = time.time() - start_time
-        logger.warning(f"[响应] 缺少必需参数: voice - 耗时: {elapsed_time:.3f}秒")
-        return jsonify({"error": "缺少必需参数: voice"}), 400
+        req = parse_openai_speech(request.get_json(silent=True))
+        check_capacity(single_tts_driver)
+    except RequestError as e:
+        return _reject(e, start_time)
     
-    speed = data.get("speed", 1.0)
-    response_format = data.get("response_format", "mp3")
-    
-    if speed < 0.25 or speed > 4.0:
-        elapsed_time = time.time() - start_time
-        logger.warning(f"[响应] speed参数错误 - 值: {speed}, 耗时: {elapsed_time:.3f}秒")
-        return jsonify({"error": "speed参数必须在0.25-4.0之间"}), 400
-    
-    rate = int((speed - 1.0) * 50)
-    locale = data.get("locale", "zh-CN")
     type = config.oddtts_cfg["tts_type"]
-    
-    logger.info(f"[参数] 文本长度: {len(text)}, 语音: {voice}, 语速: {speed}, 格式: {response_format}")
-    
+    response_format = req.response_format
     generation_start_time = time.time()
     
     async def async_generate():
         try:
-            async for chunk in generate_tts_stream(type=type, text=text, voice=voice, rate=rate, volume=0, pitch=0, locale=locale, response_format=response_format):
+            async for chunk in generate_tts_stream(type=type, **req.params()):
                 yield chunk
             
             generation_time = time.time() - generation_start_time
@@ -370,30 +512,19 @@ def openai_create_speech():
         except Exception as e:
             generation_time = time.time() - generation_start_time
             logger.error(f"[错误] OpenAI speech生成失败 - 错误信息: {str(e)}, 生成耗时: {generation_time:.3f}秒")
-            yield str(e).encode('utf-8')
+            # 响应头和部分音频已经发出，无法再改状态码；中断响应让客户端感知失败，不把错误信息混进音频数据
+            raise
     
     def generate():
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            async_gen = async_generate()
-            while True:
-                try:
-                    chunk = loop.run_until_complete(async_gen.__anext__())
-                    yield chunk
-                except StopAsyncIteration:
-                    break
-                except Exception as e:
-                    yield str(e).encode('utf-8')
-                    break
-        finally:
-            loop.close()
+        for chunk in iterate_sync(async_generate()):
+            yield chunk
     
     try:
-        mimetype = "audio/mpeg" if response_format == "mp3" else "audio/wav"
+        mimetype = audio_mime_type(response_format)
         elapsed_time = time.time() - start_time
         logger.info(f"[响应] OpenAI speech接口响应成功 - MIME类型: {mimetype}, 总耗时: {elapsed_time:.3f}秒")
-        return Response(generate(), mimetype=mimetype, headers={"Content-Disposition": f"attachment; filename=speech.{response_format}"})
+        headers = {"Content-Disposition": f"attachment; filename=speech.{response_format}", **audio_headers(response_format, SAMPLE_RATE)}
+        return Response(generate(), mimetype=mimetype, headers=headers)
     except Exception as e:
         elapsed_time = time.time() - start_time
         logger.error(f"[错误] OpenAI speech接口响应失败 - 错误信息: {str(e)}, 总耗时: {elapsed_time:.3f}秒")
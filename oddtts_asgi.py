@@ -0,0 +1,278 @@
+"""
+ASGI 服务模式
+
+与 oddtts.py 中的 Flask 路由保持相同的路径和 JSON 结构。合成相关的接口在服务器的
+事件循环中原生执行，其余接口（首页、播放、下载、健康检查等）挂载原 Flask 应用处理。
+增量文本合成的 WebSocket 接口 /api/oddtts/ws 只在该模式下提供。
+
+启动方式: oddtts --server-mode asgi
+"""
+
+import asyncio
+import base64
+import contextlib
+import logging
+import time
+
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Mount, Route, WebSocketRoute
+from starlette.websockets import WebSocket, WebSocketDisconnect
+from a2wsgi import WSGIMiddleware
+
+import oddtts.oddtts_config as config
+from oddtts.oddtts import app as flask_app, single_tts_driver, schedule_startup
+from oddtts.oddtts import get_voices, generate_tts_file, generate_tts_bytes, generate_tts_stream, build_openai_models
+from oddtts.oddtts_base64 import TRANSPORT_MIME_TYPES, encode_base64_stream
+from oddtts.oddtts_encoder import SAMPLE_RATE, audio_mime_type, audio_headers
+from oddtts.oddtts_http import close_http_client
+from oddtts.oddtts_request import RequestError, parse_tts_request, parse_openai_speech, check_capacity, request_error, synthesis_error
+from oddtts.oddtts_runtime import attach_loop
+from oddtts.oddtts_session import SynthesisSession, SessionError
+from oddtts.oddtts_store import get_output_store
+
+logger = logging.getLogger(__name__)
+
+
+async def _read_json(request: Request):
+    try:
+        return await request.json()
+    except Exception:
+        return None
+
+
+def _reject(e: RequestError, start_time: float) -> JSONResponse:
+    body, status, headers = request_error(e, start_time)
+    return JSONResponse(body, status_code=status, headers=headers)
+
+
+def _failed(e: Exception, action: str, start_time: float) -> JSONResponse:
+    body, status, headers = synthesis_error(e, action, start_time)
+    return JSONResponse(body, status_code=status, headers=headers)
+
+
+# 1. 获取语音列表API
+async def api_get_voices(request: Request):
+    start_time = time.time()
+    logger.info("[请求] 获取语音列表接口")
+
+    type = config.oddtts_cfg["tts_type"]
+    voices_list = await get_voices(type)
+
+    elapsed_time = time.time() - start_time
+    logger.info(f"[响应] 获取语音列表完成 - 语音数量: {len(voices_list)}, 耗时: {elapsed_time:.3f}秒")
+
+    return JSONResponse(voices_list)
+
+# 3. TTS生成API - 返回文件路径
+async def api_tts_file(request: Request):
+    start_time = time.time()
+    logger.info("[请求] TTS文件生成接口")
+
+    try:
+        req = parse_tts_request(await _read_json(request))
+    except RequestError as e:
+        return _reject(e, start_time)
+
+    type = config.oddtts_cfg["tts_type"]
+    try:
+        audio_path = await generate_tts_file(type=type, **req.params())
+
+        elapsed_time = time.time() - start_time
+        logger.info(f"[响应] TTS文件生成成功 - 文件路径: {audio_path}, 格式: {req.response_format}, 耗时: {elapsed_time:.3f}秒")
+
+        return JSONResponse({"status": "success", "file_path": audio_path, "file_id": get_output_store().file_id(audio_path), "format": req.response_format})
+    except Exception as e:
+        return _failed(e, "TTS文件生成", start_time)
+
+# 4. TTS生成API - 返回Base64编码
+async def api_tts_base64(request: Request):
+    start_time = time.time()
+    logger.info("[请求] TTS Base64接口")
+
+    try:
+        req = parse_tts_request(await _read_json(request))
+    except RequestError as e:
+        return _reject(e, start_time)
+
+    type = config.oddtts_cfg["tts_type"]
+    try:
+        audio_bytes = await generate_tts_bytes(type=type, **req.params())
+        base64_str = base64.b64encode(audio_bytes).decode('utf-8')
+
+        elapsed_time = time.time() - start_time
+        logger.info(f"[响应] TTS Base64生成成功 - 数据大小: {len(audio_bytes)} bytes, 格式: {req.response_format}, 耗时: {elapsed_time:.3f}秒")
+
+        return JSONResponse({"status": "success", "base64": base64_str, "format": req.response_format})
+    except Exception as e:
+        return _failed(e, "TTS Base64生成", start_time)
+
+# 4.1 TTS生成API - 流式返回Base64编码（NDJSON / SSE）
+async def api_tts_base64_stream(request: Request):
+    start_time = time.time()
+    logger.info("[请求] TTS Base64流式接口")
+
+    try:
+        req = parse_tts_request(await _read_json(request), with_transport=True, accept=request.headers.get("accept", ""))
+        check_capacity(single_tts_driver)
+    except RequestError as e:
+        return _reject(e, start_time)
+
+    type = config.oddtts_cfg["tts_type"]
+
+    async def async_generate():
+        chunks = generate_tts_stream(type=type, **req.params())
+        async for body in encode_base64_stream(chunks, req.response_format, req.transport):
+            yield body
+        generation_time = time.time() - start_time
+        logger.info(f"[完成] TTS Base64流式生成完成 - 格式: {req.response_format}, 传输: {req.transport}, 生成耗时: {generation_time:.3f}秒")
+
+    elapsed_time = time.time() - start_time
+    logger.info(f"[响应] TTS Base64流式接口响应成功 - 传输: {req.transport}, 总耗时: {elapsed_time:.3f}秒")
+    return StreamingResponse(async_generate(), media_type=TRANSPORT_MIME_TYPES[req.transport], headers={"Cache-Control": "no-cache"})
+
+# 5. TTS生成API - 流式响应
+async def api_tts_stream(request: Request):
+    start_time = time.time()
+    logger.info("[请求] TTS流式接口")
+
+    try:
+        req = parse_tts_request(await _read_json(request))
+        check_capacity(single_tts_driver)
+    except RequestError as e:
+        return _reject(e, start_time)
+
+    type = config.oddtts_cfg["tts_type"]
+    response_format = req.response_format
+    generation_start_time = time.time()
+
+    async def async_generate():
+        try:
+            async for chunk in generate_tts_stream(type=type, **req.params()):
+                yield chunk
+
+            generation_time = time.time() - generation_start_time
+            logger.info(f"[完成] TTS流式生成完成 - 格式: {response_format}, 生成耗时: {generation_time:.3f}秒")
+        except Exception as e:
+            generation_time = time.time() - generation_start_time
+            logger.error(f"[错误] TTS流式生成失败 - 错误信息: {str(e)}, 生成耗时: {generation_time:.3f}秒")
+            # 响应头和部分音频已经发出，无法再改状态码；中断响应让客户端感知失败，不把错误信息混进音频数据
+            raise
+
+    mimetype = audio_mime_type(response_format)
+    elapsed_time = time.time() - start_time
+    logger.info(f"[响应] TTS流式接口响应成功 - MIME类型: {mimetype}, 总耗时: {elapsed_time:.3f}秒")
+    return StreamingResponse(async_generate(), media_type=mimetype, headers=audio_headers(response_format, SAMPLE_RATE))
+
+# 6. 增量文本合成 - WebSocket
+async def api_tts_ws(websocket: WebSocket):
+    await websocket.accept()
+    logger.info(f"[请求] TTS WebSocket会话接口 - 客户端: {websocket.client}")
+
+    type = config.oddtts_cfg["tts_type"]
+    cfg = config.session_cfg
+
+    def synthesize(text, tts_params):
+        return single_tts_driver.generate_tts_stream(type=type, text=text, tts_params=tts_params)
+
+    try:
+        session = SynthesisSession(
+            synthesize, websocket.send_json, websocket.send_bytes,
+            params=dict(websocket.query_params),
+            max_chars=cfg.get("max_chars") or config.oddtts_cfg.get("segment_max_chars", 100),
+            max_pending=cfg.get("max_pending", 64),
+        )
+    except SessionError as e:
+        logger.warning(f"[响应] 会话参数不合法 - 错误信息: {str(e)}")
+        await websocket.send_json({"type": "error", "error": str(e)})
+        await websocket.close(code=1008)
+        return
+
+    start_time = time.time()
+    try:
+        while True:
+            await session.handle_message(await websocket.receive_text())
+    except WebSocketDisconnect:
+        pass
+    finally:
+        await session.close()
+        elapsed_time = time.time() - start_time
+        logger.info(f"[响应] TTS WebSocket会话结束 - 合成句数: {session.sentences}, 取消句数: {session.cancelled}, 时长: {elapsed_time:.3f}秒")
+
+# OpenAI兼容API
+async def openai_list_models(request: Request):
+    start_time = time.time()
+    logger.info("[请求] OpenAI模型列表接口")
+
+    type = config.oddtts_cfg["tts_type"]
+    voice_list = await get_voices(type)
+    result = build_openai_models(type, voice_list)
+
+    elapsed_time = time.time() - start_time
+    logger.info(f"[响应] OpenAI模型列表完成 - 模型数量: {len(result['data'])}, 耗时: {elapsed_time:.3f}秒")
+
+    return JSONResponse(result)
+
+async def openai_create_speech(request: Request):
+    start_time = time.time()
+    logger.info("[请求] OpenAI speech接口")
+
+    try:
+        req = parse_openai_speech(await _read_json(request))
+        check_capacity(single_tts_driver)
+    except RequestError as e:
+        return _reject(e, start_time)
+
+    type = config.oddtts_cfg["tts_type"]
+    response_format = req.response_format
+    generation_start_time = time.time()
+
+    async def async_generate():
+        try:
+            async for chunk in generate_tts_stream(type=type, **req.params()):
+                yield chunk
+
+            generation_time = time.time() - generation_start_time
+            logger.info(f"[完成] OpenAI speech生成完成 - 格式: {response_format}, 生成耗时: {generation_time:.3f}秒")
+        except Exception as e:
+            generation_time = time.time() - generation_start_time
+            logger.error(f"[错误] OpenAI speech生成失败 - 错误信息: {str(e)}, 生成耗时: {generation_time:.3f}秒")
+            # 响应头和部分音频已经发出，无法再改状态码；中断响应让客户端感知失败，不把错误信息混进音频数据
+            raise
+
+    mimetype = audio_mime_type(response_format)
+    elapsed_time = time.time() - start_time
+    logger.info(f"[响应] OpenAI speech接口响应成功 - MIME类型: {mimetype}, 总耗时: {elapsed_time:.3f}秒")
+    headers = {"Content-Disposition": f"attachment; filename=speech.{response_format}", **audio_headers(response_format, SAMPLE_RATE)}
+    return StreamingResponse(async_generate(), media_type=mimetype, headers=headers)
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app: Starlette):
+    # 让 Flask 挂载路由与原生路由共用服务器的事件循环，模型加载和预热也在这个事件循环中执行
+    attach_loop(asyncio.get_running_loop())
+    schedule_startup()
+    yield
+    # 服务器的事件循环随后关闭，共享HTTP会话要在这之前关闭
+    await close_http_client()
+
+
+app = Starlette(
+    routes=[
+        Route('/v1/audio/voice/list', api_get_voices, methods=['GET']),
+        Route('/api/oddtts/file', api_tts_file, methods=['POST']),
+        Route('/api/oddtts/base64', api_tts_base64, methods=['POST']),
+        Route('/api/oddtts/base64/stream', api_tts_base64_stream, methods=['POST']),
+        Route('/api/oddtts/stream', api_tts_stream, methods=['POST']),
+        WebSocketRoute('/api/oddtts/ws', api_tts_ws),
+        Route('/v1/models', openai_list_models, methods=['GET']),
+        Route('/v1/audio/speech', openai_create_speech, methods=['POST']),
+        # 其余路由（首页、播放、下载、健康检查等）交给 Flask 应用处理
+        Mount('/', app=WSGIMiddleware(flask_app)),
+    ],
+    middleware=[Middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])],
+    lifespan=lifespan,
+)
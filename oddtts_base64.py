@@ -0,0 +1,104 @@
+"""
+Base64 音频的流式传输
+
+/api/oddtts/base64 要等 generate_tts_bytes 合成完整段音频，再整体编码后放进一个 JSON 对象返回，
+峰值内存约为音频大小的 2.3 倍，合成结束前客户端收不到任何数据。
+流式接口把驱动产出的音频块逐块编码成记录，以 NDJSON（每行一个 JSON）或 SSE 发送：
+
+- audio 记录: {"type": "audio", "seq": 0, "data": "<base64>"}，seq 从 0 递增
+- end 记录: {"type": "end", "seq": n, "chunks": n, "bytes": 总字节数, "format": ..., "mime_type": ..., "elapsed": 秒}
+- error 记录: {"type": "error", "seq": n, "error": "..."}，出错时代替 end 记录，之后不再有记录
+
+除最后一条外，每条 audio 记录的原始字节数都是 3 的倍数，客户端既可以逐条解码后拼接字节，
+也可以直接拼接 data 字符串后一次解码。服务端只缓存不足 3 字节的余数，内存占用与音频长度无关。
+"""
+
+import base64
+import json
+import logging
+import time
+
+from oddtts.oddtts_encoder import SAMPLE_RATE, audio_mime_type
+
+logger = logging.getLogger(__name__)
+
+# 单条记录的最大原始字节数（3 的倍数），驱动一次产出的大块音频拆成多条记录
+RECORD_BYTES = 48 * 1024
+TRANSPORTS = ("ndjson", "sse")
+TRANSPORT_MIME_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "sse": "text/event-stream",
+}
+
+
+def resolve_transport(requested: str, accept: str = "") -> str:
+    '''
+    选择传输格式：优先请求中的 transport，未指定时 Accept 包含 text/event-stream 则用 SSE，否则用 NDJSON；
+    不支持的格式返回None
+    '''
+    if requested:
+        requested = str(requested).lower()
+        return requested if requested in TRANSPORTS else None
+    return "sse" if "text/event-stream" in (accept or "") else "ndjson"
+
+
+def _audio_record(seq: int, data) -> dict:
+    return {"type": "audio", "seq": seq, "data": base64.b64encode(data).decode("ascii")}
+
+
+async def base64_records(chunks, response_format: str, record_bytes: int = RECORD_BYTES):
+    '''
+    把音频块的异步迭代器转换为 audio 记录，最后产出 end 记录；迭代出错时产出 error 记录后结束
+    '''
+    record_bytes -= record_bytes % 3
+    start_time = time.time()
+    seq = 0
+    total = 0
+    pending = b""
+    try:
+        async for chunk in chunks:
+            if not chunk:
+                continue
+            total += len(chunk)
+            data = pending + chunk if pending else chunk
+            aligned = len(data) - len(data) % 3
+            view = memoryview(data)
+            for offset in range(0, aligned, record_bytes):
+                yield _audio_record(seq, view[offset:min(offset + record_bytes, aligned)])
+                seq += 1
+            pending = bytes(view[aligned:])
+        if pending:
+            yield _audio_record(seq, pending)
+            seq += 1
+    except Exception as e:
+        logger.error(f"[错误] Base64流式生成失败 - 错误信息: {str(e)}, 已发送: {seq} 条记录")
+        yield {"type": "error", "seq": seq, "error": str(e)}
+        return
+
+    record = {
+        "type": "end",
+        "seq": seq,
+        "chunks": seq,
+        "bytes": total,
+        "format": response_format,
+        "mime_type": audio_mime_type(response_format),
+        "elapsed": round(time.time() - start_time, 3),
+    }
+    # pcm 没有文件头，与 /api/oddtts/stream 的响应头一样告知采样参数
+    if response_format.lower() == "pcm":
+        record.update({"sample_rate": SAMPLE_RATE, "channels": 1, "sample_format": "s16le"})
+    yield record
+
+
+def encode_record(record: dict, transport: str) -> bytes:
+    '''按传输格式序列化一条记录'''
+    payload = json.dumps(record, ensure_ascii=False, separators=(",", ":"))
+    if transport == "sse":
+        return f"id: {record['seq']}\nevent: {record['type']}\ndata: {payload}\n\n".encode("utf-8")
+    return (payload + "\n").encode("utf-8")
+
+
+async def encode_base64_stream(chunks, response_format: str, transport: str, record_bytes: int = RECORD_BYTES):
+    '''音频块 -> 序列化后的响应体块'''
+    async for record in base64_records(chunks, response_format, record_bytes):
+        yield encode_record(record, transport)
@@ -0,0 +1,176 @@
+"""
+批量合成任务
+
+离线批量预生成时，逐条调用 /api/oddtts/file 每条都要付出路由、日志和同步等待的开销。
+批量任务一次提交全部条目，在共享事件循环中后台执行：
+
+- 调度交给 OddTTSDriver.generate_tts_batch，条目按音色排序，同时合成的条目数不超过推理线程数/进程数的一半
+- 每条合成完成后立即写入任务目录，客户端轮询进度
+- 全部完成后生成清单 manifest.json 和 zip 归档（音频已压缩，归档只存储不再压缩）
+- 任务按提交顺序逐个执行，完成超过 job_ttl 秒的任务连同文件一起清理
+"""
+
+import asyncio
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+import zipfile
+
+from oddtts.oddtts_params import ODDTTS_TYPE, TTSParams
+from oddtts.oddtts_runtime import get_loop, run_blocking
+
+logger = logging.getLogger(__name__)
+
+
+class BatchJob:
+    '''一个批量合成任务: queued -> running -> done / failed'''
+
+    def __init__(self, type: ODDTTS_TYPE, items: list[tuple[str, TTSParams]], directory: str) -> None:
+        self.id = uuid.uuid4().hex
+        self.type = type
+        self.items = items
+        self.directory = directory
+        self.status = "queued"
+        self.error = None
+        self.results: list[dict] = [None] * len(items)
+        self.completed = 0
+        self.failed = 0
+        self.archive_path = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+
+    @property
+    def total(self) -> int:
+        return len(self.items)
+
+    def manifest(self) -> list[dict]:
+        '''每个条目的结果：文件路径、大小或错误信息，未完成的条目状态为 pending'''
+        return [
+            result or {"index": index, "status": "pending"}
+            for index, result in enumerate(self.results)
+        ]
+
+    def progress(self) -> dict:
+        progress = {
+            "job_id": self.id,
+            "status": self.status,
+            "total": self.total,
+            "completed": self.completed,
+            "failed": self.failed,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+        }
+        if self.error:
+            progress["error"] = self.error
+        return progress
+
+
+def _write_file(path: str, data: bytes) -> None:
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def _write_archive(job: BatchJob) -> str:
+    manifest = job.manifest()
+    with open(os.path.join(job.directory, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+    archive_path = os.path.join(job.directory, f"{job.id}.zip")
+    with zipfile.ZipFile(archive_path, "w", compression=zipfile.ZIP_STORED) as archive:
+        archive.write(os.path.join(job.directory, "manifest.json"), "manifest.json")
+        for result in manifest:
+            if result["status"] == "success":
+                archive.write(result["file_path"], result["file_name"])
+    return archive_path
+
+
+class BatchJobManager:
+    '''批量任务的提交、执行、查询和清理'''
+
+    def __init__(self, driver, output_dir: str = "", concurrency: int = 0, job_ttl: float = 24 * 3600, busy_timeout: float = 60) -> None:
+        self.driver = driver
+        self.output_dir = output_dir or os.path.join(tempfile.gettempdir(), "oddtts_batch")
+        self.concurrency = concurrency
+        self.busy_timeout = busy_timeout
+        self.job_ttl = job_ttl
+        self._jobs: dict[str, BatchJob] = {}
+        self._lock = threading.Lock()
+        self._run_lock = None
+
+    def submit(self, type: ODDTTS_TYPE, items: list[tuple[str, TTSParams]]) -> BatchJob:
+        '''创建任务并提交到共享事件循环后台执行，立即返回'''
+        self.cleanup()
+        directory = os.path.join(self.output_dir, uuid.uuid4().hex)
+        os.makedirs(directory, exist_ok=True)
+        job = BatchJob(type, items, directory)
+        with self._lock:
+            self._jobs[job.id] = job
+        asyncio.run_coroutine_threadsafe(self._run(job), get_loop())
+        logger.info(f"[批量] 任务已提交 - 任务ID: {job.id}, 条目数: {job.total}")
+        return job
+
+    def get(self, job_id: str) -> BatchJob:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    async def _run(self, job: BatchJob) -> None:
+        # 任务逐个执行，避免多个批量任务叠加占满推理队列
+        if self._run_lock is None:
+            self._run_lock = asyncio.Lock()
+        async with self._run_lock:
+            job.status = "running"
+            job.started = time.time()
+            try:
+                async for index, result in self.driver.generate_tts_batch(job.type, job.items, self.concurrency, self.busy_timeout):
+                    await self._save_result(job, index, result)
+                job.archive_path = await run_blocking(_write_archive, job)
+                job.status = "done"
+            except Exception as e:
+                job.status = "failed"
+                job.error = str(e)
+                logger.error(f"[错误] 批量任务失败 - 任务ID: {job.id}, 错误信息: {str(e)}")
+            job.finished = time.time()
+
+        logger.info(f"[批量] 任务结束 - 任务ID: {job.id}, 状态: {job.status}, 成功: {job.completed}, 失败: {job.failed}, 耗时: {job.finished - job.started:.3f}秒")
+
+    async def _save_result(self, job: BatchJob, index: int, result) -> None:
+        text, tts_params = job.items[index]
+        entry = {"index": index, "voice": tts_params.voice, "text": text}
+        if isinstance(result, Exception):
+            entry.update(status="failed", error=str(result))
+            job.failed += 1
+        else:
+            file_name = f"{index:05d}.{tts_params.response_format}"
+            file_path = os.path.join(job.directory, file_name)
+            await run_blocking(_write_file, file_path, result)
+            entry.update(status="success", file_name=file_name, file_path=file_path, size=len(result))
+            job.completed += 1
+        job.results[index] = entry
+
+    def cleanup(self) -> None:
+        '''删除完成超过 job_ttl 秒的任务及其文件'''
+        now = time.time()
+        with self._lock:
+            expired = [job for job in self._jobs.values() if job.finished and now - job.finished > self.job_ttl]
+            for job in expired:
+                self._jobs.pop(job.id, None)
+        for job in expired:
+            shutil.rmtree(job.directory, ignore_errors=True)
+            logger.info(f"[批量] 过期任务已清理 - 任务ID: {job.id}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            jobs = list(self._jobs.values())
+        stats = {"queued": 0, "running": 0, "done": 0, "failed": 0}
+        for job in jobs:
+            stats[job.status] += 1
+        stats["items_completed"] = sum(job.completed for job in jobs)
+        stats["items_failed"] = sum(job.failed for job in jobs)
+        return stats
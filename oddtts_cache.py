@@ -0,0 +1,419 @@
+"""
+合成结果缓存
+
+按 (引擎类型, 音色, 语速, 音量, 音调, 语言, 输出格式, 规范化文本) 计算内容地址，
+缓存编码后的音频字节。分两级：
+
+- 内存 LRU：按字节数限制容量
+- 磁盘：位于可配置目录，按 TTL 和总大小淘汰，命中后提升到内存
+"""
+
+import asyncio
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+import unicodedata
+import uuid
+from collections import OrderedDict
+
+from oddtts.oddtts_params import TTSParams
+from oddtts.oddtts_runtime import run_blocking
+
+logger = logging.getLogger(__name__)
+
+STREAM_CHUNK_SIZE = 32 * 1024
+
+
+def normalize_text(text: str) -> str:
+    '''规范化文本：统一全角/半角、换行符，合并连续空白'''
+    text = unicodedata.normalize("NFKC", text or "")
+    text = text.replace("\r\n", "\n").replace("\r", "\n")
+    text = re.sub(r"[ \t]+", " ", text)
+    return "\n".join(line.strip() for line in text.split("\n")).strip()
+
+
+def make_cache_key(type, text: str, tts_params: TTSParams) -> str:
+    '''
+    计算缓存键，只由合成输入和输出格式决定；字节、文件和流式接口共用同一条缓存
+
+    Args:
+        type: 引擎类型
+        text: 合成文本
+        tts_params: 合成参数
+    '''
+    payload = json.dumps([
+        str(type),
+        tts_params.voice,
+        tts_params.rate,
+        tts_params.volume,
+        tts_params.pitch,
+        tts_params.locale,
+        getattr(tts_params, "response_format", "wav"),
+        normalize_text(text),
+    ], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class MemoryAudioCache:
+    '''按字节数限制容量的内存 LRU 缓存'''
+
+    def __init__(self, max_bytes: int, ttl: float = None) -> None:
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.size = 0
+        self._entries: OrderedDict[str, tuple[bytes, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> bytes:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            data, created = entry
+            if self.ttl and time.time() - created > self.ttl:
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return data
+
+    def put(self, key: str, data: bytes) -> None:
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (data, time.time())
+            self.size += len(data)
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: str) -> None:
+        data, _ = self._entries.pop(key)
+        self.size -= len(data)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class DiskAudioCache:
+    '''
+    磁盘缓存
+
+    文件按键的前两位分目录存放，修改时间即最近使用时间：
+    超过 TTL 的条目视为失效，总大小超过上限时从最久未使用的条目开始淘汰。
+    '''
+
+    def __init__(self, directory: str, max_bytes: int, ttl: float = None) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+        self.size = sum(os.path.getsize(path) for path, _ in self._scan())
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key)
+
+    def _scan(self):
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    yield path, os.path.getmtime(path)
+                except OSError:
+                    continue
+
+    def get(self, key: str) -> bytes:
+        path = self._path(key)
+        try:
+            mtime = os.path.getmtime(path)
+            if self.ttl and time.time() - mtime > self.ttl:
+                self._unlink(path)
+                return None
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+            return data
+        except FileNotFoundError:
+            return None
+
+    def put(self, key: str, data: bytes) -> None:
+        if len(data) > self.max_bytes:
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 先写临时文件再原子替换，避免并发读到写了一半的文件
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        with self._lock:
+            old_size = os.path.getsize(path) if os.path.exists(path) else 0
+            os.replace(tmp_path, path)
+            self.size += len(data) - old_size
+            if self.size > self.max_bytes:
+                self._evict()
+
+    def _unlink(self, path: str) -> None:
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except OSError:
+            return
+        with self._lock:
+            self.size -= size
+
+    def _evict(self) -> None:
+        '''淘汰过期条目及最久未使用的条目，直到总大小降到上限的90%'''
+        entries = sorted(self._scan(), key=lambda item: item[1])
+        now = time.time()
+        target = self.max_bytes * 0.9
+        for path, mtime in entries:
+            if self.size <= target and not (self.ttl and now - mtime > self.ttl):
+                break
+            try:
+                size = os.path.getsize(path)
+                os.remove(path)
+                self.size -= size
+            except OSError:
+                continue
+
+
+class RedisAudioCache:
+    '''
+    Redis 共享缓存
+
+    多个节点共享合成结果。大音频按 chunk_size 分块存储，元数据键记录块数，
+    写入时先写数据块再写元数据，读取时元数据存在即表示数据完整。
+    另提供跨节点的单飞锁，同一未缓存请求只由一个节点合成。
+
+    client 只需支持 get/set/mget/delete/eval 这几个 redis.asyncio 接口，便于用替身测试。
+    '''
+
+    # 比较令牌和删除在 Redis 内原子执行，避免锁过期被其他节点取得后误删
+    RELEASE_LOCK_SCRIPT = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
+
+    def __init__(self, client, prefix: str = "oddtts:audio:", chunk_size: int = 512 * 1024, ttl: float = None, lock_ttl: float = 60) -> None:
+        self.client = client
+        self.prefix = prefix
+        self.chunk_size = chunk_size
+        self.ttl = int(ttl) if ttl else None
+        self.lock_ttl = lock_ttl
+
+    def _meta_key(self, key: str) -> str:
+        return f"{self.prefix}{key}:meta"
+
+    def _chunk_key(self, key: str, index: int) -> str:
+        return f"{self.prefix}{key}:{index}"
+
+    def _lock_key(self, key: str) -> str:
+        return f"{self.prefix}{key}:lock"
+
+    async def get(self, key: str) -> bytes:
+        meta = await self.client.get(self._meta_key(key))
+        if meta is None:
+            return None
+        count = int(meta)
+        chunks = await self.client.mget([self._chunk_key(key, i) for i in range(count)])
+        if any(chunk is None for chunk in chunks):
+            return None
+        return b"".join(chunks)
+
+    async def put(self, key: str, data: bytes) -> None:
+        count = 0
+        for count, start in enumerate(range(0, len(data), self.chunk_size), start=1):
+            await self.client.set(self._chunk_key(key, count - 1), data[start:start + self.chunk_size], ex=self.ttl)
+        await self.client.set(self._meta_key(key), str(count), ex=self.ttl)
+
+    async def acquire_lock(self, key: str) -> str:
+        '''尝试获取合成锁，成功返回锁令牌，失败返回None'''
+        token = uuid.uuid4().hex
+        acquired = await self.client.set(self._lock_key(key), token, nx=True, px=int(self.lock_ttl * 1000))
+        return token if acquired else None
+
+    async def release_lock(self, key: str, token: str) -> None:
+        '''只有锁仍属于该令牌时才释放'''
+        await self.client.eval(self.RELEASE_LOCK_SCRIPT, 1, self._lock_key(key), token)
+
+    async def is_locked(self, key: str) -> bool:
+        return await self.client.get(self._lock_key(key)) is not None
+
+
+class SynthesisCache:
+    '''两级合成结果缓存，统计各级命中/未命中次数'''
+
+    def __init__(self, memory: MemoryAudioCache, disk: DiskAudioCache = None, remote: RedisAudioCache = None, lock_poll_interval: float = 0.1) -> None:
+        self.memory = memory
+        self.disk = disk
+        self.remote = remote
+        self.lock_poll_interval = lock_poll_interval
+        self.hits = {"memory": 0, "disk": 0, "remote": 0}
+        self.misses = 0
+        self.remote_errors = 0
+        # 磁盘读取在线程池中执行，统计计数会被多个线程同时更新
+        self._lock = threading.Lock()
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def _count_hit(self, tier: str) -> None:
+        with self._lock:
+            self.hits[tier] += 1
+
+    def _get_memory(self, key: str) -> bytes:
+        data = self.memory.get(key)
+        if data is not None:
+            self._count_hit("memory")
+        return data
+
+    def _get_disk(self, key: str) -> bytes:
+        data = self.disk.get(key)
+        if data is not None:
+            self._count_hit("disk")
+            self.memory.put(key, data)
+        return data
+
+    def _put_disk(self, key: str, data: bytes) -> None:
+        try:
+            self.disk.put(key, data)
+        except OSError as e:
+            logger.warning(f"[缓存] 写入磁盘缓存失败 - 错误信息: {str(e)}")
+
+    async def _get_remote(self, key: str) -> bytes:
+        try:
+            data = await self.remote.get(key)
+        except Exception as e:
+            self._count("remote_errors")
+            logger.warning(f"[缓存] 读取Redis缓存失败 - 错误信息: {str(e)}")
+            return None
+        if data is not None:
+            self._count_hit("remote")
+            self.memory.put(key, data)
+            if self.disk is not None:
+                await run_blocking(self._put_disk, key, data)
+        return data
+
+    async def get(self, key: str) -> bytes:
+        '''依次查询内存、磁盘和Redis缓存，磁盘读取交给线程池执行'''
+        data = self._get_memory(key)
+        if data is None and self.disk is not None:
+            data = await run_blocking(self._get_disk, key)
+        if data is None and self.remote is not None:
+            data = await self._get_remote(key)
+        if data is None:
+            self._count("misses")
+        return data
+
+    async def put(self, key: str, data: bytes) -> None:
+        if not data:
+            return
+        self.memory.put(key, data)
+        if self.disk is not None:
+            await run_blocking(self._put_disk, key, data)
+        if self.remote is not None:
+            try:
+                await self.remote.put(key, data)
+            except Exception as e:
+                self._count("remote_errors")
+                logger.warning(f"[缓存] 写入Redis缓存失败 - 错误信息: {str(e)}")
+
+    @contextlib.asynccontextmanager
+    async def single_flight(self, key: str):
+        '''
+        跨节点单飞：获得锁的节点产出None，由调用方合成并写入缓存；
+        其他节点等待持锁节点写入缓存后直接产出结果。锁过期仍未写入时自行合成。
+        未启用Redis时不加锁，直接产出None。
+        '''
+        if self.remote is None:
+            yield None
+            return
+
+        token = None
+        data = None
+        try:
+            deadline = time.time() + self.remote.lock_ttl
+            while True:
+                token = await self.remote.acquire_lock(key)
+                if token is not None or time.time() > deadline:
+                    break
+                await asyncio.sleep(self.lock_poll_interval)
+                if not await self.remote.is_locked(key):
+                    data = await self._get_remote(key)
+                    if data is not None:
+                        break
+        except Exception as e:
+            self._count("remote_errors")
+            logger.warning(f"[缓存] Redis合成锁不可用 - 错误信息: {str(e)}")
+
+        if data is not None:
+            yield data
+            return
+
+        try:
+            yield None
+        finally:
+            if token is not None:
+                try:
+                    await self.remote.release_lock(key, token)
+                except Exception as e:
+                    logger.warning(f"[缓存] 释放Redis合成锁失败 - 错误信息: {str(e)}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = {
+                "hits": dict(self.hits),
+                "misses": self.misses,
+                "memory_entries": len(self.memory),
+                "memory_bytes": self.memory.size,
+            }
+            if self.remote is not None:
+                stats["remote_errors"] = self.remote_errors
+        if self.disk is not None:
+            stats["disk_bytes"] = self.disk.size
+        return stats
+
+
+def create_redis_cache(redis_cfg: dict, ttl: float = None) -> RedisAudioCache:
+    '''根据 oddtts_config.redis_cfg 创建Redis缓存层，未启用时返回None'''
+    if not redis_cfg.get("redis_enabled", False):
+        return None
+
+    import redis.asyncio as redis
+
+    client = redis.Redis(
+        host=redis_cfg.get("redis_host", "127.0.0.1"),
+        port=redis_cfg.get("redis_port", 6379),
+        password=redis_cfg.get("redis_password") or None,
+        db=redis_cfg.get("redis_db", 0),
+    )
+    logger.info(f"[缓存] Redis缓存已启用 - 地址: {redis_cfg.get('redis_host')}:{redis_cfg.get('redis_port')}")
+    return RedisAudioCache(
+        client,
+        prefix=redis_cfg.get("redis_key_prefix", "oddtts:audio:"),
+        chunk_size=redis_cfg.get("redis_chunk_size", 512 * 1024),
+        ttl=ttl,
+        lock_ttl=redis_cfg.get("redis_lock_ttl", 60),
+    )
+
+
+def create_synthesis_cache(cache_cfg: dict, redis_cfg: dict = None) -> SynthesisCache:
+    '''根据 oddtts_config.cache_cfg/redis_cfg 创建缓存，未启用时返回None'''
+    if not cache_cfg.get("cache_enabled", False):
+        return None
+
+    ttl = cache_cfg.get("ttl") or None
+    memory = MemoryAudioCache(cache_cfg.get("memory_max_bytes", 256 * 1024 * 1024), ttl=ttl)
+    disk = None
+    if cache_cfg.get("disk_enabled", False):
+        disk = DiskAudioCache(cache_cfg.get("disk_dir", "cache/audio"), cache_cfg.get("disk_max_bytes", 2 * 1024 * 1024 * 1024), ttl=ttl)
+
+    remote = create_redis_cache(redis_cfg, ttl=ttl) if redis_cfg else None
+
+    logger.info(f"[缓存] 合成缓存已启用 - 内存上限: {memory.max_bytes} bytes, 磁盘缓存: {disk.directory if disk else '未启用'}")
+    return SynthesisCache(memory, disk, remote)
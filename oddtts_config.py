@@ -7,15 +7,44 @@ PORT = 9001
 ## working mode - Debug mode: True/False， Release mode: False/True
 Debug = False
 
+## server mode - "wsgi": Flask development server, "asgi": uvicorn with a single shared event loop
+SERVER_MODE = "wsgi"
+
 oddtts_cfg = {
     ## load model and allocate memory on startup
     "preload_model": True,
+    ## texts synthesized once on startup (with preload_model) to warm up the model, empty list disables
+    "warmup_texts": ["你好，欢迎使用奥德元语音合成。", "Hello, welcome to OddTTS."],
     ## enable gpu
     "enable_gpu": False,
     ## disable stream mode TTS
     "disable_stream": False,
     ## concurrent threads, 0 auto detect CPU cores
     "concurrent_thread": 0,
+    ## max inference jobs waiting for a free thread, requests beyond it get HTTP 429
+    "inference_queue_size": 32,
+    ## timeout of a single inference job in seconds, 0 means no timeout
+    "inference_timeout": 60,
+    ## prefork inference processes sharing one copy of the model weights (Kokoro v1.1 only), 0 disabled
+    "inference_processes": 0,
+    ## G2P (text -> phonemes) cache of the Kokoro pipelines: max entries, JSON file persisted across restarts (empty disables persistence)
+    "g2p_cache_entries": 10000,
+    "g2p_cache_path": "",
+    ## custom pronunciation dictionary for English words in Chinese text, JSON file {"word": "phonemes"}
+    "pronunciation_dict": "",
+    ## voice tensors kept in memory (Kokoro v1.1), bounded by total bytes; preload all voices on startup (with preload_model)
+    "voice_cache_max_bytes": 64 * 1024 * 1024,
+    "voice_preload": False,
+    ## long text (Kokoro): split into sentence segments of at most this many characters, synthesize up to segment_concurrency segments in parallel (0 = half of the inference threads/processes, at least 1), silence inserted between segments (ms, 0 = none; the model already ends each sentence with a pause)
+    "segment_max_chars": 100,
+    "segment_concurrency": 0,
+    "segment_silence_ms": 0,
+    ## ffmpeg fallback encoder: executable, pre-spawned standby processes per encoding profile, recycle standby processes idle longer than this (seconds)
+    "ffmpeg_path": "ffmpeg",
+    "ffmpeg_standby": 2,
+    "ffmpeg_max_idle": 300,
+    ## EdgeTTS voice list cache ttl in seconds, refreshed in background once expired (the stale list is served if refresh fails)
+    "edge_voices_ttl": 3600,
     ## tts type
     "tts_type": ODDTTS_TYPE.ODDTTS_KOKORO_V1_1,
     "local_model_dir": "ckpts",
@@ -41,6 +70,77 @@ redis_cfg = {
     "redis_host": "127.0.0.1",
     "redis_port": 7379,
     "redis_password": "",
+    "redis_db": 0,
+    ## shared audio cache: key prefix, chunk size of large clips, single-flight lock ttl in seconds
+    "redis_key_prefix": "oddtts:audio:",
+    "redis_chunk_size": 512 * 1024,
+    "redis_lock_ttl": 60,
+}
+
+## synthesis cache config
+cache_cfg = {
+    ## enable to serve repeated prompts from the cache instead of re-running the model
+    "cache_enabled": False,
+    ## in-memory LRU tier, bounded by total bytes
+    "memory_max_bytes": 256 * 1024 * 1024,
+    ## on-disk tier
+    "disk_enabled": False,
+    "disk_dir": "cache/audio",
+    "disk_max_bytes": 2 * 1024 * 1024 * 1024,
+    ## entry time-to-live in seconds, 0 means never expire
+    "ttl": 7 * 24 * 3600,
+}
+
+## batch synthesis config
+batch_cfg = {
+    ## directory of batch job outputs, empty uses the system temp dir
+    "output_dir": "",
+    ## max items in one batch job
+    "max_items": 10000,
+    ## items synthesized concurrently per job, capped at half of the inference threads/processes, 0 means that cap
+    "concurrency": 0,
+    ## an item still rejected by a full inference queue after this many seconds is recorded as failed
+    "busy_timeout": 60,
+    ## finished jobs and their files are removed after this many seconds
+    "job_ttl": 24 * 3600,
+}
+
+## incremental text synthesis over WebSocket (/api/oddtts/ws, asgi mode only)
+session_cfg = {
+    ## max characters of one synthesized sentence, 0 uses oddtts_cfg["segment_max_chars"]
+    "max_chars": 0,
+    ## max sentences waiting for synthesis per connection, more text is rejected until they finish
+    "max_pending": 64,
+}
+
+## output store of generated audio files
+store_cfg = {
+    ## dedicated directory, empty uses <system temp dir>/oddtts
+    "directory": "",
+    ## total size quota, oldest files are evicted first when exceeded
+    "max_bytes": 1024 * 1024 * 1024,
+    ## files older than this (seconds) are evicted
+    "max_age": 3600,
+    ## files served by /play or /download are evicted this many seconds after the last response finished
+    "served_ttl": 300,
+    ## background eviction interval in seconds
+    "sweep_interval": 60,
+    ## let the front web server (nginx X-Accel/apache mod_xsendfile) send /play and /download files via X-Sendfile
+    "x_sendfile": False,
+}
+
+## shared async http client of the remote engines (BertVits2)
+http_cfg = {
+    ## max pooled connections in total and per host
+    "limit": 100,
+    "limit_per_host": 8,
+    ## timeouts in seconds, 0 means no timeout
+    "connect_timeout": 10,
+    "read_timeout": 60,
+    "total_timeout": 300,
+    ## retries with exponential backoff starting at backoff seconds: GET on connection errors, timeouts and 429/5xx; POST (synthesis) only when the connection could not be established
+    "retries": 2,
+    "backoff": 0.5,
 }
 
 ## log config
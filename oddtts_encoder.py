@@ -0,0 +1,447 @@
+"""
+音频编码
+
+直接从模型输出的浮点数组编码为目标格式，不再经过 numpy→WAV→pydub→ffmpeg 的往返：
+
+- wav/pcm: 浮点数组直接量化写入预分配的输出缓冲区，不生成中间WAV
+- mp3/flac/ogg/opus: 通过 libsndfile(soundfile) 在进程内编码，不启动子进程
+- 其他格式，或 libsndfile 不支持当前参数时（如 opus 不支持的采样率），回退到常驻 ffmpeg 进程池
+"""
+
+import io
+import logging
+import os
+import struct
+from abc import ABC, abstractmethod
+
+import numpy as np
+import soundfile as sf
+
+logger = logging.getLogger(__name__)
+
+# Kokoro 模型输出的采样率
+SAMPLE_RATE = 24000
+
+WAV_HEADER_SIZE = 44
+# 浮点转PCM时每次处理的采样数，限制临时数组大小
+PCM_BLOCK_SAMPLES = 64 * 1024
+
+# 输出格式 -> libsndfile (format, subtype)
+SOUNDFILE_FORMATS = {
+    "mp3": ("MP3", "MPEG_LAYER_III"),
+    "flac": ("FLAC", "PCM_16"),
+    "ogg": ("OGG", "VORBIS"),
+    "opus": ("OGG", "OPUS"),
+}
+
+# 各采样率下 MPEG Layer III 可用的码率范围(kbps)：MPEG-1 / MPEG-2 / MPEG-2.5
+_MP3_BITRATE_RANGES = (
+    ((32000, 44100, 48000), (32, 320)),
+    ((16000, 22050, 24000), (8, 160)),
+    ((8000, 11025, 12000), (8, 64)),
+)
+
+
+def wav_header(sample_rate: int, num_frames: int = None, channels: int = 1, bits_per_sample: int = 16) -> bytes:
+    """
+    生成44字节的WAV文件头
+
+    Args:
+        sample_rate: 采样率
+        num_frames: 采样帧数，为None时表示长度未知（流式），RIFF/data长度字段填充为0xFFFFFFFF
+        channels: 声道数
+        bits_per_sample: 采样位深
+
+    Returns:
+        WAV文件头
+    """
+    block_align = channels * bits_per_sample // 8
+    byte_rate = sample_rate * block_align
+    if num_frames is None:
+        riff_size = data_size = 0xFFFFFFFF
+    else:
+        data_size = num_frames * block_align
+        riff_size = data_size + WAV_HEADER_SIZE - 8
+    return b"".join([
+        b"RIFF", struct.pack("<I", riff_size), b"WAVE",
+        b"fmt ", struct.pack("<IHHIIHH", 16, 1, channels, sample_rate, byte_rate, block_align, bits_per_sample),
+        b"data", struct.pack("<I", data_size),
+    ])
+
+
+def wav_stream_header(sample_rate: int, channels: int = 1, bits_per_sample: int = 16) -> bytes:
+    """
+    生成流式WAV文件头（数据长度未知）
+    """
+    return wav_header(sample_rate, None, channels, bits_per_sample)
+
+
+def finalize_stream(output_format: str, data: bytes) -> bytes:
+    """
+    把流式编码器的完整输出整理成完整音频文件，不能代替完整文件时返回None
+
+    流式WAV头在这里补上长度字段；流式FLAC无法回写总采样数，libsndfile 不能读取，不作为完整文件
+    """
+    output_format = output_format.lower()
+    if output_format == "flac":
+        return None
+    if output_format == "wav":
+        if len(data) < WAV_HEADER_SIZE or data[:4] != b"RIFF":
+            return None
+        data_size = len(data) - WAV_HEADER_SIZE
+        return b"".join([
+            b"RIFF", struct.pack("<I", data_size + WAV_HEADER_SIZE - 8), data[8:WAV_HEADER_SIZE - 4],
+            struct.pack("<I", data_size), data[WAV_HEADER_SIZE:],
+        ])
+    return data
+
+
+def _channels(audio_numpy: np.ndarray) -> int:
+    return 1 if audio_numpy.ndim == 1 else audio_numpy.shape[1]
+
+
+def _write_pcm16(audio_numpy: np.ndarray, out, offset: int = 0) -> None:
+    '''将[-1, 1]范围的浮点音频量化为16位小端PCM，直接写入 out 缓冲区的 offset 处'''
+    pcm = np.frombuffer(out, dtype="<i2", count=audio_numpy.size, offset=offset)
+    samples = audio_numpy.reshape(-1)
+    scratch = np.empty(min(samples.size, PCM_BLOCK_SAMPLES), dtype=np.float32)
+    for start in range(0, samples.size, PCM_BLOCK_SAMPLES):
+        block = scratch[:min(PCM_BLOCK_SAMPLES, samples.size - start)]
+        np.clip(samples[start:start + block.size], -1.0, 1.0, out=block)
+        np.multiply(block, 32767, out=block)
+        np.copyto(pcm[start:start + block.size], block, casting="unsafe")
+
+
+def float_to_pcm16(audio_numpy: np.ndarray) -> bytes:
+    """
+    将[-1, 1]范围的浮点音频转换为16位小端PCM字节
+    """
+    out = bytearray(audio_numpy.size * 2)
+    _write_pcm16(audio_numpy, out)
+    return bytes(out)
+
+
+def encode_wav(audio_numpy: np.ndarray, sample_rate: int) -> bytes:
+    """
+    编码为16位PCM WAV，文件头和采样数据写入同一块缓冲区
+    """
+    channels = _channels(audio_numpy)
+    out = bytearray(WAV_HEADER_SIZE + audio_numpy.size * 2)
+    out[:WAV_HEADER_SIZE] = wav_header(sample_rate, audio_numpy.size // channels, channels)
+    _write_pcm16(audio_numpy, out, WAV_HEADER_SIZE)
+    return bytes(out)
+
+
+def _mp3_compression_level(sample_rate: int, bitrate: str) -> float:
+    '''将 "128k" 形式的码率换算为 libsndfile 的压缩级别（0 为最高码率，1 为最低码率）'''
+    kbps = int(str(bitrate).lower().rstrip("k"))
+    low, high = 8, 160
+    for rates, bitrate_range in _MP3_BITRATE_RANGES:
+        if sample_rate in rates:
+            low, high = bitrate_range
+            break
+    kbps = min(max(kbps, low), high)
+    return (high - kbps) / (high - low)
+
+
+def encode_with_soundfile(audio_numpy: np.ndarray, sample_rate: int, output_format: str, bitrate: str = "128k") -> bytes:
+    """
+    通过 libsndfile 在进程内编码
+    """
+    sf_format, subtype = SOUNDFILE_FORMATS[output_format]
+    kwargs = {}
+    if output_format == "mp3":
+        kwargs = {"compression_level": _mp3_compression_level(sample_rate, bitrate), "bitrate_mode": "CONSTANT"}
+
+    output_buffer = io.BytesIO()
+    sf.write(output_buffer, audio_numpy, sample_rate, format=sf_format, subtype=subtype, **kwargs)
+    return output_buffer.getvalue()
+
+
+def encode_with_ffmpeg(audio_numpy: np.ndarray, sample_rate: int, output_format: str, bitrate: str = "128k") -> bytes:
+    """
+    通过常驻 ffmpeg 进程池编码，PCM 数据直接写入 ffmpeg 标准输入
+    """
+    from oddtts.oddtts_ffmpeg import get_ffmpeg_pool
+
+    return get_ffmpeg_pool().encode(float_to_pcm16(audio_numpy), output_format, sample_rate, _channels(audio_numpy), bitrate)
+
+
+def encode_audio(audio_numpy: np.ndarray, sample_rate: int, output_format: str = "wav", bitrate: str = "128k") -> bytes:
+    """
+    将浮点音频数组编码为指定格式的完整音频
+
+    Args:
+        audio_numpy: 音频数据，形状为 (样本数,) 或 (样本数, 声道数)
+        sample_rate: 采样率
+        output_format: 输出格式（"wav", "pcm", "mp3", "flac", "ogg", "opus"等）
+        bitrate: 比特率（仅对有损格式有效）
+
+    Returns:
+        音频字节流
+    """
+    output_format = output_format.lower()
+    if output_format == "wav":
+        return encode_wav(audio_numpy, sample_rate)
+    if output_format == "pcm":
+        return float_to_pcm16(audio_numpy)
+
+    if output_format in SOUNDFILE_FORMATS:
+        try:
+            return encode_with_soundfile(audio_numpy, sample_rate, output_format, bitrate)
+        except Exception as e:
+            logger.debug(f"[编码] libsndfile 编码失败，回退到 ffmpeg - 格式: {output_format}, 错误信息: {str(e)}")
+
+    return encode_with_ffmpeg(audio_numpy, sample_rate, output_format, bitrate)
+
+
+def encode_audio_to_file(audio_numpy: np.ndarray, sample_rate: int, output_format: str = "wav", output_path: str = None, bitrate: str = "128k") -> str:
+    """
+    将浮点音频数组编码后写入文件，output_path 为None时在托管存储目录中自动生成
+
+    Returns:
+        输出文件路径
+    """
+    if output_path is None:
+        from oddtts.oddtts_store import get_output_store
+        output_path = get_output_store().new_path(output_format)
+
+    data = encode_audio(audio_numpy, sample_rate, output_format, bitrate)
+    with open(output_path, "wb") as f:
+        f.write(data)
+    return output_path
+
+
+def _mp3_frame_length(header: bytes) -> int:
+    '''根据4字节帧头计算 MPEG Layer III 帧长，不是合法帧头时返回0'''
+    if len(header) < 4 or header[0] != 0xFF or (header[1] & 0xE0) != 0xE0:
+        return 0
+    version_bits = (header[1] >> 3) & 0x03
+    bitrate_index = (header[2] >> 4) & 0x0F
+    sample_rate_index = (header[2] >> 2) & 0x03
+    padding = (header[2] >> 1) & 0x01
+    if version_bits == 1 or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return 0
+
+    if version_bits == 3:
+        bitrates = (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320)
+        sample_rates = (44100, 48000, 32000)
+        samples_per_frame = 1152
+    else:
+        bitrates = (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160)
+        sample_rates = (22050, 24000, 16000) if version_bits == 2 else (11025, 12000, 8000)
+        samples_per_frame = 576
+
+    return samples_per_frame // 8 * bitrates[bitrate_index] * 1000 // sample_rates[sample_rate_index] + padding
+
+
+def strip_mp3_info_frame(data: bytes) -> bytes:
+    """
+    去掉编码器写在开头的 Xing/Info 帧，使多个片段可以直接拼接成一条MP3流
+    """
+    frame_length = _mp3_frame_length(data[:4])
+    if frame_length and (b"Xing" in data[4:64] or b"Info" in data[4:64]):
+        return data[frame_length:]
+    return data
+
+
+class _StreamSink:
+    '''
+    libsndfile 的虚拟输出文件：记录写入的数据，供流式编码器逐步取走
+
+    编码器结束时会回到文件头部补写总长度等信息（FLAC STREAMINFO、MP3 Info帧），
+    已经发送出去的部分无法再修改，这些补写直接忽略；各格式在这些字段为0时均视为长度未知
+    '''
+
+    def __init__(self) -> None:
+        self._buffer = bytearray()
+        self._pos = 0
+        self._emitted = 0
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            self._pos = offset
+        elif whence == io.SEEK_CUR:
+            self._pos += offset
+        else:
+            self._pos = self._emitted + len(self._buffer) + offset
+        return self._pos
+
+    def tell(self) -> int:
+        return self._pos
+
+    def read(self, size: int = -1) -> bytes:
+        return b""
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        size = len(data)
+        start = self._pos - self._emitted
+        self._pos += len(data)
+        if start < 0:
+            data = data[-start:]
+            start = 0
+        if data:
+            end = start + len(data)
+            if end > len(self._buffer):
+                self._buffer.extend(bytes(end - len(self._buffer)))
+            self._buffer[start:end] = data
+        return size
+
+    def pending(self) -> int:
+        return len(self._buffer)
+
+    def take(self, keep: int = 0) -> bytes:
+        '''取走已写入的数据，保留末尾 keep 字节（可能还会被改写）'''
+        size = max(0, len(self._buffer) - keep)
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        self._emitted += size
+        return data
+
+
+class StreamEncoder(ABC):
+    '''
+    流式编码器：逐段写入浮点音频，返回目前为止可以发送的编码数据
+
+    feed(audio_numpy) 返回新产生的字节（可能为空），close() 返回剩余数据
+    '''
+
+    @abstractmethod
+    def feed(self, audio_numpy: np.ndarray) -> bytes:
+        pass
+
+    def close(self) -> bytes:
+        return b""
+
+    def abort(self) -> None:
+        '''客户端断开等情况下放弃编码，释放资源'''
+
+
+class PCMStreamEncoder(StreamEncoder):
+    '''wav/pcm：直接输出16位PCM，wav 在首段前加流式WAV头'''
+
+    def __init__(self, sample_rate: int, with_header: bool) -> None:
+        self.sample_rate = sample_rate
+        self._header_pending = with_header
+
+    def feed(self, audio_numpy: np.ndarray) -> bytes:
+        if not self._header_pending:
+            return float_to_pcm16(audio_numpy)
+        self._header_pending = False
+        out = bytearray(WAV_HEADER_SIZE + audio_numpy.size * 2)
+        out[:WAV_HEADER_SIZE] = wav_stream_header(self.sample_rate, _channels(audio_numpy))
+        _write_pcm16(audio_numpy, out, WAV_HEADER_SIZE)
+        return bytes(out)
+
+
+class SoundFileStreamEncoder(StreamEncoder):
+    '''mp3/flac/ogg/opus：同一个 libsndfile 编码器连续编码整条流，片段之间没有编码器延迟造成的间隙'''
+
+    # 文件开头可能被补写的字节数，发送前先保留
+    _HEADER_HOLD = {"mp3": 2048}
+
+    def __init__(self, sample_rate: int, output_format: str, channels: int = 1, bitrate: str = "128k") -> None:
+        self.output_format = output_format
+        self._sink = _StreamSink()
+        sf_format, subtype = SOUNDFILE_FORMATS[output_format]
+        kwargs = {}
+        if output_format == "mp3":
+            kwargs = {"compression_level": _mp3_compression_level(sample_rate, bitrate), "bitrate_mode": "CONSTANT"}
+        self._file = sf.SoundFile(self._sink, "w", sample_rate, channels, format=sf_format, subtype=subtype, **kwargs)
+        self._started = False
+
+    def _take(self, final: bool = False) -> bytes:
+        if self._started:
+            return self._sink.take()
+        hold = 0 if final else self._HEADER_HOLD.get(self.output_format, 0)
+        if self._sink.pending() <= hold:
+            return b""
+        self._started = True
+        data = self._sink.take()
+        # 首帧是占位的 Xing/Info 帧，结束时才会补写，流式输出时去掉
+        return strip_mp3_info_frame(data) if self.output_format == "mp3" else data
+
+    def feed(self, audio_numpy: np.ndarray) -> bytes:
+        self._file.write(audio_numpy)
+        return self._take()
+
+    def close(self) -> bytes:
+        self._file.close()
+        return self._take(final=True)
+
+    def abort(self) -> None:
+        if not self._file.closed:
+            self._file.close()
+
+
+class FFmpegStreamEncoder(StreamEncoder):
+    '''aac 等 libsndfile 不支持的格式：交给一个 ffmpeg 进程持续编码'''
+
+    def __init__(self, sample_rate: int, output_format: str, channels: int = 1, bitrate: str = "128k") -> None:
+        from oddtts.oddtts_ffmpeg import get_ffmpeg_pool
+
+        self._encoder = get_ffmpeg_pool().acquire(output_format, sample_rate, channels, bitrate)
+
+    def feed(self, audio_numpy: np.ndarray) -> bytes:
+        return self._encoder.feed(float_to_pcm16(audio_numpy))
+
+    def close(self) -> bytes:
+        return self._encoder.close()
+
+    def abort(self) -> None:
+        self._encoder.kill()
+
+
+def create_stream_encoder(output_format: str, sample_rate: int, channels: int = 1, bitrate: str = "128k") -> StreamEncoder:
+    """
+    创建流式编码器
+
+    Args:
+        output_format: 输出格式（见 SUPPORTED_FORMATS）
+        sample_rate: 采样率
+        channels: 声道数
+        bitrate: 比特率（仅对有损格式有效）
+    """
+    output_format = output_format.lower()
+    if output_format in ("wav", "pcm"):
+        return PCMStreamEncoder(sample_rate, with_header=output_format == "wav")
+
+    if output_format in SOUNDFILE_FORMATS:
+        try:
+            return SoundFileStreamEncoder(sample_rate, output_format, channels, bitrate)
+        except Exception as e:
+            logger.debug(f"[编码] libsndfile 流式编码器创建失败，回退到 ffmpeg - 格式: {output_format}, 错误信息: {str(e)}")
+
+    return FFmpegStreamEncoder(sample_rate, output_format, channels, bitrate)
+
+
+# 支持的输出格式及对应的 MIME 类型
+AUDIO_MIME_TYPES = {
+    "wav": "audio/wav",
+    "mp3": "audio/mpeg",
+    "opus": "audio/ogg; codecs=opus",
+    "ogg": "audio/ogg",
+    "flac": "audio/flac",
+    "aac": "audio/aac",
+    "pcm": "audio/pcm",
+}
+
+SUPPORTED_FORMATS = tuple(AUDIO_MIME_TYPES)
+
+
+def audio_mime_type(output_format: str) -> str:
+    return AUDIO_MIME_TYPES.get(output_format.lower(), "application/octet-stream")
+
+
+def audio_headers(output_format: str, sample_rate: int, channels: int = 1) -> dict:
+    """
+    响应头：pcm 没有文件头，通过响应头告知客户端采样率、声道数和采样格式
+    """
+    if output_format.lower() != "pcm":
+        return {}
+    return {
+        "X-Sample-Rate": str(sample_rate),
+        "X-Channels": str(channels),
+        "X-Sample-Format": "s16le",
+    }
@@ -0,0 +1,250 @@
+"""
+常驻 ffmpeg 编码进程池
+
+libsndfile 无法处理的格式（如 aac）仍需要 ffmpeg。原来每次编码都由 pydub 新启动一个 ffmpeg 进程，
+短句合成时进程启动的开销远大于实际编码时间。
+
+ffmpeg 在标准输入关闭(EOF)时才会刷新编码器并写出容器尾部，一个进程只能完成一个编码任务，
+无法在任务之间复用。因此进程池为每种编码参数预先启动若干个待命进程（已完成 exec 和库加载，
+阻塞在读取标准输入上），请求到来时直接取用，任务结束后在后台补充新的待命进程：
+
+- 取用时做健康检查，已退出的进程直接丢弃
+- 待命超过 max_idle 秒的进程回收重启，避免长期占用资源
+"""
+
+import atexit
+import logging
+import shutil
+import subprocess
+import threading
+import time
+
+import oddtts.oddtts_config as config
+
+logger = logging.getLogger(__name__)
+
+# 输出格式 -> (编码参数, 容器格式, 是否使用码率参数)
+# vorbis 在低采样率下不接受大多数固定码率，改用质量参数
+FFMPEG_CODECS = {
+    "mp3": (["-c:a", "libmp3lame", "-write_xing", "0", "-id3v2_version", "0"], "mp3", True),
+    "aac": (["-c:a", "aac"], "adts", True),
+    "opus": (["-c:a", "libopus"], "ogg", True),
+    "ogg": (["-c:a", "libvorbis", "-q:a", "4"], "ogg", False),
+    "flac": (["-c:a", "flac"], "flac", False),
+}
+
+READ_CHUNK_SIZE = 64 * 1024
+
+
+class FFmpegEncoder:
+    '''
+    一个 ffmpeg 编码进程：向标准输入写入16位PCM，后台线程持续读取编码输出和错误输出
+
+    feed() 返回目前为止已编码的数据，close() 关闭输入并返回剩余数据。
+    错误输出也必须持续读取，否则 ffmpeg 写满 stderr 管道后会阻塞，feed()/close() 随之卡死
+    '''
+
+    def __init__(self, process: subprocess.Popen, profile: tuple) -> None:
+        self.process = process
+        self.profile = profile
+        self.created = time.time()
+        self._chunks = []
+        self._errors = []
+        self._lock = threading.Lock()
+        self._reader = threading.Thread(target=self._read_output, name="oddtts-ffmpeg-reader", daemon=True)
+        self._reader.start()
+        self._error_reader = threading.Thread(target=self._read_errors, name="oddtts-ffmpeg-stderr", daemon=True)
+        self._error_reader.start()
+
+    def _read_output(self) -> None:
+        while True:
+            data = self.process.stdout.read1(READ_CHUNK_SIZE)
+            if not data:
+                break
+            with self._lock:
+                self._chunks.append(data)
+
+    def _read_errors(self) -> None:
+        for line in self.process.stderr:
+            self._errors.append(line)
+
+    def _drain(self) -> bytes:
+        with self._lock:
+            data = b"".join(self._chunks)
+            self._chunks.clear()
+        return data
+
+    def is_alive(self) -> bool:
+        return self.process.poll() is None
+
+    def feed(self, pcm: bytes) -> bytes:
+        self.process.stdin.write(pcm)
+        self.process.stdin.flush()
+        return self._drain()
+
+    def close(self, timeout: float = 30) -> bytes:
+        self.process.stdin.close()
+        self._reader.join(timeout)
+        returncode = self.process.wait(timeout)
+        self._error_reader.join(timeout)
+        if returncode != 0:
+            error = b"".join(self._errors).decode("utf-8", errors="replace").strip()
+            raise RuntimeError(f"ffmpeg 编码失败(退出码: {returncode}): {error}")
+        return self._drain()
+
+    def kill(self) -> None:
+        if self.is_alive():
+            self.process.kill()
+        self.process.wait()
+
+
+class FFmpegEncoderPool:
+    '''按编码参数分组的待命 ffmpeg 进程池'''
+
+    def __init__(self, ffmpeg_path: str = "ffmpeg", standby: int = 2, max_idle: float = 300) -> None:
+        self.ffmpeg_path = ffmpeg_path
+        self.standby = standby
+        self.max_idle = max_idle
+        self._standby: dict[tuple, list[FFmpegEncoder]] = {}
+        self._refilling = set()
+        self._lock = threading.Lock()
+        self._closed = False
+        self.warm = 0
+        self.cold = 0
+        self.recycled = 0
+        self.failed = 0
+
+    def available(self) -> bool:
+        return shutil.which(self.ffmpeg_path) is not None
+
+    def _command(self, profile: tuple) -> list[str]:
+        output_format, sample_rate, channels, bitrate = profile
+        codec_args, container, use_bitrate = FFMPEG_CODECS.get(output_format, ([], output_format, True))
+        command = [
+            self.ffmpeg_path, "-hide_banner", "-loglevel", "error", "-nostdin",
+            # 原始PCM无需探测，收到数据立即开始编码，而不是先缓冲到探测上限或EOF
+            # 不能加 -fflags nobuffer：它会丢弃探测时读入的数据，导致开头的音频缺失
+            "-probesize", "32", "-analyzeduration", "0",
+            "-f", "s16le", "-ar", str(sample_rate), "-ac", str(channels), "-i", "pipe:0",
+            *codec_args,
+        ]
+        if bitrate and use_bitrate:
+            command += ["-b:a", bitrate]
+        return command + ["-flush_packets", "1", "-f", container, "pipe:1"]
+
+    def _spawn(self, profile: tuple) -> FFmpegEncoder:
+        try:
+            process = subprocess.Popen(
+                self._command(profile),
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+            )
+        except FileNotFoundError:
+            raise RuntimeError(f"未找到 ffmpeg: {self.ffmpeg_path}")
+        return FFmpegEncoder(process, profile)
+
+    def _take_standby(self, profile: tuple) -> FFmpegEncoder:
+        '''取出一个健康的待命进程，顺带回收已退出或待命过久的进程'''
+        now = time.time()
+        stale = []
+        encoder = None
+        with self._lock:
+            encoders = self._standby.get(profile, [])
+            while encoders:
+                candidate = encoders.pop()
+                if candidate.is_alive() and now - candidate.created <= self.max_idle:
+                    encoder = candidate
+                    break
+                stale.append(candidate)
+
+        for candidate in stale:
+            self.recycled += 1
+            candidate.kill()
+        return encoder
+
+    def _refill(self, profile: tuple) -> None:
+        try:
+            while not self._closed:
+                with self._lock:
+                    if len(self._standby.get(profile, [])) >= self.standby:
+                        break
+                encoder = self._spawn(profile)
+                with self._lock:
+                    self._standby.setdefault(profile, []).append(encoder)
+        except Exception as e:
+            logger.warning(f"[系统] 补充 ffmpeg 待命进程失败 - 错误信息: {str(e)}")
+        finally:
+            with self._lock:
+                self._refilling.discard(profile)
+
+    def _refill_async(self, profile: tuple) -> None:
+        if self.standby <= 0:
+            return
+        with self._lock:
+            if profile in self._refilling:
+                return
+            self._refilling.add(profile)
+        threading.Thread(target=self._refill, args=(profile,), name="oddtts-ffmpeg-refill", daemon=True).start()
+
+    def acquire(self, output_format: str, sample_rate: int, channels: int = 1, bitrate: str = "128k") -> FFmpegEncoder:
+        '''取一个编码进程，没有待命进程时现场启动'''
+        if self._closed:
+            raise RuntimeError("ffmpeg 进程池已关闭")
+        profile = (output_format, sample_rate, channels, bitrate)
+        encoder = self._take_standby(profile)
+        if encoder is None:
+            encoder = self._spawn(profile)
+            self.cold += 1
+        else:
+            self.warm += 1
+        self._refill_async(profile)
+        return encoder
+
+    def encode(self, pcm: bytes, output_format: str, sample_rate: int, channels: int = 1, bitrate: str = "128k") -> bytes:
+        '''一次性编码一段完整的16位PCM'''
+        encoder = self.acquire(output_format, sample_rate, channels, bitrate)
+        try:
+            return encoder.feed(pcm) + encoder.close()
+        except Exception:
+            self.failed += 1
+            encoder.kill()
+            raise
+
+    def stats(self) -> dict:
+        with self._lock:
+            standby = sum(len(encoders) for encoders in self._standby.values())
+        return {
+            "standby": standby,
+            "warm": self.warm,
+            "cold": self.cold,
+            "recycled": self.recycled,
+            "failed": self.failed,
+        }
+
+    def close(self) -> None:
+        self._closed = True
+        with self._lock:
+            encoders = [encoder for encoders in self._standby.values() for encoder in encoders]
+            self._standby.clear()
+        for encoder in encoders:
+            encoder.kill()
+
+
+_ffmpeg_pool: FFmpegEncoderPool = None
+_lock = threading.Lock()
+
+
+def get_ffmpeg_pool() -> FFmpegEncoderPool:
+    '''获取进程内唯一的 ffmpeg 编码进程池，首次编码时才会启动进程'''
+    global _ffmpeg_pool
+    if _ffmpeg_pool is None:
+        with _lock:
+            if _ffmpeg_pool is None:
+                _ffmpeg_pool = FFmpegEncoderPool(
+                    ffmpeg_path=config.oddtts_cfg.get("ffmpeg_path", "ffmpeg"),
+                    standby=config.oddtts_cfg.get("ffmpeg_standby", 2),
+                    max_idle=config.oddtts_cfg.get("ffmpeg_max_idle", 300),
+                )
+                atexit.register(_ffmpeg_pool.close)
+    return _ffmpeg_pool
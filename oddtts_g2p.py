@@ -0,0 +1,156 @@
+"""
+G2P（文本转音素）结果缓存
+
+KPipeline 每次调用都会重新对文本做 G2P，中英混合文本中的英文片段还要经由 en_callable
+再走一遍英文管道。相同的句子、高频词和品牌名反复出现时，这些计算都是重复的：
+
+- PhonemeCache：按命名空间（zh/en）缓存 文本片段 -> 音素，LRU 按条目数淘汰，
+  可选持久化到 JSON 文件，重启后直接加载
+- 自定义发音词典：{"单词": "音素"}，优先于缓存和 G2P，不会被淘汰
+- CachedG2P：包装 KPipeline.g2p，命中缓存时跳过 G2P
+"""
+
+import atexit
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# 内置发音
+DEFAULT_PRONUNCIATIONS = {
+    "Kokoro": "kˈOkəɹO",
+}
+
+
+def load_pronunciations(path: str) -> dict[str, str]:
+    '''读取自定义发音词典 JSON 文件 {"单词": "音素"}'''
+    with open(path, "r", encoding="utf-8") as f:
+        pronunciations = json.load(f)
+    if not isinstance(pronunciations, dict):
+        raise ValueError(f"发音词典格式错误，应为 {{\"单词\": \"音素\"}}: {path}")
+    return {str(word): str(phonemes) for word, phonemes in pronunciations.items()}
+
+
+class PhonemeCache:
+    '''文本片段 -> 音素 的 LRU 缓存，按命名空间区分语言'''
+
+    def __init__(self, max_entries: int = 10000, path: str = None, pronunciations: dict[str, str] = None) -> None:
+        self.max_entries = max_entries
+        self.path = path
+        self.pronunciations = dict(pronunciations or {})
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[tuple[str, str], str] = OrderedDict()
+        self._dirty = False
+        self._lock = threading.Lock()
+        if path:
+            self.load()
+            atexit.register(self.save)
+
+    def get(self, namespace: str, text: str) -> str:
+        with self._lock:
+            phonemes = self._entries.get((namespace, text))
+            if phonemes is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end((namespace, text))
+            self.hits += 1
+            return phonemes
+
+    def put(self, namespace: str, text: str, phonemes: str) -> None:
+        with self._lock:
+            self._entries[(namespace, text)] = phonemes
+            self._entries.move_to_end((namespace, text))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._dirty = True
+
+    def lookup(self, namespace: str, text: str, g2p) -> str:
+        '''依次查发音词典、缓存，都未命中时调用 g2p(text) 并缓存结果'''
+        phonemes = self.pronunciations.get(text)
+        if phonemes is not None:
+            return phonemes
+        phonemes = self.get(namespace, text)
+        if phonemes is None:
+            phonemes = g2p(text)
+            if phonemes:
+                self.put(namespace, text, phonemes)
+        return phonemes
+
+    def load(self) -> None:
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception as e:
+            logger.warning(f"[缓存] 加载G2P缓存失败 - 文件: {self.path}, 错误信息: {str(e)}")
+            return
+
+        with self._lock:
+            for namespace, entries in data.items():
+                for text, phonemes in entries.items():
+                    self._entries[(namespace, text)] = phonemes
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        logger.info(f"[缓存] 已加载G2P缓存 - 文件: {self.path}, 条目数: {len(self._entries)}")
+
+    def save(self) -> None:
+        '''写入 JSON 文件，先写临时文件再替换，避免中途退出留下损坏的文件'''
+        if not self.path or not self._dirty:
+            return
+        with self._lock:
+            data = {}
+            for (namespace, text), phonemes in self._entries.items():
+                data.setdefault(namespace, {})[text] = phonemes
+            self._dirty = False
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(temp_path, self.path)
+        logger.info(f"[缓存] G2P缓存已保存 - 文件: {self.path}, 条目数: {len(self._entries)}")
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "pronunciations": len(self.pronunciations),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+class CachedG2P:
+    '''
+    包装中文管道的 g2p：g2p(text) 返回 (音素, tokens)，中文 G2P 的 tokens 恒为 None，可以只缓存音素
+    '''
+
+    def __init__(self, g2p, cache: PhonemeCache, namespace: str) -> None:
+        self.g2p = g2p
+        self.cache = cache
+        self.namespace = namespace
+
+    def __getattr__(self, name):
+        return getattr(self.g2p, name)
+
+    def __call__(self, text: str):
+        return self.cache.lookup(self.namespace, text, lambda t: self.g2p(t)[0]), None
+
+
+def create_phoneme_cache(cfg: dict) -> PhonemeCache:
+    '''根据 oddtts_config.oddtts_cfg 创建 G2P 缓存，并加载内置和自定义发音词典'''
+    pronunciations = dict(DEFAULT_PRONUNCIATIONS)
+    if cfg.get("pronunciation_dict"):
+        pronunciations.update(load_pronunciations(cfg["pronunciation_dict"]))
+    return PhonemeCache(
+        max_entries=cfg.get("g2p_cache_entries", 10000),
+        path=cfg.get("g2p_cache_path") or None,
+        pronunciations=pronunciations,
+    )
@@ -0,0 +1,219 @@
+"""
+共享的异步HTTP客户端
+
+远程引擎（如 BertVits2 的 Gradio 服务）原来在 async 方法里直接调用 requests，
+每次请求都新建连接（包括 TLS 握手），并且在远端合成期间阻塞整个事件循环。
+这里基于 aiohttp 提供进程内共享的客户端：
+
+- 连接池和 keep-alive，按主机限制并发连接数
+- 连接、读取和总超时
+- 按指数退避重试：GET 等幂等请求在连接错误、超时和 429/5xx 时重试；
+  POST 等非幂等请求（如合成请求）只在连接建立失败、请求确定未发出时重试，避免远端重复合成
+- 流式下载：按块读取响应，直接写入文件或逐块产出，不在内存中缓冲完整音频
+- 会话只能在创建它的事件循环上关闭：事件循环更换时旧会话交给旧循环关闭，
+  ASGI 服务器关闭时由 lifespan 关闭，其他情况在进程退出时关闭
+"""
+
+import asyncio
+import atexit
+import logging
+import os
+import threading
+
+import aiohttp
+
+import oddtts.oddtts_config as config
+from oddtts.oddtts_runtime import run_blocking
+
+logger = logging.getLogger(__name__)
+
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS", "PUT", "DELETE")
+
+
+class HttpError(RuntimeError):
+    '''请求失败（重试用尽或返回了不可重试的错误状态码）'''
+
+    def __init__(self, message: str, status: int = None) -> None:
+        super().__init__(message)
+        self.status = status
+
+
+def _open_file(path: str):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    return open(path, "wb")
+
+
+class HttpClient:
+    '''进程内共享的 aiohttp 会话，会话在首次请求时于当前事件循环上创建'''
+
+    def __init__(self, limit: int = 100, limit_per_host: int = 8, connect_timeout: float = 10, read_timeout: float = 60,
+                 total_timeout: float = 300, retries: int = 2, backoff: float = 0.5) -> None:
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.timeout = aiohttp.ClientTimeout(total=total_timeout or None, connect=connect_timeout or None, sock_read=read_timeout or None)
+        self.retries = retries
+        self.backoff = backoff
+        self._session: aiohttp.ClientSession = None
+        self._loop = None
+        self.requests = 0
+        self.retried = 0
+        self.failed = 0
+
+    def _close_stale_session(self) -> None:
+        '''在会话所属的事件循环上关闭它；该循环已停止时连接随之失效，只能丢弃'''
+        session, loop = self._session, self._loop
+        self._session = None
+        if session is None or session.closed:
+            return
+        if loop.is_running() and not loop.is_closed():
+            asyncio.run_coroutine_threadsafe(session.close(), loop)
+        else:
+            logger.debug("[请求] HTTP会话所属的事件循环已停止，丢弃该会话")
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # 会话绑定创建时的事件循环，循环变化时（如 ASGI 服务器接管事件循环、测试中多次 asyncio.run）关闭旧会话后重新创建
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._close_stale_session()
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.limit, limit_per_host=self.limit_per_host, keepalive_timeout=30)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+            self._loop = loop
+        return self._session
+
+    async def _send(self, method: str, url: str, retries: int = None, **kwargs) -> aiohttp.ClientResponse:
+        '''
+        发送请求并返回状态码正常的响应，调用方负责 release()；可重试的失败按指数退避重试
+
+        非幂等请求可能已被远端处理，超时、读取中断和错误状态码都不重试，只重试连接建立失败
+        '''
+        retries = self.retries if retries is None else retries
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+        session = self._get_session()
+        attempt = 0
+        while True:
+            self.requests += 1
+            try:
+                response = await session.request(method, url, **kwargs)
+                if response.status < 400:
+                    return response
+                body = (await response.text(errors="replace"))[:200]
+                response.release()
+                error = HttpError(f"HTTP {response.status}: {method} {url} - {body}", response.status)
+                if response.status not in RETRY_STATUSES or not idempotent:
+                    self.failed += 1
+                    raise error
+            except aiohttp.ClientConnectorError as e:
+                error = HttpError(f"连接失败: {method} {url} - {type(e).__name__}: {str(e)}")
+            except (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError) as e:
+                error = HttpError(f"请求失败: {method} {url} - {type(e).__name__}: {str(e)}")
+                if not idempotent:
+                    self.failed += 1
+                    raise error
+
+            if attempt >= retries:
+                self.failed += 1
+                raise error
+            delay = self.backoff * (2 ** attempt)
+            attempt += 1
+            self.retried += 1
+            logger.warning(f"[请求] HTTP请求失败，{delay:.1f}秒后重试({attempt}/{retries}) - {str(error)}")
+            await asyncio.sleep(delay)
+
+    async def request_json(self, method: str, url: str, retries: int = None, **kwargs):
+        response = await self._send(method, url, retries, **kwargs)
+        try:
+            return await response.json(content_type=None)
+        finally:
+            response.release()
+
+    async def request_bytes(self, method: str, url: str, retries: int = None, **kwargs) -> bytes:
+        response = await self._send(method, url, retries, **kwargs)
+        try:
+            return await response.read()
+        finally:
+            response.release()
+
+    async def stream(self, url: str, method: str = "GET", chunk_size: int = DOWNLOAD_CHUNK_SIZE, retries: int = None, **kwargs):
+        '''流式读取响应体，逐块产出；只有建立连接阶段会重试，已产出数据后出错直接抛出'''
+        response = await self._send(method, url, retries, **kwargs)
+        try:
+            async for chunk in response.content.iter_chunked(chunk_size):
+                yield chunk
+        finally:
+            response.release()
+
+    async def download(self, url: str, path: str, chunk_size: int = DOWNLOAD_CHUNK_SIZE, retries: int = None, **kwargs) -> int:
+        '''流式下载到文件，返回字节数；失败时删除不完整的文件'''
+        f = await run_blocking(_open_file, path)
+        size = 0
+        try:
+            async for chunk in self.stream(url, chunk_size=chunk_size, retries=retries, **kwargs):
+                await run_blocking(f.write, chunk)
+                size += len(chunk)
+        except BaseException:
+            f.close()
+            os.remove(path)
+            raise
+        f.close()
+        return size
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "retried": self.retried,
+            "failed": self.failed,
+        }
+
+    async def close(self) -> None:
+        if self._session is None or self._session.closed:
+            return
+        if self._loop is asyncio.get_running_loop():
+            await self._session.close()
+        elif self._loop.is_running() and not self._loop.is_closed():
+            await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(self._session.close(), self._loop))
+        self._session = None
+
+    def close_sync(self, timeout: float = 5) -> None:
+        '''进程退出时关闭会话，会话所属的事件循环需仍在其他线程中运行'''
+        session, loop = self._session, self._loop
+        if session is None or session.closed or not loop.is_running() or loop.is_closed():
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(session.close(), loop).result(timeout)
+        except Exception as e:
+            logger.warning(f"[请求] 关闭HTTP会话失败 - 错误信息: {str(e)}")
+
+
+_http_client: HttpClient = None
+_lock = threading.Lock()
+
+
+def get_http_client() -> HttpClient:
+    '''获取进程内唯一的HTTP客户端'''
+    global _http_client
+    if _http_client is None:
+        with _lock:
+            if _http_client is None:
+                cfg = config.http_cfg
+                _http_client = HttpClient(
+                    limit=cfg.get("limit", 100),
+                    limit_per_host=cfg.get("limit_per_host", 8),
+                    connect_timeout=cfg.get("connect_timeout", 10),
+                    read_timeout=cfg.get("read_timeout", 60),
+                    total_timeout=cfg.get("total_timeout", 300),
+                    retries=cfg.get("retries", 2),
+                    backoff=cfg.get("backoff", 0.5),
+                )
+                atexit.register(_http_client.close_sync)
+    return _http_client
+
+
+async def close_http_client() -> None:
+    '''关闭共享HTTP客户端的会话（ASGI 服务器关闭时调用），客户端未创建时不做任何事'''
+    if _http_client is not None:
+        await _http_client.close()
@@ -1,12 +1,13 @@
 from enum import Enum
 import uuid
 import os
-import tempfile
 import io
 import numpy as np
 import soundfile as sf
 from pydub import AudioSegment
 
+from oddtts.oddtts_encoder import encode_audio, encode_audio_to_file
+
 class TTSParams:
     '''合成语音参数类'''
     voice: str
@@ -79,9 +80,8 @@ def convert_audio_format(
     try:
         
         if output_type == "file" and output_path is None:
-            temp_dir = tempfile.gettempdir()
-            uuid_str = new_uuid()
-            output_path = os.path.join(temp_dir, f"{uuid_str}.{output_format}")
+            from oddtts.oddtts_store import get_output_store
+            output_path = get_output_store().new_path(output_format)
         
         audio = None
         
@@ -89,10 +89,13 @@ def convert_audio_format(
             if sample_rate is None:
                 raise ValueError("当input_type='numpy'时，必须提供sample_rate参数")
             
-            wav_buffer = io.BytesIO()
-            sf.write(wav_buffer, input_data, sample_rate, format='WAV')
-            wav_buffer.seek(0)
-            audio = AudioSegment.from_wav(wav_buffer)
+            # 浮点数组直接编码，不经过中间WAV和pydub
+            if output_type == "file":
+                return encode_audio_to_file(input_data, sample_rate, output_format, output_path, bitrate)
+            elif output_type == "bytes":
+                return encode_audio(input_data, sample_rate, output_format, bitrate)
+            else:
+                raise ValueError(f"不支持的输出类型: {output_type}")
             
         elif input_type == "file":
             if not os.path.exists(input_data):
@@ -0,0 +1,317 @@
+"""
+预派生(prefork)推理进程池
+
+主进程加载一次模型和音色张量后 fork 出多个推理进程，子进程通过写时复制/共享内存
+直接使用主进程中的权重，不再各自加载一份。主进程维护任务队列，通过各推理进程自己的管道
+把任务分给空闲的推理进程，每个音频片段生成后立即经同一管道回传主进程。
+
+主进程放弃某个任务（客户端断开）时在共享的取消标志中标记该任务：还在排队的任务被直接跳过，
+正在执行的任务在下一个音频片段前停止，推理进程立即去处理下一个任务。
+
+推理进程异常退出（崩溃、被 OOM killer 杀掉）时，它正在执行的任务以错误结束，主进程重新派生一个推理进程补上；
+每个推理进程只使用自己的管道，一个进程退出不会让其他进程卡在共享队列的锁上。
+
+注意：必须在主进程启动任何后台线程（事件循环、推理线程池）和执行任何推理之前调用 start()，
+否则 fork 出的子进程可能继承到被其他线程持有的锁，或者损坏的 OpenMP 线程池。
+重新派生时主进程已有其他线程，子进程只使用 fork 前已存在的模型权重、自己的管道和共享内存。
+"""
+
+import asyncio
+import collections
+import gc
+import itertools
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from multiprocessing.connection import wait
+
+from oddtts.oddtts_runtime import InferenceBusyError, InferenceTimeoutError
+
+logger = logging.getLogger(__name__)
+
+# 共享取消标志的槽位数，按 job_id 取模复用；远大于同时存在的任务数，旧任务不会和新任务占用同一槽位
+CANCEL_SLOTS = 65536
+# 推理进程在初始化完成前退出时，等待多久再重新派生，避免初始化必然失败时反复 fork
+RESPAWN_DELAY = 1.0
+
+
+def _worker_main(synthesize, init_worker, num_threads: int, conn, parent_conn, cancel_flags) -> None:
+    '''推理进程主循环：从管道取任务，逐段回传音频片段；已取消的任务跳过或提前停止'''
+    # 关闭继承来的主进程一端，主进程退出时 recv 才能收到 EOF
+    parent_conn.close()
+    pid = os.getpid()
+    if init_worker is not None:
+        init_worker(num_threads)
+
+    conn.send((None, "ready", pid))
+    logger.info(f"[系统] 推理进程已启动 - pid: {pid}, 线程数: {num_threads}")
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            break
+        if task is None:
+            break
+
+        job_id, args = task
+        slot = job_id % CANCEL_SLOTS
+        if cancel_flags[slot]:
+            conn.send((job_id, "cancelled", 0.0))
+            continue
+
+        start = time.perf_counter()
+        try:
+            for segment in synthesize(*args):
+                conn.send((job_id, "segment", segment))
+                if cancel_flags[slot]:
+                    break
+            # 完成/取消时回传实际推理耗时
+            conn.send((job_id, "cancelled" if cancel_flags[slot] else "done", time.perf_counter() - start))
+        except Exception as e:
+            logger.error(f"[错误] 推理进程任务失败 - pid: {pid}, 错误信息: {str(e)}")
+            conn.send((job_id, "error", str(e)))
+
+
+class _Worker:
+    '''一个推理进程及主进程一端的管道，job_id 为正在执行的任务'''
+
+    def __init__(self, process, conn) -> None:
+        self.process = process
+        self.conn = conn
+        self.ready = False
+        self.job_id = None
+
+
+class PreforkInferencePool:
+    '''
+    预派生推理进程池
+
+    synthesize(*args) 在子进程中执行，返回音频片段迭代器；
+    init_worker(num_threads) 在子进程启动时调用一次（如设置 torch 线程数、预热），
+    完成后子进程才计入就绪。
+    '''
+
+    def __init__(self, synthesize, num_processes: int, init_worker=None, max_queue: int = 32, timeout: float = None) -> None:
+        self.synthesize = synthesize
+        self.init_worker = init_worker
+        self.num_processes = num_processes
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._ctx = multiprocessing.get_context("fork")
+        # fork 前创建，子进程共享同一块内存
+        self._cancel_flags = self._ctx.RawArray("b", CANCEL_SLOTS)
+        self._num_threads = max(1, (os.cpu_count() or 1) // num_processes)
+        self._workers: list[_Worker] = []
+        self._pending = collections.deque()
+        self._jobs: dict[int, tuple[asyncio.AbstractEventLoop, asyncio.Queue]] = {}
+        self._job_ids = itertools.count()
+        self._lock = threading.Lock()
+        self._dispatcher = None
+        self._started = False
+        self._closed = False
+        self.cancelled = 0
+        self.respawned = 0
+
+    @property
+    def capacity(self) -> int:
+        return self.num_processes + self.max_queue
+
+    def is_full(self) -> bool:
+        return len(self._jobs) >= self.capacity
+
+    def admit(self) -> None:
+        '''请求级准入检查，队列已满时抛出 InferenceBusyError；之后该请求的任务以 admitted=True 提交'''
+        if self.is_full():
+            raise InferenceBusyError(f"推理队列已满({len(self._jobs)}/{self.capacity})，请稍后重试")
+
+    def is_ready(self) -> bool:
+        '''所有推理进程都完成过初始化，且当前至少有一个推理进程可用（其余的可能正在重新派生）'''
+        return self._started and any(worker.ready for worker in self._workers)
+
+    def _spawn(self) -> _Worker:
+        parent_conn, child_conn = self._ctx.Pipe()
+        # 冻结当前所有对象，避免子进程中的GC遍历触碰共享页面导致写时复制
+        gc.freeze()
+        try:
+            process = self._ctx.Process(
+                target=_worker_main,
+                args=(self.synthesize, self.init_worker, self._num_threads, child_conn, parent_conn, self._cancel_flags),
+                daemon=True,
+            )
+            process.start()
+        finally:
+            gc.unfreeze()
+        child_conn.close()
+        return _Worker(process, parent_conn)
+
+    def start(self) -> None:
+        '''fork 推理进程，并启动结果分发线程'''
+        self._workers = [self._spawn() for _ in range(self.num_processes)]
+        self._dispatcher = threading.Thread(target=self._dispatch_results, name="oddtts-prefork-dispatcher", daemon=True)
+        self._dispatcher.start()
+        logger.info(f"[系统] 预派生推理进程池已启动 - 进程数: {self.num_processes}, 每进程线程数: {self._num_threads}")
+
+    def _assign(self) -> None:
+        '''把排队的任务分给空闲的推理进程，已被放弃的任务直接丢弃；调用方持有 self._lock'''
+        for worker in self._workers:
+            if not self._pending:
+                return
+            if not worker.ready or worker.job_id is not None:
+                continue
+            while self._pending:
+                job_id, args = self._pending.popleft()
+                if job_id not in self._jobs:
+                    continue
+                try:
+                    worker.conn.send((job_id, args))
+                except OSError:
+                    # 推理进程已退出，任务放回队首，由分发线程处理退出并重新派生
+                    self._pending.appendleft((job_id, args))
+                    break
+                worker.job_id = job_id
+                break
+
+    def _deliver(self, job_id: int, kind: str, payload) -> None:
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            return
+        loop, job_queue = job
+        loop.call_soon_threadsafe(job_queue.put_nowait, (kind, payload))
+
+    def _handle(self, worker: _Worker, job_id: int, kind: str, payload) -> None:
+        if kind == "ready":
+            with self._lock:
+                worker.ready = True
+                if all(w.ready for w in self._workers):
+                    self._started = True
+                self._assign()
+            return
+        if kind in ("done", "error", "cancelled"):
+            with self._lock:
+                worker.job_id = None
+                self._assign()
+        self._deliver(job_id, kind, payload)
+
+    def _receive(self, worker: _Worker) -> None:
+        try:
+            job_id, kind, payload = worker.conn.recv()
+        except (EOFError, OSError):
+            # 推理进程已退出，由进程的 sentinel 触发重新派生
+            return
+        self._handle(worker, job_id, kind, payload)
+
+    def _respawn(self, worker: _Worker) -> None:
+        '''处理异常退出的推理进程：先取完管道中已回传的结果，再让它正在执行的任务失败，最后派生新进程替换它'''
+        try:
+            while worker.conn.poll():
+                self._receive(worker)
+        except OSError:
+            pass
+        worker.process.join()
+        worker.conn.close()
+        with self._lock:
+            index = self._workers.index(worker)
+            job_id = worker.job_id
+        if self._closed:
+            return
+
+        exitcode = worker.process.exitcode
+        logger.error(f"[错误] 推理进程异常退出 - pid: {worker.process.pid}, 退出码: {exitcode}")
+        if job_id is not None:
+            self._deliver(job_id, "error", f"推理进程异常退出(退出码: {exitcode})")
+        if not worker.ready:
+            time.sleep(RESPAWN_DELAY)
+
+        replacement = self._spawn()
+        with self._lock:
+            self._workers[index] = replacement
+            self.respawned += 1
+        logger.warning(f"[系统] 已重新派生推理进程 - pid: {replacement.process.pid}")
+
+    def _dispatch_results(self) -> None:
+        while not self._closed:
+            with self._lock:
+                workers = list(self._workers)
+            waitables = {}
+            for worker in workers:
+                waitables[worker.conn] = worker
+                waitables[worker.process.sentinel] = worker
+
+            for obj in wait(list(waitables), timeout=1):
+                worker = waitables[obj]
+                if worker.conn.closed:
+                    continue
+                if obj is worker.conn:
+                    self._receive(worker)
+                else:
+                    self._respawn(worker)
+
+    async def stream(self, *args, on_done=None, admitted: bool = False):
+        '''
+        提交任务并按顺序异步产出子进程回传的音频片段；on_done(推理秒数) 在任务完成时调用，
+        admitted 为 True 表示所属请求已通过 admit()，任务直接排队
+
+        调用方提前结束迭代（取消或关闭生成器）时通知推理进程停止该任务
+        '''
+        loop = asyncio.get_running_loop()
+        job_queue = asyncio.Queue()
+        with self._lock:
+            if not admitted and len(self._jobs) >= self.capacity:
+                raise InferenceBusyError(f"推理队列已满({len(self._jobs)}/{self.capacity})，请稍后重试")
+            job_id = next(self._job_ids)
+            self._jobs[job_id] = (loop, job_queue)
+            self._cancel_flags[job_id % CANCEL_SLOTS] = 0
+            self._pending.append((job_id, args))
+            self._assign()
+
+        finished = False
+        try:
+            while True:
+                try:
+                    kind, payload = await asyncio.wait_for(job_queue.get(), self.timeout)
+                except asyncio.TimeoutError:
+                    raise InferenceTimeoutError(f"推理任务超时({self.timeout}秒)")
+
+                if kind == "segment":
+                    yield payload
+                elif kind == "done":
+                    finished = True
+                    if on_done is not None:
+                        on_done(payload)
+                    return
+                elif kind == "error":
+                    finished = True
+                    raise RuntimeError(payload)
+        finally:
+            with self._lock:
+                self._jobs.pop(job_id, None)
+            if not finished:
+                self._cancel_flags[job_id % CANCEL_SLOTS] = 1
+                self.cancelled += 1
+
+    def stats(self) -> dict:
+        workers = list(self._workers)
+        return {
+            "processes": self.num_processes,
+            "alive": sum(1 for w in workers if w.process.is_alive()),
+            "ready": sum(1 for w in workers if w.ready),
+            "pending": len(self._jobs),
+            "running": sum(1 for w in workers if w.job_id is not None),
+            "cancelled": self.cancelled,
+            "respawned": self.respawned,
+        }
+
+    def close(self) -> None:
+        self._closed = True
+        with self._lock:
+            workers = list(self._workers)
+        for worker in workers:
+            try:
+                worker.conn.send(None)
+            except OSError:
+                pass
+        for worker in workers:
+            worker.process.join(timeout=5)
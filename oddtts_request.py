@@ -0,0 +1,182 @@
+"""
+请求解析与校验
+
+Flask（oddtts.py）和 ASGI（oddtts_asgi.py）两个前端共用：参数提取、默认值、必需参数和格式校验、
+推理队列已满的预检查，以及合成异常到 HTTP 状态码的映射都在这里完成，前端只负责读取请求体和构造响应。
+"""
+
+import logging
+import time
+
+from oddtts.oddtts_base64 import TRANSPORTS, resolve_transport
+from oddtts.oddtts_encoder import SUPPORTED_FORMATS
+from oddtts.oddtts_params import TTSParams
+from oddtts.oddtts_runtime import InferenceBusyError, InferenceTimeoutError
+
+logger = logging.getLogger(__name__)
+
+PARAM_KEYS = ("voice", "rate", "volume", "pitch", "locale", "response_format")
+
+
+class RequestError(ValueError):
+    '''请求不合法或暂时无法受理，前端按 status 和 headers 返回 {"error": message}'''
+
+    def __init__(self, message: str, status: int = 400, headers: dict = None) -> None:
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+
+class TTSRequest:
+    '''一次合成请求的参数'''
+
+    def __init__(self, text: str, voice: str, rate: int = 0, volume: int = 0, pitch: int = 0, locale: str = "zh-CN",
+                 response_format: str = "wav", transport: str = None) -> None:
+        self.text = text
+        self.voice = voice
+        self.rate = rate
+        self.volume = volume
+        self.pitch = pitch
+        self.locale = locale
+        self.response_format = response_format
+        self.transport = transport
+
+    def params(self) -> dict:
+        '''generate_tts_file / generate_tts_bytes / generate_tts_stream 的关键字参数'''
+        return {"text": self.text, **{key: getattr(self, key) for key in PARAM_KEYS}}
+
+    def tts_params(self) -> TTSParams:
+        return TTSParams(voice=self.voice, rate=self.rate, volume=self.volume, pitch=self.pitch, locale=self.locale,
+                         response_format=self.response_format)
+
+    def describe(self) -> str:
+        desc = (f"文本长度: {len(self.text) if self.text else 0}, 语音: {self.voice}, 语速: {self.rate}, "
+                f"音量: {self.volume}, 音调: {self.pitch}, 格式: {self.response_format}")
+        if self.transport:
+            desc += f", 传输: {self.transport}"
+        return desc
+
+
+def _check_format(response_format: str, prefix: str = "") -> None:
+    if response_format not in SUPPORTED_FORMATS:
+        raise RequestError(f"{prefix}不支持的音频格式: {response_format}，支持: {', '.join(SUPPORTED_FORMATS)}")
+
+
+def _require_json(data) -> dict:
+    if not isinstance(data, dict):
+        raise RequestError("请求必须是JSON格式")
+    return data
+
+
+def parse_tts_request(data, with_transport: bool = False, accept: str = "") -> TTSRequest:
+    '''
+    解析 /api/oddtts/* 的请求体（已解码的 JSON，解码失败时传 None），不合法时抛出 RequestError
+
+    with_transport 为 True 时按 transport 字段和 Accept 头选择流式 Base64 的传输格式
+    '''
+    data = _require_json(data)
+    req = TTSRequest(
+        text=data.get("text"),
+        voice=data.get("voice"),
+        rate=data.get("rate", 0),
+        volume=data.get("volume", 0),
+        pitch=data.get("pitch", 0),
+        locale=data.get("locale", "zh-CN"),
+        response_format=data.get("response_format", "wav"),
+        transport=resolve_transport(data.get("transport"), accept) if with_transport else None,
+    )
+    logger.info(f"[参数] {req.describe()}")
+
+    if not req.text:
+        raise RequestError("缺少必需参数: text")
+    if not req.voice:
+        raise RequestError("缺少必需参数: voice")
+    _check_format(req.response_format)
+    if with_transport and req.transport is None:
+        raise RequestError(f"不支持的传输格式: {data.get('transport')}，支持: {', '.join(TRANSPORTS)}")
+    return req
+
+
+def parse_openai_speech(data) -> TTSRequest:
+    '''解析 OpenAI 兼容的 /v1/audio/speech 请求体，speed 换算为 rate'''
+    data = _require_json(data)
+    text = data.get("input")
+    if not text:
+        raise RequestError("缺少必需参数: input")
+    voice = data.get("voice")
+    if not voice:
+        raise RequestError("缺少必需参数: voice")
+
+    speed = data.get("speed", 1.0)
+    if not isinstance(speed, (int, float)) or speed < 0.25 or speed > 4.0:
+        raise RequestError("speed参数必须在0.25-4.0之间")
+
+    response_format = data.get("response_format", "mp3")
+    logger.info(f"[参数] 文本长度: {len(text)}, 语音: {voice}, 语速: {speed}, 格式: {response_format}")
+    _check_format(response_format)
+    return TTSRequest(text=text, voice=voice, rate=int((speed - 1.0) * 50), locale=data.get("locale", "zh-CN"),
+                      response_format=response_format)
+
+
+def parse_batch_items(data, max_items: int) -> list:
+    '''
+    解析批量合成请求，返回 [(text, TTSParams), ...]
+
+    条目可以直接带参数，也可以放在 params 中；未指定的参数使用请求级默认值
+    '''
+    items = data.get("items") if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items:
+        raise RequestError("缺少必需参数: items")
+    if len(items) > max_items:
+        raise RequestError(f"条目数超过上限: {len(items)} > {max_items}")
+
+    defaults = {key: data[key] for key in PARAM_KEYS if key in data}
+    batch_items = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            raise RequestError(f"第{index}项格式错误")
+        params = {**defaults, **item.get("params", {}), **{key: value for key, value in item.items() if key not in ("text", "params")}}
+        req = TTSRequest(
+            text=item.get("text"),
+            voice=params.get("voice"),
+            rate=params.get("rate", 0),
+            volume=params.get("volume", 0),
+            pitch=params.get("pitch", 0),
+            locale=params.get("locale", "zh-CN"),
+            response_format=params.get("response_format", "wav"),
+        )
+        if not req.text or not req.voice:
+            raise RequestError(f"第{index}项缺少必需参数: text/voice")
+        _check_format(req.response_format, prefix=f"第{index}项")
+        batch_items.append((req.text, req.tts_params()))
+    return batch_items
+
+
+def check_capacity(driver) -> None:
+    '''driver 的推理队列（线程池或预派生进程池）已满时抛出 RequestError(429)，流式接口在返回 200 之前调用'''
+    if driver.is_busy():
+        raise RequestError("推理队列已满，请稍后重试", status=429, headers={"Retry-After": "1"})
+
+
+def request_error(e: RequestError, start_time: float) -> tuple:
+    '''记录被拒绝的请求，返回 (JSON, 状态码, 响应头)'''
+    elapsed_time = time.time() - start_time
+    logger.warning(f"[响应] {str(e)} - 耗时: {elapsed_time:.3f}秒")
+    return {"error": str(e)}, e.status, e.headers
+
+
+def synthesis_error(e: Exception, action: str, start_time: float) -> tuple:
+    '''
+    把合成异常映射为 (JSON, 状态码, 响应头) 并记录日志，action 为日志中的接口名，如 "TTS文件生成"
+
+    推理队列已满返回 429，推理超时返回 503，其余返回 500
+    '''
+    elapsed_time = time.time() - start_time
+    if isinstance(e, InferenceBusyError):
+        logger.warning(f"[响应] {action}被拒绝 - 推理队列已满, 耗时: {elapsed_time:.3f}秒")
+        return {"error": str(e)}, 429, {"Retry-After": "1"}
+    if isinstance(e, InferenceTimeoutError):
+        logger.error(f"[错误] {action}超时 - 错误信息: {str(e)}, 耗时: {elapsed_time:.3f}秒")
+        return {"error": str(e)}, 503, {}
+    logger.error(f"[错误] {action}失败 - 错误信息: {str(e)}, 耗时: {elapsed_time:.3f}秒")
+    return {"error": str(e)}, 500, {}
@@ -0,0 +1,287 @@
+"""
+进程内唯一的长驻事件循环
+
+所有 OddTTSDriver 协程都在这个事件循环中执行，避免每个请求创建/销毁事件循环，
+也让 edge-tts 连接、HTTP 会话等异步资源可以跨请求共享。
+
+- WSGI 模式(Flask): 事件循环运行在后台守护线程中，请求线程通过 run_sync/iterate_sync 提交协程
+- ASGI 模式(uvicorn): 服务启动时通过 attach_loop 绑定服务器自身的事件循环
+"""
+
+import asyncio
+import concurrent.futures
+import functools
+import logging
+import os
+import sys
+import threading
+import time
+
+import oddtts.oddtts_config as config
+
+logger = logging.getLogger(__name__)
+
+_loop: asyncio.AbstractEventLoop = None
+_loop_thread: threading.Thread = None
+_lock = threading.Lock()
+
+
+def _run_loop_forever(loop: asyncio.AbstractEventLoop) -> None:
+    asyncio.set_event_loop(loop)
+    loop.run_forever()
+
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    '''获取长驻事件循环，不存在则在后台线程中启动一个'''
+    global _loop, _loop_thread
+    if _loop is not None and not _loop.is_closed():
+        return _loop
+
+    with _lock:
+        if _loop is None or _loop.is_closed():
+            _loop = asyncio.new_event_loop()
+            _loop_thread = threading.Thread(target=_run_loop_forever, args=(_loop,), name="oddtts-event-loop", daemon=True)
+            _loop_thread.start()
+            logger.info("[系统] 后台事件循环已启动")
+    return _loop
+
+
+def attach_loop(loop: asyncio.AbstractEventLoop) -> None:
+    '''绑定外部事件循环（ASGI 模式下为服务器的事件循环）'''
+    global _loop, _loop_thread
+    with _lock:
+        _loop = loop
+        _loop_thread = None
+    logger.info("[系统] 已绑定服务器事件循环")
+
+
+def _in_loop_thread(loop: asyncio.AbstractEventLoop) -> bool:
+    try:
+        return asyncio.get_running_loop() is loop
+    except RuntimeError:
+        return False
+
+
+def run_sync(coro, timeout: float = None):
+    '''在长驻事件循环中执行协程，并在当前线程中阻塞等待结果'''
+    loop = get_loop()
+    if _in_loop_thread(loop):
+        coro.close()
+        raise RuntimeError("run_sync不能在事件循环线程中调用，请直接await")
+    return asyncio.run_coroutine_threadsafe(coro, loop).result(timeout)
+
+
+def iterate_sync(async_gen):
+    '''在当前线程中逐块迭代一个运行于长驻事件循环上的异步生成器'''
+    loop = get_loop()
+    try:
+        while True:
+            try:
+                yield asyncio.run_coroutine_threadsafe(async_gen.__anext__(), loop).result()
+            except StopAsyncIteration:
+                break
+    finally:
+        asyncio.run_coroutine_threadsafe(async_gen.aclose(), loop).result()
+
+
+async def run_blocking(func, *args, **kwargs):
+    '''将阻塞调用（模型推理、磁盘IO等）交给线程池执行，不阻塞事件循环'''
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, functools.partial(func, *args, **kwargs))
+
+
+class InferenceBusyError(RuntimeError):
+    '''推理队列已满，调用方应返回 429 并稍后重试'''
+
+
+class InferenceTimeoutError(TimeoutError):
+    '''推理任务超时，调用方应返回 503'''
+
+
+class InferencePool:
+    '''
+    有界推理线程池
+
+    同时运行的任务数为 max_workers，最多再排队 max_queue 个任务；
+    超出容量时立即抛出 InferenceBusyError，而不是让请求在线程中无限堆积。
+
+    准入按请求进行：请求开始时调用一次 admit()，之后该请求的推理任务以 admitted=True 提交，
+    只排队不再被拒绝，已经开始返回音频的请求不会在中途因队列已满而失败。
+    '''
+
+    def __init__(self, max_workers: int, max_queue: int, timeout: float = None) -> None:
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="oddtts-infer")
+        self._pending = 0
+        self._lock = threading.Lock()
+        self.rejected = 0
+        self.timed_out = 0
+
+    @property
+    def capacity(self) -> int:
+        return self.max_workers + self.max_queue
+
+    def is_full(self) -> bool:
+        return self._pending >= self.capacity
+
+    def _release(self, _future) -> None:
+        with self._lock:
+            self._pending -= 1
+
+    def _reject(self) -> None:
+        self.rejected += 1
+        raise InferenceBusyError(f"推理队列已满({self._pending}/{self.capacity})，请稍后重试")
+
+    def admit(self) -> None:
+        '''请求级准入检查，队列已满时抛出 InferenceBusyError'''
+        with self._lock:
+            if self._pending >= self.capacity:
+                self._reject()
+
+    def submit(self, func, *args, admitted: bool = False, **kwargs) -> concurrent.futures.Future:
+        '''
+        提交一个推理任务，队列已满时抛出 InferenceBusyError；
+        admitted 为 True 表示所属请求已通过 admit()，任务直接排队
+        '''
+        with self._lock:
+            if not admitted and self._pending >= self.capacity:
+                self._reject()
+            self._pending += 1
+
+        try:
+            future = self._executor.submit(functools.partial(func, *args, **kwargs))
+        except Exception:
+            self._release(None)
+            raise
+        future.add_done_callback(self._release)
+        return future
+
+    async def run(self, func, *args, timeout: float = None, admitted: bool = False, **kwargs):
+        '''在推理线程池中执行任务并等待结果，超时抛出 InferenceTimeoutError'''
+        future = self.submit(func, *args, admitted=admitted, **kwargs)
+        timeout = timeout if timeout is not None else self.timeout
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except asyncio.TimeoutError:
+            # 已开始执行的任务无法中断，仍会占用工作线程直到结束
+            future.cancel()
+            self.timed_out += 1
+            raise InferenceTimeoutError(f"推理任务超时({timeout}秒)")
+
+    def stats(self) -> dict:
+        return {
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "pending": self._pending,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+        }
+
+
+_inference_pool: InferencePool = None
+
+
+def _limit_torch_threads(max_workers: int) -> None:
+    '''
+    按推理线程数分摊 torch 的计算线程：每个线程的前向默认用满全部CPU核，多个推理线程并行时会成倍超订；
+    只在引擎已导入 torch 时生效，预派生模式下各推理进程另行设置
+    '''
+    torch = sys.modules.get("torch")
+    if torch is None:
+        return
+    num_threads = max(1, (os.cpu_count() or 1) // max_workers)
+    torch.set_num_threads(num_threads)
+    logger.info(f"[系统] 已限制torch计算线程数 - 每个推理线程: {num_threads}")
+
+
+def get_inference_pool() -> InferencePool:
+    '''获取进程内唯一的推理线程池，大小取自 oddtts_cfg["concurrent_thread"]（0 表示按CPU核数）'''
+    global _inference_pool
+    if _inference_pool is None:
+        with _lock:
+            if _inference_pool is None:
+                max_workers = config.oddtts_cfg.get("concurrent_thread", 0) or os.cpu_count() or 1
+                _inference_pool = InferencePool(
+                    max_workers=max_workers,
+                    max_queue=config.oddtts_cfg.get("inference_queue_size", 32),
+                    timeout=config.oddtts_cfg.get("inference_timeout", 60) or None,
+                )
+                logger.info(f"[系统] 推理线程池已创建 - 工作线程: {max_workers}, 队列长度: {_inference_pool.max_queue}")
+                _limit_torch_threads(max_workers)
+    return _inference_pool
+
+
+async def run_inference(func, *args, **kwargs):
+    '''将模型推理任务提交到有界推理线程池'''
+    return await get_inference_pool().run(func, *args, **kwargs)
+
+
+def call_timed(func, *args, **kwargs):
+    '''执行 func 并返回 (结果, 耗时秒数)，在推理线程中调用时只计入实际计算时间，不含排队等待'''
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+class CancellationStats:
+    '''
+    客户端断开（或 WebSocket 会话取消）后被中止的合成工作
+
+    节省的推理时间是估算值：被取消、尚未合成的句段字数 × 最近观测到的每字推理耗时。
+    每字耗时只统计实际推理时间（不含排队），取指数滑动平均。
+    '''
+
+    def __init__(self, smoothing: float = 0.1) -> None:
+        self.smoothing = smoothing
+        self.streams = 0
+        self.segments = 0
+        self.chars = 0
+        self.seconds_saved = 0.0
+        self.seconds_per_char: float = None
+        self._lock = threading.Lock()
+
+    def observe(self, chars: int, seconds: float) -> None:
+        '''记录一个完整合成的句段的推理耗时'''
+        if chars <= 0:
+            return
+        with self._lock:
+            value = seconds / chars
+            if self.seconds_per_char is None:
+                self.seconds_per_char = value
+            else:
+                self.seconds_per_char += self.smoothing * (value - self.seconds_per_char)
+
+    def record_stream(self) -> None:
+        '''记录一个被客户端中途放弃的合成流'''
+        with self._lock:
+            self.streams += 1
+
+    def record_segments(self, texts: list[str]) -> float:
+        '''记录被取消的句段，返回估算节省的推理秒数'''
+        chars = sum(len(text) for text in texts)
+        with self._lock:
+            seconds = chars * (self.seconds_per_char or 0.0)
+            self.segments += len(texts)
+            self.chars += chars
+            self.seconds_saved += seconds
+        logger.info(f"[系统] 合成已取消 - 取消句段数: {len(texts)}, 字数: {chars}, 预计节省推理时间: {seconds:.3f}秒")
+        return seconds
+
+    def stats(self) -> dict:
+        return {
+            "streams": self.streams,
+            "segments": self.segments,
+            "chars": self.chars,
+            "seconds_saved": round(self.seconds_saved, 3),
+            "seconds_per_char": round(self.seconds_per_char, 6) if self.seconds_per_char is not None else None,
+        }
+
+
+_cancellation_stats = CancellationStats()
+
+
+def get_cancellation_stats() -> CancellationStats:
+    '''获取进程内唯一的取消统计'''
+    return _cancellation_stats
@@ -0,0 +1,155 @@
+"""
+长文本分句与并行合成
+
+长文本整段送入管道时只能串行推理，首段延迟和总耗时都随文本长度线性增长。
+这里先按中英文标点把文本切成不超过 max_chars 的句段，再并发合成多个句段，
+按原文顺序输出：前面的句段一旦完成就立即输出，后面的句段同时在其他推理线程/进程中合成。
+"""
+
+import asyncio
+import re
+from collections import deque
+
+# 句末标点（含紧随其后的引号/括号），英文句点后需跟空白，避免切开小数、缩写
+_SENTENCE_BREAK = re.compile(r'([。！？!?；;…]+[”’"\'）)]*|\.(?=\s|$)[”’"\')]*|\n+)')
+# 句内停顿标点，句子过长时在这里再切
+_CLAUSE_BREAK = re.compile(r'([，,、：:]+)')
+
+
+def _split_keep(pattern: re.Pattern, text: str) -> list[str]:
+    '''按分隔符切分，分隔符保留在前一段末尾'''
+    parts = pattern.split(text)
+    pieces = []
+    for i in range(0, len(parts), 2):
+        piece = (parts[i] + (parts[i + 1] if i + 1 < len(parts) else "")).strip()
+        if piece:
+            pieces.append(piece)
+    return pieces
+
+
+def _hard_split(text: str, max_chars: int) -> list[str]:
+    '''没有标点可切时按长度硬切，英文尽量在空格处断开'''
+    pieces = []
+    while len(text) > max_chars:
+        cut = text.rfind(" ", 0, max_chars + 1)
+        if cut <= 0:
+            cut = max_chars
+        pieces.append(text[:cut].strip())
+        text = text[cut:].strip()
+    if text:
+        pieces.append(text)
+    return pieces
+
+
+def split_sentences(text: str, max_chars: int = 100) -> list[str]:
+    """
+    将文本切分为句段
+
+    先按句末标点和换行切句，过长的句子再按逗号等句内标点切分，仍然过长时按长度硬切；
+    最后把相邻的短句合并，每段不超过 max_chars 个字符，尽量保留完整句子的韵律。
+
+    Args:
+        text: 输入文本
+        max_chars: 每段最大字符数（约束模型单次推理的音素数）
+
+    Returns:
+        句段列表，每段已去掉首尾空白
+    """
+    pieces = []
+    for sentence in _split_keep(_SENTENCE_BREAK, text):
+        if len(sentence) <= max_chars:
+            pieces.append(sentence)
+            continue
+        for clause in _split_keep(_CLAUSE_BREAK, sentence):
+            pieces.extend(_hard_split(clause, max_chars) if len(clause) > max_chars else [clause])
+
+    segments = []
+    current = ""
+    for piece in pieces:
+        # 英文句子之间补回空格
+        separator = " " if current and current[-1].isascii() and piece[0].isascii() else ""
+        if current and len(current) + len(separator) + len(piece) > max_chars:
+            segments.append(current)
+            current, separator = "", ""
+        current += separator + piece
+    if current:
+        segments.append(current)
+    return segments
+
+
+class SentenceBuffer:
+    """
+    增量文本的分句缓冲
+
+    文本逐段（如大模型逐 token）追加，已完整的句子立即切出，不完整的尾部留在缓冲区等待后续文本。
+    句末标点之后必须已经收到后续字符才算完整，避免把随后到达的引号、小数点后的数字切到下一句；
+    没有标点的文本超过 max_chars 时按 split_sentences 的规则提前切出。
+    """
+
+    def __init__(self, max_chars: int = 100) -> None:
+        self.max_chars = max_chars
+        self._text = ""
+
+    def __len__(self) -> int:
+        return len(self._text)
+
+    def push(self, text: str) -> list[str]:
+        '''追加文本，返回已完整的句段'''
+        self._text += text
+        complete = 0
+        for match in _SENTENCE_BREAK.finditer(self._text):
+            if match.end() < len(self._text):
+                complete = match.end()
+        ready, rest = self._text[:complete], self._text[complete:]
+
+        segments = split_sentences(ready, self.max_chars) if ready.strip() else []
+        if len(rest) > self.max_chars and rest.strip():
+            pieces = split_sentences(rest, self.max_chars)
+            segments.extend(pieces[:-1])
+            # 保留结尾的空白，英文单词不会和后续文本粘在一起
+            rest = pieces[-1] + (" " if rest[-1].isspace() else "")
+        self._text = rest
+        return segments
+
+    def flush(self) -> list[str]:
+        '''取出缓冲区中剩余的全部文本'''
+        text, self._text = self._text, ""
+        return split_sentences(text, self.max_chars) if text.strip() else []
+
+    def clear(self) -> None:
+        self._text = ""
+
+
+async def map_in_order(items: list, worker, concurrency: int, on_cancel=None):
+    """
+    并发执行 worker(item)，最多同时运行 concurrency 个，按 items 的顺序逐个产出结果
+
+    调用方提前结束迭代（如客户端断开）时，取消尚未完成的任务，尚未启动的条目不再启动；
+    on_cancel(被放弃的条目列表) 在取消时调用一次，用于统计节省的工作
+    """
+    concurrency = max(1, concurrency)
+    pending = deque()
+    items = iter(items)
+    try:
+        for item in items:
+            pending.append((item, asyncio.ensure_future(worker(item))))
+            if len(pending) >= concurrency:
+                break
+
+        while pending:
+            # 结果取到后再出队，等待期间被取消时该条目仍计入被放弃的条目
+            result = await pending[0][1]
+            pending.popleft()
+            for item in items:
+                pending.append((item, asyncio.ensure_future(worker(item))))
+                break
+            yield result
+    except (GeneratorExit, asyncio.CancelledError):
+        if on_cancel is not None:
+            abandoned = [item for item, task in pending if not task.done() or task.cancelled()] + list(items)
+            if abandoned:
+                on_cancel(abandoned)
+        raise
+    finally:
+        for _, task in pending:
+            task.cancel()
@@ -0,0 +1,201 @@
+"""
+增量文本的流式合成会话（WebSocket 接口）
+
+对话类应用的大模型逐 token 输出文本，/api/oddtts/stream 却要求一次给出完整文本，
+语音延迟等于“大模型输出完毕 + 合成”。会话在同一个连接上接收增量文本，按句缓冲，
+每凑齐一句就交给驱动的 generate_tts_stream 合成，音频块立即回推，延迟缩短到“第一句 + 合成”。
+
+客户端消息（JSON 文本帧）:
+- {"type": "config", "voice": ..., "rate": ..., "volume": ..., "pitch": ..., "locale": ..., "response_format": ...}
+  修改之后句子的合成参数（连接的查询参数同样可以设置）
+- {"type": "text", "text": "...", "flush": false}   追加文本，flush 为 true 时等同于随后发送 flush
+- {"type": "flush"}    把缓冲区中不完整的尾句也送去合成，全部完成后回复 flushed
+- {"type": "cancel"}   丢弃缓冲区和尚未合成的句子，中止正在合成的句子，回复 cancelled
+
+服务端消息:
+- {"type": "sentence", "seq": n, "text": "..."}    开始合成第 n 句，之后是该句的音频（二进制帧）
+- {"type": "sentence_end", "seq": n, "bytes": ..., "elapsed": 秒}
+- {"type": "flushed"} / {"type": "cancelled"}
+- {"type": "error", "error": "...", "seq": n}       单句合成失败或消息不合法，会话继续
+
+每句单独合成，wav 每句带各自的文件头，需要直接拼接播放时使用默认的 pcm 或 mp3。
+句子按顺序逐句合成；待合成的句子超过 max_pending 时拒绝新文本（回复 error），
+不阻塞读取，cancel 消息总能及时处理。
+"""
+
+import asyncio
+import json
+import logging
+import time
+
+from oddtts.oddtts_encoder import SUPPORTED_FORMATS
+from oddtts.oddtts_params import TTSParams
+from oddtts.oddtts_segment import SentenceBuffer
+
+logger = logging.getLogger(__name__)
+
+PARAM_KEYS = ("voice", "rate", "volume", "pitch", "locale", "response_format")
+_FLUSHED = object()
+
+
+class SessionError(ValueError):
+    '''客户端消息不合法，回复 error 消息后会话继续'''
+
+
+class SynthesisSession:
+    '''
+    一个连接对应一个会话：接收文本消息，按句排队合成，通过 send_json / send_bytes 回推结果
+
+    synthesize(text, tts_params) 返回音频块的异步迭代器，通常是驱动的 generate_tts_stream
+    '''
+
+    def __init__(self, synthesize, send_json, send_bytes, params: dict = None, max_chars: int = 100,
+                 max_pending: int = 64) -> None:
+        self.synthesize = synthesize
+        self.send_json = send_json
+        self.send_bytes = send_bytes
+        self.params = {"voice": None, "rate": 0, "volume": 0, "pitch": 0, "locale": "zh-CN", "response_format": "pcm"}
+        self.update_params(params or {})
+        self.buffer = SentenceBuffer(max_chars)
+        self.max_pending = max_pending
+        self._queue: asyncio.Queue = None
+        self._worker: asyncio.Task = None
+        self._seq = 0
+        self._unfinished = 0
+        self.sentences = 0
+        self.cancelled = 0
+
+    def update_params(self, params: dict) -> None:
+        updates = {key: params[key] for key in PARAM_KEYS if params.get(key) not in (None, "")}
+        for key in ("rate", "volume", "pitch"):
+            if key in updates:
+                try:
+                    updates[key] = int(updates[key])
+                except (TypeError, ValueError):
+                    raise SessionError(f"参数 {key} 必须是整数")
+        if updates.get("response_format", self.params["response_format"]) not in SUPPORTED_FORMATS:
+            raise SessionError(f"不支持的音频格式: {updates['response_format']}，支持: {', '.join(SUPPORTED_FORMATS)}")
+        self.params.update(updates)
+
+    def _ensure_worker(self) -> None:
+        if self._worker is None or self._worker.done():
+            # 发送失败（连接已断开）时旧的工作任务已退出，队列中的句子随之丢弃
+            self._unfinished = 0
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.ensure_future(self._run())
+
+    async def _enqueue(self, sentences: list, flush: bool = False) -> None:
+        if not sentences and not flush:
+            return
+        if sentences and not self.params["voice"]:
+            raise SessionError("缺少必需参数: voice")
+        if self._unfinished + len(sentences) > self.max_pending:
+            raise SessionError(f"待合成的句子过多（上限 {self.max_pending}），请等待已发送的文本合成完成")
+        self._ensure_worker()
+        # 合成参数随句子入队，之后的 config 消息不影响已入队的句子
+        tts_params = TTSParams(**self.params)
+        for sentence in sentences:
+            self._queue.put_nowait((self._seq, sentence, tts_params))
+            self._seq += 1
+            self._unfinished += 1
+        if flush:
+            self._queue.put_nowait(_FLUSHED)
+
+    async def handle_message(self, raw: str) -> None:
+        '''处理一条客户端文本帧，消息不合法时回复 error'''
+        try:
+            try:
+                message = json.loads(raw)
+            except ValueError:
+                raise SessionError("消息必须是JSON格式")
+            if not isinstance(message, dict):
+                raise SessionError("消息必须是JSON对象")
+
+            kind = message.get("type")
+            if kind == "text":
+                text = message.get("text") or ""
+                if not isinstance(text, str):
+                    raise SessionError("text 必须是字符串")
+                flush = bool(message.get("flush"))
+                sentences = self.buffer.push(text)
+                if flush:
+                    sentences += self.buffer.flush()
+                await self._enqueue(sentences, flush)
+            elif kind == "flush":
+                await self._enqueue(self.buffer.flush(), flush=True)
+            elif kind == "cancel":
+                await self.cancel()
+            elif kind == "config":
+                self.update_params(message)
+            else:
+                raise SessionError(f"未知的消息类型: {kind}")
+        except SessionError as e:
+            logger.warning(f"[响应] 会话消息不合法 - 错误信息: {str(e)}")
+            await self.send_json({"type": "error", "error": str(e)})
+
+    async def cancel(self) -> None:
+        '''丢弃缓冲区和队列中的句子，中止正在合成的句子'''
+        self.buffer.clear()
+        dropped = await self._stop_worker()
+        self.cancelled += dropped
+        logger.info(f"[请求] 会话取消合成 - 丢弃句数: {dropped}")
+        await self.send_json({"type": "cancelled"})
+
+    async def _stop_worker(self) -> int:
+        if self._worker is None:
+            return 0
+        dropped = self._unfinished
+        worker, self._worker = self._worker, None
+        if not worker.done():
+            worker.cancel()
+            try:
+                await worker
+            except asyncio.CancelledError:
+                pass
+        self._unfinished = 0
+        return dropped
+
+    async def close(self) -> None:
+        '''连接断开时调用，中止全部合成'''
+        self.buffer.clear()
+        dropped = await self._stop_worker()
+        self.cancelled += dropped
+        if dropped:
+            logger.info(f"[系统] 会话连接已断开，中止合成 - 丢弃句数: {dropped}")
+
+    async def _run(self) -> None:
+        queue = self._queue
+        while True:
+            item = await queue.get()
+            if item is _FLUSHED:
+                await self.send_json({"type": "flushed"})
+                continue
+            try:
+                await self._synthesize(*item)
+            finally:
+                self._unfinished -= 1
+
+    async def _synthesize(self, seq: int, sentence: str, tts_params: TTSParams) -> None:
+        start_time = time.time()
+        await self.send_json({"type": "sentence", "seq": seq, "text": sentence})
+        size = 0
+        stream = self.synthesize(sentence, tts_params)
+        try:
+            async for chunk in stream:
+                if chunk:
+                    size += len(chunk)
+                    await self.send_bytes(chunk)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"[错误] 会话句子合成失败 - 序号: {seq}, 错误信息: {str(e)}")
+            await self.send_json({"type": "error", "seq": seq, "error": str(e)})
+            return
+        finally:
+            # 取消时立即关闭驱动的流，不等垃圾回收
+            await stream.aclose()
+
+        elapsed_time = time.time() - start_time
+        self.sentences += 1
+        logger.info(f"[响应] 会话句子合成完成 - 序号: {seq}, 字数: {len(sentence)}, 大小: {size} bytes, 耗时: {elapsed_time:.3f}秒")
+        await self.send_json({"type": "sentence_end", "seq": seq, "bytes": size, "elapsed": round(elapsed_time, 3)})
@@ -0,0 +1,189 @@
+"""
+进程内请求合并（single-flight）
+
+相同参数的并发合成请求挂到同一个合成任务上，N 个相同请求只推理一次：
+
+- 非流式请求共享同一个任务的结果
+- 流式请求共享同一个生产者，每个消费者都从第一个音频块开始读取，可以中途加入（已缓存的音频不超过 MAX_REPLAY_BYTES 时）
+- 生产者最多领先最慢的消费者 MAX_LAG_BYTES，客户端读得慢时合成随之暂停，不会把整段音频堆在内存里
+"""
+
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 一个合成流为中途加入的消费者保留的音频上限
+MAX_REPLAY_BYTES = 32 * 1024 * 1024
+# 生产者最多领先最慢的消费者多少字节的音频，超过后暂停合成，等待消费者读取
+MAX_LAG_BYTES = 1024 * 1024
+
+
+class SharedStream:
+    '''
+    一个生产者、多个消费者的音频流，所有消费者都收到完整的音频块序列
+
+    为了让中途加入的消费者从第一个音频块开始读取，已产出的音频块保存在 chunks 中，流结束后随对象释放。
+    缓存超过 max_replay_bytes 后不再接受新的消费者（之后的相同请求各自合成），并丢弃所有消费者都已读过的音频块。
+
+    生产者每产出一个音频块后检查最慢的消费者还有多少未读，超过 max_lag_bytes 时暂停，
+    直到该消费者读取或离开，客户端的背压因此传回到合成；内存占用不超过
+    max(max_replay_bytes, max_lag_bytes) 加一个音频块。0 表示不限制。
+    '''
+
+    def __init__(self, agen, max_replay_bytes: int = 0, max_lag_bytes: int = 0) -> None:
+        self.chunks = []
+        # chunks[0] 在整个流中的序号，丢弃已读过的音频块后随之后移
+        self.start = 0
+        self.size = 0
+        # 已产出的总字节数
+        self.produced = 0
+        self.max_replay_bytes = max_replay_bytes
+        self.max_lag_bytes = max_lag_bytes
+        self.truncated = False
+        self.done = False
+        self.error = None
+        self.consumers = 0
+        self.cancelled = False
+        self._positions: dict[object, int] = {}
+        # 每个消费者已读取的字节数
+        self._read: dict[object, int] = {}
+        self._cond = asyncio.Condition()
+        # 消费者读取或离开时唤醒等待中的生产者
+        self._room = asyncio.Event()
+        self._task = asyncio.ensure_future(self._produce(agen))
+
+    @property
+    def joinable(self) -> bool:
+        '''新的消费者能否加入并从头读取'''
+        return not self.cancelled and not self.truncated
+
+    def _has_room(self) -> bool:
+        if not self.max_lag_bytes or not self._read:
+            return True
+        return self.produced - min(self._read.values()) < self.max_lag_bytes
+
+    async def _produce(self, agen) -> None:
+        try:
+            async for chunk in agen:
+                self.chunks.append(chunk)
+                self.size += len(chunk)
+                self.produced += len(chunk)
+                if self.max_replay_bytes and not self.truncated and self.size > self.max_replay_bytes:
+                    self.truncated = True
+                    logger.debug(f"[合并] 合成流缓存超过上限，停止接受新的消费者 - 已缓存: {self.size} bytes")
+                self._trim()
+                async with self._cond:
+                    self._cond.notify_all()
+
+                # 背压：最慢的消费者未读的音频过多时，暂停从引擎读取下一个音频块
+                while not self._has_room():
+                    self._room.clear()
+                    await self._room.wait()
+        except asyncio.CancelledError:
+            self.error = RuntimeError("合成已取消")
+            raise
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
+            async with self._cond:
+                self._cond.notify_all()
+
+    def _trim(self) -> None:
+        '''不再接受新的消费者后，丢弃所有消费者都已读过的音频块'''
+        if not self.truncated or not self._positions:
+            return
+        count = min(self._positions.values()) - self.start
+        if count > 0:
+            self.size -= sum(len(chunk) for chunk in self.chunks[:count])
+            del self.chunks[:count]
+            self.start += count
+
+    async def consume(self):
+        self.consumers += 1
+        token = object()
+        index = self.start
+        self._positions[token] = index
+        self._read[token] = 0
+        try:
+            while True:
+                async with self._cond:
+                    await self._cond.wait_for(lambda: index < self.start + len(self.chunks) or self.done)
+
+                while index < self.start + len(self.chunks):
+                    chunk = self.chunks[index - self.start]
+                    index += 1
+                    self._positions[token] = index
+                    self._read[token] += len(chunk)
+                    self._room.set()
+                    yield chunk
+                self._trim()
+
+                if self.done and index >= self.start + len(self.chunks):
+                    if self.error is not None:
+                        raise self.error
+                    return
+        finally:
+            self.consumers -= 1
+            del self._positions[token]
+            del self._read[token]
+            self._room.set()
+            # 所有消费者都已离开，停止生产
+            if self.consumers == 0 and not self.done:
+                self.cancelled = True
+                self._task.cancel()
+
+
+class SingleFlight:
+    '''按键合并相同的进行中任务'''
+
+    def __init__(self, max_replay_bytes: int = MAX_REPLAY_BYTES, max_lag_bytes: int = MAX_LAG_BYTES) -> None:
+        self.max_replay_bytes = max_replay_bytes
+        self.max_lag_bytes = max_lag_bytes
+        self._calls: dict[str, asyncio.Task] = {}
+        self._streams: dict[str, SharedStream] = {}
+        self.coalesced = 0
+
+    async def do(self, key: str, coro_factory):
+        '''执行 coro_factory()，相同键的进行中任务直接共享其结果'''
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(coro_factory())
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+        else:
+            self.coalesced += 1
+            logger.debug(f"[合并] 复用进行中的合成任务 - 键: {key[:12]}")
+
+        # shield: 某个调用方取消时不影响其他共享该任务的调用方
+        return await asyncio.shield(task)
+
+    async def stream(self, key: str, agen_factory):
+        '''迭代 agen_factory() 产出的音频块，相同键的进行中流共享同一个生产者'''
+        shared = self._streams.get(key)
+        if shared is None or not shared.joinable:
+            shared = SharedStream(agen_factory(), self.max_replay_bytes, self.max_lag_bytes)
+            self._streams[key] = shared
+            shared._task.add_done_callback(lambda _: self._forget_stream(key, shared))
+        else:
+            self.coalesced += 1
+            logger.debug(f"[合并] 加入进行中的合成流 - 键: {key[:12]}, 当前消费者数: {shared.consumers}")
+
+        consumer = shared.consume()
+        try:
+            async for chunk in consumer:
+                yield chunk
+        finally:
+            await consumer.aclose()
+
+    def _forget_stream(self, key: str, shared: SharedStream) -> None:
+        if self._streams.get(key) is shared:
+            del self._streams[key]
+
+    def stats(self) -> dict:
+        return {
+            "coalesced": self.coalesced,
+            "inflight_calls": len(self._calls),
+            "inflight_streams": len(self._streams),
+        }
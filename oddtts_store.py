@@ -0,0 +1,199 @@
+"""
+生成音频文件的托管存储
+
+各引擎的 generate_tts_file 原来直接写入系统临时目录且从不删除，繁忙的节点几天就会写满 /tmp。
+所有需要落盘的音频统一写入专用目录，由 OutputStore 管理生命周期：
+
+- 文件名为 <uuid>.<格式>，文件名同时作为对外的不透明文件ID
+- /play、/download 发送文件期间持有引用，引用中的文件不会被删除；
+  发送完成后文件在 served_ttl 秒后即可回收
+- 后台线程定期清理：超过 max_age 秒的文件直接删除，总大小超过 max_bytes 时从最旧的开始删除
+
+只需要字节或流的路径（generate_tts_bytes / generate_tts_stream）不经过这里，也不写磁盘。
+"""
+
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+
+import oddtts.oddtts_config as config
+
+logger = logging.getLogger(__name__)
+
+FILE_ID_PATTERN = re.compile(r"^[0-9a-f]{32}\.[a-z0-9]{1,8}$")
+
+
+class OutputStore:
+    '''生成音频文件的专用目录，按时间和总大小配额回收'''
+
+    def __init__(self, directory: str, max_bytes: int = 1024 * 1024 * 1024, max_age: float = 3600,
+                 served_ttl: float = 300, sweep_interval: float = 60) -> None:
+        self.directory = os.path.abspath(directory)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.served_ttl = served_ttl
+        self.sweep_interval = sweep_interval
+        self._refs: dict[str, int] = {}
+        self._served: dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._sweeper = None
+        self.evicted = 0
+
+    def _ensure_started(self) -> None:
+        if self._sweeper is not None:
+            return
+        with self._lock:
+            if self._sweeper is None:
+                os.makedirs(self.directory, exist_ok=True)
+                self._sweeper = threading.Thread(target=self._sweep_forever, name="oddtts-store-sweeper", daemon=True)
+                self._sweeper.start()
+
+    def new_path(self, suffix: str) -> str:
+        '''分配一个新文件路径，调用方负责写入'''
+        self._ensure_started()
+        return os.path.join(self.directory, f"{uuid.uuid4().hex}.{suffix.lstrip('.').lower()}")
+
+    def file_id(self, path: str) -> str:
+        '''返回托管文件的文件ID，不在托管目录中的路径返回None'''
+        if not isinstance(path, str):
+            return None
+        name = os.path.basename(path)
+        if os.path.dirname(os.path.abspath(path)) != self.directory or not FILE_ID_PATTERN.match(name):
+            return None
+        return name
+
+    def path_of(self, file_id: str) -> str:
+        '''文件ID对应的路径，ID不合法或文件已被回收时返回None'''
+        if not file_id or not FILE_ID_PATTERN.match(file_id):
+            return None
+        path = os.path.join(self.directory, file_id)
+        return path if os.path.isfile(path) else None
+
+    def acquire(self, file_id: str) -> str:
+        '''发送文件前持有引用，返回文件路径；文件不存在时返回None'''
+        with self._lock:
+            path = self.path_of(file_id)
+            if path is not None:
+                self._refs[file_id] = self._refs.get(file_id, 0) + 1
+            return path
+
+    def release(self, file_id: str) -> None:
+        '''发送完成后释放引用，文件在 served_ttl 秒后可被回收'''
+        with self._lock:
+            refs = self._refs.get(file_id, 0) - 1
+            if refs > 0:
+                self._refs[file_id] = refs
+            else:
+                self._refs.pop(file_id, None)
+            self._served[file_id] = time.time()
+
+    def _remove(self, name: str) -> bool:
+        try:
+            os.remove(os.path.join(self.directory, name))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"[系统] 删除音频文件失败 - 文件: {name}, 错误信息: {str(e)}")
+            return False
+        self._served.pop(name, None)
+        self.evicted += 1
+        return True
+
+    def sweep(self) -> int:
+        '''清理过期和超出容量的文件，正在发送的文件跳过，返回删除的文件数'''
+        now = time.time()
+        files = []
+        try:
+            with os.scandir(self.directory) as entries:
+                for entry in entries:
+                    if entry.is_file() and FILE_ID_PATTERN.match(entry.name):
+                        stat = entry.stat()
+                        files.append((stat.st_mtime, stat.st_size, entry.name))
+        except FileNotFoundError:
+            return 0
+
+        removed = 0
+        kept = []
+        with self._lock:
+            for mtime, size, name in files:
+                if self._refs.get(name):
+                    kept.append((mtime, size, name))
+                    continue
+                served = self._served.get(name)
+                expired = now - mtime > self.max_age or (served is not None and now - served > self.served_ttl)
+                if expired and self._remove(name):
+                    removed += 1
+                else:
+                    kept.append((mtime, size, name))
+
+            total = sum(size for _, size, _ in kept)
+            for mtime, size, name in sorted(kept):
+                if total <= self.max_bytes:
+                    break
+                if not self._refs.get(name) and self._remove(name):
+                    total -= size
+                    removed += 1
+
+            # 清理已被外部删除的文件的发送记录
+            existing = {name for _, _, name in files}
+            for name in list(self._served):
+                if name not in existing:
+                    self._served.pop(name, None)
+
+        if removed:
+            logger.info(f"[系统] 已回收音频文件 - 数量: {removed}, 剩余大小: {total} bytes")
+        return removed
+
+    def _sweep_forever(self) -> None:
+        while True:
+            time.sleep(self.sweep_interval)
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.warning(f"[系统] 回收音频文件失败 - 错误信息: {str(e)}")
+
+    def stats(self) -> dict:
+        files = 0
+        size = 0
+        try:
+            with os.scandir(self.directory) as entries:
+                for entry in entries:
+                    if entry.is_file() and FILE_ID_PATTERN.match(entry.name):
+                        files += 1
+                        size += entry.stat().st_size
+        except FileNotFoundError:
+            pass
+        with self._lock:
+            referenced = len(self._refs)
+        return {
+            "files": files,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+            "referenced": referenced,
+            "evicted": self.evicted,
+        }
+
+
+_output_store: OutputStore = None
+_lock = threading.Lock()
+
+
+def get_output_store() -> OutputStore:
+    '''获取进程内唯一的音频文件存储'''
+    global _output_store
+    if _output_store is None:
+        with _lock:
+            if _output_store is None:
+                cfg = config.store_cfg
+                _output_store = OutputStore(
+                    directory=cfg.get("directory") or os.path.join(tempfile.gettempdir(), "oddtts"),
+                    max_bytes=cfg.get("max_bytes", 1024 * 1024 * 1024),
+                    max_age=cfg.get("max_age", 3600),
+                    served_ttl=cfg.get("served_ttl", 300),
+                    sweep_interval=cfg.get("sweep_interval", 60),
+                )
+    return _output_store
@@ -0,0 +1,77 @@
+import json
+import os
+import subprocess
+import sys
+
+# 在独立子进程中冷启动，统计每个引擎的导入耗时和常驻内存(RSS峰值)
+# 用法: python tests/benchmark_driver_import.py [引擎类型名 ...]
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 子进程脚本：跳过 oddtts/__init__.py（它会导入整个应用并加载默认引擎），
+# 只测量 base_tts_driver 和所选引擎模块本身的开销
+CHILD_SCRIPT = r"""
+import importlib.machinery, importlib.util, json, resource, sys, time
+
+start = time.perf_counter()
+spec = importlib.machinery.ModuleSpec("oddtts", None, is_package=True)
+package = importlib.util.module_from_spec(spec)
+package.__path__ = [sys.argv[1]]
+sys.modules["oddtts"] = package
+
+from oddtts.oddtts_params import ODDTTS_TYPE
+from oddtts.base_tts_driver import TTS_DRIVERS, load_driver_class
+base_time = time.perf_counter() - start
+
+target = sys.argv[2]
+if target == "ALL":
+    # 相当于改为延迟导入之前：所有引擎模块全部导入
+    for type in TTS_DRIVERS:
+        load_driver_class(type)
+else:
+    load_driver_class(ODDTTS_TYPE[target])
+
+print(json.dumps({
+    "base": base_time,
+    "total": time.perf_counter() - start,
+    "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+}))
+"""
+
+ENGINES = [
+    "ODDTTS_EDGETTS",
+    "ODDTTS_CHATTTS",
+    "ODDTTS_BERTVITS2",
+    "ODDTTS_BERTVITS2_V2",
+    "ODDTTS_GPTSOVITS",
+    "ODDTTS_KOKORO",
+    "ODDTTS_KOKORO_V1_1",
+    "ALL",
+]
+
+
+def benchmark(target: str) -> dict:
+    result = subprocess.run(
+        [sys.executable, "-c", CHILD_SCRIPT, REPO_DIR, target],
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        error = result.stderr.strip().splitlines()
+        return {"error": error[-1] if error else f"退出码 {result.returncode}"}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    targets = sys.argv[1:] or ENGINES
+    print(f"{'引擎':<22}{'基础导入(秒)':>14}{'总耗时(秒)':>12}{'RSS(MB)':>10}")
+    for target in targets:
+        stats = benchmark(target)
+        if "error" in stats:
+            print(f"{target:<22}导入失败: {stats['error']}")
+            continue
+        print(f"{target:<22}{stats['base']:>14.3f}{stats['total']:>12.3f}{stats['rss_mb']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+import asyncio
+import os
+import sys
+import time
+import tracemalloc
+
+from oddtts.oddtts_params import TTSParams
+from oddtts import tts_edge
+
+# 对比 EdgeTTSAPI 字节拼接方式：原来的逐块 +=、现在的列表收集后一次 join，以及直接写入文件
+# 不访问网络：用替身 Communicate 按 Edge 的输出码率（24kHz 48kbps mp3，约 6KB/秒）产出音频块
+# 用法: python tests/benchmark_edge_bytes.py [字符数...]
+
+BYTES_PER_SECOND = 6000
+# 中文朗读约每秒 4 个字
+CHARS_PER_SECOND = 4
+CHUNK_SIZE = 4096
+# 逐块 += 的耗时随音频长度平方增长，超过该字符数时跳过
+LEGACY_MAX_CHARS = 10000
+
+
+class FakeCommunicate:
+    def __init__(self, text, voice, **kwargs):
+        self.size = int(len(text) / CHARS_PER_SECOND * BYTES_PER_SECOND)
+
+    async def stream(self):
+        chunk = os.urandom(CHUNK_SIZE)
+        for offset in range(0, self.size, CHUNK_SIZE):
+            yield {"type": "audio", "data": chunk[:min(CHUNK_SIZE, self.size - offset)]}
+            if offset % (CHUNK_SIZE * 16) == 0:
+                yield {"type": "WordBoundary", "offset": offset}
+
+
+async def legacy_bytes(api, text, tts_params):
+    """原 generate_tts_bytes 的实现"""
+    audio_data = b""
+    async for chunk in api._communicate(text, tts_params).stream():
+        if chunk["type"] == "audio":
+            audio_data += chunk["data"]
+    return audio_data
+
+
+async def file_size(api, text, tts_params):
+    path = await api.generate_tts_file(text, tts_params)
+    size = os.path.getsize(path)
+    os.remove(path)
+    return size
+
+
+def measure(func, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = asyncio.run(func(*args))
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    size = result if isinstance(result, int) else len(result)
+    return elapsed, peak, size
+
+
+def main():
+    lengths = [int(arg) for arg in sys.argv[1:]] or [1000, 10000, 50000]
+    tts_edge.edge_tts.Communicate = FakeCommunicate
+    api = tts_edge.EdgeTTSAPI()
+    tts_params = TTSParams(voice="zh-CN-XiaoxiaoNeural", rate=0, volume=0, pitch=0)
+
+    print(f"{'字符数':<8}{'路径':<8}{'耗时(毫秒)':>12}{'峰值分配(MB)':>14}{'输出大小(MB)':>14}")
+    for length in lengths:
+        text = "测" * length
+        paths = [("join", api.generate_tts_bytes), ("file", lambda t, p: file_size(api, t, p))]
+        if length <= LEGACY_MAX_CHARS:
+            paths.insert(0, ("legacy", lambda t, p: legacy_bytes(api, t, p)))
+        else:
+            print(f"{length:<8}{'legacy':<8}跳过（超过 {LEGACY_MAX_CHARS} 字符）")
+        for name, func in paths:
+            elapsed, peak, size = measure(func, text, tts_params)
+            print(f"{length:<8}{name:<8}{elapsed * 1000:>12.1f}{peak / 1024 / 1024:>14.1f}{size / 1024 / 1024:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
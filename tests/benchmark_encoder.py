@@ -0,0 +1,77 @@
+import io
+import statistics
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import soundfile as sf
+from pydub import AudioSegment
+
+from oddtts.oddtts_encoder import encode_audio, encode_with_ffmpeg
+from oddtts.oddtts_ffmpeg import get_ffmpeg_pool
+
+# 对比原有 numpy→WAV→pydub→ffmpeg 路径、进程内编码器和常驻 ffmpeg 进程池的耗时和内存分配
+# 用法: python tests/benchmark_encoder.py [音频秒数] [重复次数]
+
+SAMPLE_RATE = 24000
+FORMATS = ["wav", "pcm", "mp3", "flac", "ogg", "opus", "aac"]
+# 经由 ffmpeg 进程池编码的格式
+FFMPEG_FORMATS = ["mp3", "flac", "ogg", "opus", "aac"]
+
+
+def legacy_encode(audio_numpy, sample_rate, output_format):
+    """原 convert_audio_format(input_type="numpy", output_type="bytes") 的实现"""
+    wav_buffer = io.BytesIO()
+    sf.write(wav_buffer, audio_numpy, sample_rate, format='WAV')
+    wav_buffer.seek(0)
+    audio = AudioSegment.from_wav(wav_buffer)
+    output_buffer = io.BytesIO()
+    audio.export(output_buffer, format=output_format, bitrate="128k")
+    return output_buffer.getvalue()
+
+
+def measure(func, audio_numpy, output_format, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        data = func(audio_numpy, SAMPLE_RATE, output_format)
+        timings.append(time.perf_counter() - start)
+        # 留出时间让进程池在后台补充待命进程
+        time.sleep(0.2)
+
+    tracemalloc.start()
+    func(audio_numpy, SAMPLE_RATE, output_format)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(timings), peak, len(data)
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 10
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    # 模拟 Kokoro 输出：float32 单声道
+    t = np.arange(int(SAMPLE_RATE * seconds)) / SAMPLE_RATE
+    audio_numpy = (0.3 * np.sin(2 * np.pi * 220 * t) + 0.05 * np.random.randn(t.size)).astype(np.float32)
+    print(f"音频时长: {seconds}秒, 采样率: {SAMPLE_RATE}, 重复次数: {repeat}")
+    print(f"{'格式':<6}{'路径':<10}{'耗时(毫秒)':>12}{'峰值分配(KB)':>14}{'输出大小(KB)':>14}")
+
+    for output_format in FORMATS:
+        # pcm 是新增格式，原路径不支持
+        paths = [("encoder", encode_audio)] if output_format == "pcm" else [("legacy", legacy_encode), ("encoder", encode_audio)]
+        if output_format in FFMPEG_FORMATS:
+            paths.append(("ffmpeg", encode_with_ffmpeg))
+        for name, func in paths:
+            try:
+                elapsed, peak, size = measure(func, audio_numpy, output_format, repeat)
+            except Exception as e:
+                print(f"{output_format:<6}{name:<10}失败: {str(e).splitlines()[0]}")
+                continue
+            print(f"{output_format:<6}{name:<10}{elapsed * 1000:>12.1f}{peak / 1024:>14.0f}{size / 1024:>14.0f}")
+
+    print(f"ffmpeg 进程池: {get_ffmpeg_pool().stats()}")
+
+
+if __name__ == "__main__":
+    main()
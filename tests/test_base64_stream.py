@@ -0,0 +1,63 @@
+import asyncio
+import base64
+import json
+import os
+
+from oddtts.oddtts_base64 import base64_records, encode_record, resolve_transport
+
+AUDIO = os.urandom(100 * 1024 + 1)
+
+
+async def chunked(data, sizes):
+    offset = 0
+    for size in sizes:
+        yield data[offset:offset + size]
+        offset += size
+    yield data[offset:]
+
+
+async def collect(chunks, response_format="mp3", record_bytes=48 * 1024):
+    return [record async for record in base64_records(chunks, response_format, record_bytes)]
+
+
+def test_records_reassemble_audio():
+    # 块大小不是 3 的倍数，且有一块超过单条记录上限
+    records = asyncio.run(collect(chunked(AUDIO, [1, 7, 4096, 60000, 2]), record_bytes=16 * 1024))
+    audio, end = records[:-1], records[-1]
+
+    assert [record["seq"] for record in audio] == list(range(len(audio)))
+    assert all(record["type"] == "audio" for record in audio)
+    assert b"".join(base64.b64decode(record["data"]) for record in audio) == AUDIO
+    # 除最后一条外都是 3 字节对齐的，data 字符串可以直接拼接后解码
+    assert base64.b64decode("".join(record["data"] for record in audio)) == AUDIO
+    assert max(len(base64.b64decode(record["data"])) for record in audio) <= 16 * 1024
+
+    assert end["type"] == "end"
+    assert end["seq"] == end["chunks"] == len(audio)
+    assert end["bytes"] == len(AUDIO)
+    assert end["format"] == "mp3" and end["mime_type"] == "audio/mpeg"
+
+
+def test_error_record_and_transports():
+    async def failing():
+        yield b"abcd"
+        raise RuntimeError("engine failed")
+
+    records = asyncio.run(collect(failing()))
+    assert [record["type"] for record in records] == ["audio", "error"]
+    assert records[-1]["seq"] == 1 and records[-1]["error"] == "engine failed"
+
+    assert json.loads(encode_record(records[0], "ndjson")) == records[0]
+    sse = encode_record(records[-1], "sse").decode("utf-8")
+    assert sse.startswith("id: 1\nevent: error\ndata: ") and sse.endswith("\n\n")
+
+    assert resolve_transport(None, "text/event-stream") == "sse"
+    assert resolve_transport("", "*/*") == "ndjson"
+    assert resolve_transport("NDJSON", "text/event-stream") == "ndjson"
+    assert resolve_transport("xml") is None
+
+
+if __name__ == "__main__":
+    test_records_reassemble_audio()
+    test_error_record_and_transports()
+    print("所有Base64流式传输测试通过!")
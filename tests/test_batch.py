@@ -0,0 +1,157 @@
+import asyncio
+import json
+import os
+import tempfile
+import time
+import zipfile
+
+from oddtts.base_tts_driver import OddTTSDriver
+from oddtts.oddtts_batch import BatchJobManager
+from oddtts.oddtts_params import ODDTTS_TYPE, TTSParams
+from oddtts.oddtts_runtime import InferenceBusyError
+from oddtts.oddtts_singleflight import SingleFlight
+
+
+class FakeTTS:
+    """只实现 generate_tts_batch 用到的接口：记录并发数，指定文本第一次（或每次）合成时模拟准入被拒绝"""
+
+    def __init__(self, workers=4, busy_texts=(), fail_texts=(), always_busy_texts=()):
+        self.workers = workers
+        self.busy_texts = set(busy_texts)
+        self.fail_texts = set(fail_texts)
+        self.always_busy_texts = set(always_busy_texts)
+        self.calls = []
+        self.running = 0
+        self.max_running = 0
+
+    def inference_workers(self):
+        return self.workers
+
+    async def generate_tts_bytes(self, text, tts_params):
+        self.calls.append(text)
+        if text in self.always_busy_texts:
+            raise InferenceBusyError("推理队列已满")
+        if text in self.busy_texts:
+            self.busy_texts.discard(text)
+            raise InferenceBusyError("推理队列已满")
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            await asyncio.sleep(0.02)
+        finally:
+            self.running -= 1
+        if text in self.fail_texts:
+            raise RuntimeError(f"合成失败: {text}")
+        return f"{tts_params.voice}:{text}".encode()
+
+
+def make_driver(tts):
+    driver = OddTTSDriver.__new__(OddTTSDriver)
+    driver.tts = tts
+    driver.cache = None
+    driver.single_flight = SingleFlight()
+    return driver
+
+
+def make_items(count, voices=("v2", "v1")):
+    return [(f"text{index}", TTSParams(voice=voices[index % len(voices)], rate=0, volume=0, pitch=0)) for index in range(count)]
+
+
+async def collect(driver, items, concurrency=0, busy_timeout=60):
+    return {index: result async for index, result in driver.generate_tts_batch(ODDTTS_TYPE.ODDTTS_KOKORO_V1_1, items, concurrency, busy_timeout)}
+
+
+def test_batch_concurrency_capped():
+    items = make_items(12)
+
+    # 默认和超过上限的配置都只占用一半推理线程
+    for concurrency in (0, 16):
+        tts = FakeTTS(workers=4)
+        results = asyncio.run(collect(make_driver(tts), items, concurrency))
+        assert results == {index: f"{params.voice}:{text}".encode() for index, (text, params) in enumerate(items)}
+        assert tts.max_running == 2
+
+    tts = FakeTTS(workers=4)
+    asyncio.run(collect(make_driver(tts), items, concurrency=1))
+    assert tts.max_running == 1
+    # 按音色排序取出条目
+    assert tts.calls == [text for text, params in sorted(items, key=lambda item: item[1].voice)]
+
+    tts = FakeTTS(workers=1)
+    asyncio.run(collect(make_driver(tts), items))
+    assert tts.max_running == 1
+
+
+def test_batch_retries_busy_items():
+    items = make_items(4)
+    tts = FakeTTS(workers=4, busy_texts={"text1"}, fail_texts={"text2"})
+    results = asyncio.run(collect(make_driver(tts), items))
+
+    # 准入被拒绝的条目等待后重试，其余失败作为该条目的结果返回
+    assert results[1] == b"v1:text1"
+    assert tts.calls.count("text1") == 2
+    assert isinstance(results[2], RuntimeError)
+    assert tts.calls.count("text2") == 1
+    assert results[0] == b"v2:text0" and results[3] == b"v1:text3"
+
+
+def test_batch_busy_timeout():
+    items = make_items(3)
+    tts = FakeTTS(workers=2, always_busy_texts={"text0"})
+    start = time.time()
+    results = asyncio.run(collect(make_driver(tts), items, busy_timeout=1))
+
+    # 一直未被准入的条目超时后记为失败，不会让整个任务挂起；其余条目照常完成
+    assert time.time() - start < 5
+    assert isinstance(results[0], InferenceBusyError)
+    assert 2 <= tts.calls.count("text0") <= 4
+    assert results[1] == b"v1:text1" and results[2] == b"v2:text2"
+
+
+def wait_finished(job, timeout=10):
+    deadline = time.time() + timeout
+    while not job.finished:
+        assert time.time() < deadline, "批量任务未在限定时间内完成"
+        time.sleep(0.02)
+
+
+def test_batch_job_manager():
+    with tempfile.TemporaryDirectory() as directory:
+        tts = FakeTTS(workers=2, fail_texts={"text3"})
+        manager = BatchJobManager(make_driver(tts), output_dir=directory, job_ttl=60)
+        job = manager.submit(ODDTTS_TYPE.ODDTTS_KOKORO_V1_1, make_items(5))
+        assert manager.get(job.id) is job
+        wait_finished(job)
+
+        progress = job.progress()
+        assert progress["status"] == "done"
+        assert (progress["total"], progress["completed"], progress["failed"]) == (5, 4, 1)
+
+        manifest = job.manifest()
+        assert [entry["status"] for entry in manifest] == ["success", "success", "success", "failed", "success"]
+        assert manifest[3]["error"] == "合成失败: text3"
+
+        # zip 中是清单和所有成功条目的音频
+        with zipfile.ZipFile(job.archive_path) as archive:
+            names = sorted(archive.namelist())
+            assert names == ["00000.wav", "00001.wav", "00002.wav", "00004.wav", "manifest.json"]
+            assert archive.read("00004.wav") == b"v2:text4"
+            assert json.loads(archive.read("manifest.json")) == manifest
+
+        assert manager.stats() == {"queued": 0, "running": 0, "done": 1, "failed": 0, "items_completed": 4, "items_failed": 1}
+
+        # 完成未超过 job_ttl 的任务保留，超过后连同文件一起清理
+        manager.cleanup()
+        assert manager.get(job.id) is job
+        job.finished -= 61
+        manager.cleanup()
+        assert manager.get(job.id) is None
+        assert not os.path.exists(job.directory)
+
+
+if __name__ == "__main__":
+    test_batch_concurrency_capped()
+    test_batch_retries_busy_items()
+    test_batch_busy_timeout()
+    test_batch_job_manager()
+    print("所有批量合成测试通过!")
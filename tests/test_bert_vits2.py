@@ -0,0 +1,144 @@
+import asyncio
+import os
+import tempfile
+import threading
+import time
+
+from aiohttp import web
+
+from oddtts.oddtts_http import HttpClient, HttpError
+from oddtts.oddtts_params import TTSParams
+from oddtts.tts_bert_vits2 import BertVits2API
+from oddtts.tts_bert_vits2_v2 import BertVits2V2API
+
+# 本地替身服务，模拟 Gradio 的 /run/predict 和 /file= 接口；第一次合成请求和第一次下载返回 503 用于验证重试
+AUDIO = b"RIFF" + os.urandom(200 * 1024)
+
+
+async def start_server():
+    state = {"predict_calls": 0, "file_calls": 0}
+
+    async def predict(request):
+        state["predict_calls"] += 1
+        if state["predict_calls"] == 1:
+            return web.Response(status=503, text="busy")
+        await request.read()
+        return web.json_response({"data": ["Success", {"name": "/tmp/gradio/audio.wav"}]})
+
+    async def file(request):
+        state["file_calls"] += 1
+        if state["file_calls"] == 1:
+            return web.Response(status=503, text="busy")
+        response = web.StreamResponse()
+        await response.prepare(request)
+        for i in range(0, len(AUDIO), 16 * 1024):
+            await response.write(AUDIO[i:i + 16 * 1024])
+        await response.write_eof()
+        return response
+
+    app = web.Application()
+    app.router.add_post("/run/predict", predict)
+    app.router.add_get("/file=/tmp/gradio/audio.wav", file)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = runner.addresses[0][1]
+    return runner, f"http://127.0.0.1:{port}", state
+
+
+def test_bert_vits2_against_stand_in_server():
+    async def run():
+        runner, base_url, state = await start_server()
+        http = HttpClient(backoff=0.01)
+        tts_params = TTSParams(voice="派蒙_ZH", rate=0, volume=0, pitch=0)
+        try:
+            client = BertVits2API(api_url=base_url + "/run/predict", http=http)
+            # 合成请求(POST)可能已被远端处理，返回 503 时不重试
+            try:
+                await client.generate_tts_bytes("你好", tts_params)
+                raise AssertionError("合成请求返回 503 时应直接失败")
+            except HttpError as e:
+                assert e.status == 503
+            assert state["predict_calls"] == 1 and http.stats()["retried"] == 0
+
+            # 下载音频(GET)返回 503 时重试
+            assert await client.generate_tts_bytes("你好", tts_params) == AUDIO
+            assert state["predict_calls"] == 2 and state["file_calls"] == 2
+            assert http.stats()["retried"] == 1
+
+            chunks = [chunk async for chunk in client.generate_tts_stream("你好", tts_params)]
+            assert len(chunks) > 1 and b"".join(chunks) == AUDIO
+
+            path = await client.generate_tts_file("你好", tts_params)
+            with open(path, "rb") as f:
+                assert f.read() == AUDIO
+            os.remove(path)
+
+            client_v2 = BertVits2V2API(api=base_url, http=http)
+            assert await client_v2.generate_tts_bytes("你好", tts_params) == AUDIO
+            with tempfile.TemporaryDirectory() as directory:
+                save_path = os.path.join(directory, "audio.mp3")
+                assert await client_v2.download_audio(await client_v2.get_audio_url("你好", "abc"), save_path)
+                assert os.path.getsize(save_path) == len(AUDIO)
+        finally:
+            await http.close()
+            await runner.cleanup()
+
+    asyncio.run(run())
+
+
+def test_post_retried_only_on_connect_errors():
+    async def run():
+        # 没有服务监听的端口：连接建立失败，请求确定未发出，POST 也可以重试
+        runner, base_url, _ = await start_server()
+        await runner.cleanup()
+        http = HttpClient(retries=2, backoff=0.01)
+        try:
+            await http.request_json("POST", base_url + "/run/predict", json={})
+            raise AssertionError("连接失败时应抛出 HttpError")
+        except HttpError:
+            pass
+        finally:
+            await http.close()
+        assert http.stats() == {"requests": 3, "retried": 2, "failed": 1}
+
+    asyncio.run(run())
+
+
+def test_session_closed_when_loop_changes():
+    # 会话先在长驻的后台事件循环上创建，之后换到另一个事件循环使用（如 ASGI 服务器接管）时，旧会话在后台循环上关闭
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    runner, base_url, _ = asyncio.run_coroutine_threadsafe(start_server(), loop).result()
+    url = base_url + "/file=/tmp/gradio/audio.wav"
+    http = HttpClient(backoff=0.01)
+    try:
+        assert asyncio.run_coroutine_threadsafe(http.request_bytes("GET", url), loop).result() == AUDIO
+        old_session = http._session
+
+        async def run():
+            try:
+                assert await http.request_bytes("GET", url) == AUDIO
+                assert http._session is not old_session
+            finally:
+                await http.close()
+
+        asyncio.run(run())
+        deadline = time.time() + 5
+        while not old_session.closed:
+            assert time.time() < deadline, "旧事件循环上的会话未被关闭"
+            time.sleep(0.01)
+    finally:
+        asyncio.run_coroutine_threadsafe(runner.cleanup(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+
+
+if __name__ == "__main__":
+    test_bert_vits2_against_stand_in_server()
+    test_post_retried_only_on_connect_errors()
+    test_session_closed_when_loop_changes()
+    print("所有BertVits2测试通过!")
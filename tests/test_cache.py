@@ -0,0 +1,149 @@
+import asyncio
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from oddtts.base_tts_driver import OddTTSDriver
+from oddtts.oddtts_cache import DiskAudioCache, MemoryAudioCache, SynthesisCache, make_cache_key
+from oddtts.oddtts_encoder import SAMPLE_RATE, encode_wav, float_to_pcm16, wav_stream_header
+from oddtts.oddtts_params import ODDTTS_TYPE, TTSParams
+from oddtts.oddtts_singleflight import SingleFlight
+
+
+def test_make_cache_key_normalization():
+    params = TTSParams(voice="zf_001", rate=0, volume=0, pitch=0)
+    key = make_cache_key("kokoro", "你好，世界\nhello  world", params)
+
+    # 全角/半角、换行符、行首尾和连续空白不影响缓存键
+    assert make_cache_key("kokoro", "  你好,世界 \r\nhello \t world\n", params) == key
+    assert make_cache_key("kokoro", "你好，世界\nhello world!", params) != key
+    assert make_cache_key("kokoro", "你好，世界\nhello  world", TTSParams(voice="zf_001", rate=10, volume=0, pitch=0)) != key
+    assert make_cache_key("kokoro", "你好，世界\nhello  world", TTSParams(voice="zf_001", rate=0, volume=0, pitch=0, response_format="mp3")) != key
+
+
+def test_memory_cache_lru_and_ttl():
+    cache = MemoryAudioCache(max_bytes=10)
+    cache.put("a", b"aaaa")
+    cache.put("b", b"bbbb")
+    assert cache.get("a") == b"aaaa"
+
+    # 超出字节上限时淘汰最久未使用的 b
+    cache.put("c", b"cccc")
+    assert cache.get("b") is None
+    assert cache.get("a") == b"aaaa" and cache.get("c") == b"cccc"
+    assert cache.size == 8 and len(cache) == 2
+
+    # 覆盖写入不重复计算大小，超过上限的条目不缓存
+    cache.put("a", b"aa")
+    cache.put("big", b"x" * 11)
+    assert cache.size == 6 and cache.get("big") is None
+
+    cache = MemoryAudioCache(max_bytes=10, ttl=0.05)
+    cache.put("a", b"aaaa")
+    assert cache.get("a") == b"aaaa"
+    time.sleep(0.1)
+    assert cache.get("a") is None
+    assert cache.size == 0 and len(cache) == 0
+
+
+def test_disk_cache_size_eviction():
+    with tempfile.TemporaryDirectory() as directory:
+        cache = DiskAudioCache(directory, max_bytes=100)
+        now = time.time()
+        for index, key in enumerate(["aa1", "bb2", "cc3"]):
+            cache.put(key, bytes([index]) * 30)
+            os.utime(cache._path(key), (now - 100 + index, now - 100 + index))
+        # 命中会刷新修改时间，aa1 变为最近使用
+        assert cache.get("aa1") == bytes([0]) * 30
+        assert cache.size == 90
+
+        # 超过上限后按最近使用时间淘汰，直到降到上限的 90%：只淘汰最久未使用的 bb2
+        cache.put("dd4", b"d" * 30)
+        assert cache.get("bb2") is None
+        assert all(cache.get(key) is not None for key in ["aa1", "cc3", "dd4"])
+        assert cache.size == 90
+
+        # 重启后按目录中的文件重新统计大小
+        assert DiskAudioCache(directory, max_bytes=100).size == 90
+
+        cache = DiskAudioCache(directory, max_bytes=100, ttl=10)
+        os.utime(cache._path("aa1"), (now - 60, now - 60))
+        assert cache.get("aa1") is None
+        assert cache.size == 60
+
+
+def test_counters_are_thread_safe():
+    cache = SynthesisCache(MemoryAudioCache(1024))
+    cache.memory.put("hit", b"x")
+
+    async def lookups():
+        for _ in range(200):
+            await cache.get("hit")
+            await cache.get("miss")
+
+    threads = [threading.Thread(target=lambda: asyncio.run(lookups())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    stats = cache.stats()
+    assert stats["hits"]["memory"] == 1600 and stats["misses"] == 1600
+
+
+AUDIO = np.linspace(-0.5, 0.5, 8, dtype=np.float32)
+
+
+class FakeTTS:
+    """流式接口输出流式WAV，字节接口输出完整WAV，记录引擎被调用的接口"""
+
+    def __init__(self, stream_encoded=True):
+        self.encoded = stream_encoded
+        self.calls = []
+
+    def stream_encoded(self):
+        return self.encoded
+
+    async def generate_tts_stream(self, text, tts_params):
+        self.calls.append("stream")
+        yield wav_stream_header(SAMPLE_RATE)
+        yield float_to_pcm16(AUDIO)
+
+    async def generate_tts_bytes(self, text, tts_params):
+        self.calls.append("bytes")
+        return encode_wav(AUDIO, SAMPLE_RATE)
+
+
+def test_stream_and_bytes_share_entry():
+    async def run(tts):
+        driver = OddTTSDriver.__new__(OddTTSDriver)
+        driver.tts = tts
+        driver.cache = SynthesisCache(MemoryAudioCache(1024))
+        driver.single_flight = SingleFlight()
+        params = TTSParams(voice="zf_001", rate=0, volume=0, pitch=0)
+        streamed = b"".join([chunk async for chunk in driver.generate_tts_stream(ODDTTS_TYPE.ODDTTS_KOKORO, "你好", params)])
+        data = await driver.generate_tts_bytes(ODDTTS_TYPE.ODDTTS_KOKORO, "你好", params)
+        return streamed, data
+
+    # 流式合成的结果补全WAV头后写入缓存，字节接口直接命中，与完整合成的结果一致
+    tts = FakeTTS()
+    streamed, data = asyncio.run(run(tts))
+    assert tts.calls == ["stream"]
+    assert data == encode_wav(AUDIO, SAMPLE_RATE) and data[44:] == streamed[44:]
+
+    # 流式输出不是按请求格式编码的引擎不写缓存
+    tts = FakeTTS(stream_encoded=False)
+    asyncio.run(run(tts))
+    assert tts.calls == ["stream", "bytes"]
+
+
+if __name__ == "__main__":
+    test_make_cache_key_normalization()
+    test_memory_cache_lru_and_ttl()
+    test_disk_cache_size_eviction()
+    test_counters_are_thread_safe()
+    test_stream_and_bytes_share_entry()
+    print("所有缓存测试通过!")
@@ -0,0 +1,53 @@
+import os
+import tempfile
+
+from oddtts.oddtts_g2p import CachedG2P, PhonemeCache
+
+
+def test_lookup_and_pronunciations():
+    calls = []
+
+    def g2p(text):
+        calls.append(text)
+        return text.lower()
+
+    cache = PhonemeCache(max_entries=2, pronunciations={"Kokoro": "kˈOkəɹO"})
+    assert cache.lookup("en", "Hello", g2p) == "hello"
+    assert cache.lookup("en", "Hello", g2p) == "hello"
+    assert calls == ["Hello"]
+
+    # 发音词典优先，不调用 G2P
+    assert cache.lookup("en", "Kokoro", g2p) == "kˈOkəɹO"
+    assert calls == ["Hello"]
+
+    # 超出容量按 LRU 淘汰
+    cache.lookup("en", "A", g2p)
+    cache.lookup("en", "B", g2p)
+    assert cache.get("en", "Hello") is None
+
+
+def test_cached_g2p_and_persistence():
+    calls = []
+
+    def zh_g2p(text):
+        calls.append(text)
+        return f"ps({text})", None
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "g2p.json")
+        cache = PhonemeCache(path=path)
+        g2p = CachedG2P(zh_g2p, cache, "zh")
+        assert g2p("你好") == ("ps(你好)", None)
+        assert g2p("你好") == ("ps(你好)", None)
+        assert calls == ["你好"]
+        cache.save()
+
+        # 重启后从文件加载
+        restored = PhonemeCache(path=path)
+        assert restored.get("zh", "你好") == "ps(你好)"
+
+
+if __name__ == "__main__":
+    test_lookup_and_pronunciations()
+    test_cached_g2p_and_persistence()
+    print("所有G2P缓存测试通过!")
@@ -0,0 +1,70 @@
+import asyncio
+import os
+import signal
+import time
+
+from oddtts.oddtts_prefork import PreforkInferencePool
+
+
+def synthesize(text, hang=False):
+    '''逐字回传片段；hang 为 True 时回传第一段后一直阻塞，模拟卡住的推理'''
+    for index, char in enumerate(text):
+        yield char
+        if hang and index == 0:
+            time.sleep(60)
+
+
+def wait_ready(pool, respawned=0, timeout=10):
+    deadline = time.time() + timeout
+    while not (pool.stats()["respawned"] == respawned and pool.stats()["ready"] == pool.num_processes):
+        assert time.time() < deadline, "推理进程未在限定时间内就绪"
+        time.sleep(0.02)
+
+
+async def collect(pool, *args):
+    return "".join([segment async for segment in pool.stream(*args)])
+
+
+def test_respawn_crashed_workers():
+    pool = PreforkInferencePool(synthesize, 2, timeout=10)
+    pool.start()
+    try:
+        wait_ready(pool)
+        assert asyncio.run(collect(pool, "abc")) == "abc"
+
+        # 杀掉空闲的推理进程：重新派生补上，其余推理进程不受影响
+        os.kill(pool._workers[0].process.pid, signal.SIGKILL)
+        wait_ready(pool, respawned=1)
+        assert pool.is_ready()
+        assert asyncio.run(collect(pool, "def")) == "def"
+
+        async def crash_running_task():
+            segments = pool.stream("ghi", True)
+            assert await segments.__anext__() == "g"
+            worker = next(w for w in pool._workers if w.job_id is not None)
+            os.kill(worker.process.pid, signal.SIGKILL)
+            try:
+                await segments.__anext__()
+                raise AssertionError("推理进程退出后任务应失败")
+            except RuntimeError as e:
+                assert "推理进程异常退出" in str(e)
+
+        # 杀掉正在执行任务的推理进程：该任务立即失败，不等超时
+        start = time.time()
+        asyncio.run(crash_running_task())
+        assert time.time() - start < 5
+        wait_ready(pool, respawned=2)
+        assert pool.is_ready()
+
+        async def run_many():
+            return await asyncio.gather(*(collect(pool, f"t{index}") for index in range(8)))
+
+        assert asyncio.run(run_many()) == [f"t{index}" for index in range(8)]
+        assert pool.stats()["pending"] == 0
+    finally:
+        pool.close()
+
+
+if __name__ == "__main__":
+    test_respawn_crashed_workers()
+    print("所有预派生推理进程池测试通过!")
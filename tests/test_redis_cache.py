@@ -0,0 +1,142 @@
+import asyncio
+import os
+import time
+
+from oddtts.oddtts_cache import MemoryAudioCache, RedisAudioCache, SynthesisCache
+
+# 设置 REDIS_URL（如 redis://127.0.0.1:6379/15）时使用真实Redis测试，否则使用内存替身
+REDIS_URL = os.environ.get("REDIS_URL")
+
+
+class FakeRedis:
+    """只实现 RedisAudioCache 用到的 redis.asyncio 接口的内存替身"""
+
+    def __init__(self):
+        self.data = {}
+
+    def _alive(self, key):
+        item = self.data.get(key)
+        if item is None:
+            return None
+        value, expires_at = item
+        if expires_at is not None and time.time() > expires_at:
+            del self.data[key]
+            return None
+        return value
+
+    async def get(self, key):
+        return self._alive(key)
+
+    async def mget(self, keys):
+        return [self._alive(key) for key in keys]
+
+    async def set(self, key, value, ex=None, px=None, nx=False):
+        if nx and self._alive(key) is not None:
+            return None
+        if isinstance(value, str):
+            value = value.encode()
+        expires_at = None
+        if ex:
+            expires_at = time.time() + ex
+        elif px:
+            expires_at = time.time() + px / 1000
+        self.data[key] = (value, expires_at)
+        return True
+
+    async def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+    async def eval(self, script, numkeys, *args):
+        # 只支持 RedisAudioCache.RELEASE_LOCK_SCRIPT：令牌一致时删除
+        assert script == RedisAudioCache.RELEASE_LOCK_SCRIPT and numkeys == 1
+        key, token = args
+        if self._alive(key) == token.encode():
+            del self.data[key]
+            return 1
+        return 0
+
+
+def new_client():
+    if REDIS_URL:
+        import redis.asyncio as redis
+        return redis.Redis.from_url(REDIS_URL)
+    return FakeRedis()
+
+
+def new_cache(client, chunk_size=4, lock_ttl=2):
+    remote = RedisAudioCache(client, prefix=f"oddtts:test:{time.time_ns()}:", chunk_size=chunk_size, ttl=60, lock_ttl=lock_ttl)
+    return SynthesisCache(MemoryAudioCache(1024), remote=remote, lock_poll_interval=0.01)
+
+
+def test_chunked_roundtrip():
+    """大音频分块写入Redis后可以完整读回"""
+    async def run():
+        cache = new_cache(new_client())
+        await cache.remote.put("k", b"0123456789")
+        assert await cache.remote.get("k") == b"0123456789"
+        assert await cache.remote.get("missing") is None
+
+    asyncio.run(run())
+
+
+def test_shared_between_nodes():
+    """一个节点写入的结果，另一个节点从Redis层命中"""
+    async def run():
+        client = new_client()
+        node_a = new_cache(client)
+        node_b = SynthesisCache(MemoryAudioCache(1024), remote=node_a.remote)
+        await node_a.put("k", b"audio")
+        assert await node_b.get("k") == b"audio"
+        assert node_b.hits["remote"] == 1
+
+    asyncio.run(run())
+
+
+def test_single_flight_across_nodes():
+    """两个节点同时处理同一未缓存请求时只合成一次"""
+    async def run():
+        client = new_client()
+        node_a = new_cache(client)
+        node_b = SynthesisCache(MemoryAudioCache(1024), remote=node_a.remote, lock_poll_interval=0.01)
+        synthesized = []
+
+        async def handle(node):
+            async with node.single_flight("k") as data:
+                if data is not None:
+                    return data
+                synthesized.append(node)
+                await asyncio.sleep(0.1)
+                await node.put("k", b"audio")
+                return b"audio"
+
+        results = await asyncio.gather(handle(node_a), handle(node_b))
+        assert results == [b"audio", b"audio"]
+        assert len(synthesized) == 1
+
+    asyncio.run(run())
+
+
+def test_release_lock_checks_token():
+    """锁过期后被其他节点取得，原持有者释放时不能删掉别人的锁"""
+    async def run():
+        remote = new_cache(new_client()).remote
+        token = await remote.acquire_lock("k")
+        assert token is not None
+        assert await remote.acquire_lock("k") is None
+
+        await remote.release_lock("k", "other")
+        assert await remote.is_locked("k")
+        await remote.release_lock("k", token)
+        assert not await remote.is_locked("k")
+        assert await remote.acquire_lock("k") is not None
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    test_chunked_roundtrip()
+    test_shared_between_nodes()
+    test_single_flight_across_nodes()
+    test_release_lock_checks_token()
+    print("所有Redis缓存测试通过!")
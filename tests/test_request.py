@@ -0,0 +1,43 @@
+from oddtts.oddtts_request import RequestError, parse_tts_request, parse_openai_speech, parse_batch_items
+
+
+def rejected(parse, *args, **kwargs):
+    try:
+        parse(*args, **kwargs)
+    except RequestError as e:
+        return e.status, str(e)
+    raise AssertionError("请求应被拒绝")
+
+
+def test_parse_tts_request():
+    req = parse_tts_request({"text": "你好", "voice": "v1", "rate": 10, "response_format": "mp3"})
+    assert req.params() == {"text": "你好", "voice": "v1", "rate": 10, "volume": 0, "pitch": 0, "locale": "zh-CN", "response_format": "mp3"}
+    assert req.tts_params().response_format == "mp3"
+
+    assert rejected(parse_tts_request, None) == (400, "请求必须是JSON格式")
+    assert rejected(parse_tts_request, {"voice": "v1"}) == (400, "缺少必需参数: text")
+    assert rejected(parse_tts_request, {"text": "你好"}) == (400, "缺少必需参数: voice")
+    assert rejected(parse_tts_request, {"text": "你好", "voice": "v1", "response_format": "xyz"})[1].startswith("不支持的音频格式: xyz")
+
+    req = parse_tts_request({"text": "你好", "voice": "v1"}, with_transport=True, accept="text/event-stream")
+    assert req.transport == "sse"
+    assert rejected(parse_tts_request, {"text": "你好", "voice": "v1", "transport": "xml"}, with_transport=True)[1].startswith("不支持的传输格式: xml")
+
+
+def test_parse_openai_and_batch():
+    req = parse_openai_speech({"input": "hello", "voice": "v1", "speed": 1.5})
+    assert (req.text, req.rate, req.response_format) == ("hello", 25, "mp3")
+    assert rejected(parse_openai_speech, {"input": "hello", "voice": "v1", "speed": 5}) == (400, "speed参数必须在0.25-4.0之间")
+    assert rejected(parse_openai_speech, {"voice": "v1"}) == (400, "缺少必需参数: input")
+
+    items = parse_batch_items({"voice": "v1", "response_format": "pcm", "items": [{"text": "a"}, {"text": "b", "params": {"voice": "v2"}, "rate": 5}]}, max_items=10)
+    assert [(text, p.voice, p.rate, p.response_format) for text, p in items] == [("a", "v1", 0, "pcm"), ("b", "v2", 5, "pcm")]
+    assert rejected(parse_batch_items, {"items": []}, max_items=10) == (400, "缺少必需参数: items")
+    assert rejected(parse_batch_items, {"items": [{"text": "a"}] * 3}, max_items=2) == (400, "条目数超过上限: 3 > 2")
+    assert rejected(parse_batch_items, {"items": [{"text": "a"}]}, max_items=10) == (400, "第0项缺少必需参数: text/voice")
+
+
+if __name__ == "__main__":
+    test_parse_tts_request()
+    test_parse_openai_and_batch()
+    print("所有请求解析测试通过!")
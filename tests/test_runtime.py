@@ -0,0 +1,39 @@
+import asyncio
+import threading
+
+from oddtts.oddtts_runtime import InferencePool, InferenceBusyError
+
+
+def test_admitted_requests_queue_instead_of_failing():
+    pool = InferencePool(max_workers=1, max_queue=1)
+    release = threading.Event()
+
+    async def run():
+        # 两个已准入的请求占满容量
+        pool.admit()
+        first = asyncio.ensure_future(pool.run(release.wait, admitted=True))
+        pool.admit()
+        second = asyncio.ensure_future(pool.run(release.wait, admitted=True))
+        await asyncio.sleep(0.05)
+        assert pool.is_full()
+
+        # 新请求在准入时被拒绝
+        try:
+            pool.admit()
+            raise AssertionError("队列已满时应拒绝新请求")
+        except InferenceBusyError:
+            pass
+
+        # 已准入请求的后续推理任务照常排队，不会中途失败
+        later = asyncio.ensure_future(pool.run(lambda: "later", admitted=True))
+        release.set()
+        assert await asyncio.gather(first, second, later) == [True, True, "later"]
+        assert pool.stats()["pending"] == 0
+        assert pool.stats()["rejected"] == 1
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    test_admitted_requests_queue_instead_of_failing()
+    print("所有推理线程池测试通过!")
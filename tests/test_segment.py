@@ -0,0 +1,77 @@
+import asyncio
+import time
+
+from oddtts.oddtts_segment import map_in_order, split_sentences
+
+
+def test_split_sentences():
+    text = "今天天气很好。我们去公园吧！好吗？\nHello world. It costs 3.14 dollars! OK"
+    assert split_sentences(text, max_chars=22) == ["今天天气很好。我们去公园吧！好吗？", "Hello world.", "It costs 3.14 dollars!", "OK"]
+    assert split_sentences(text, max_chars=10) == ["今天天气很好。", "我们去公园吧！好吗？", "Hello", "world.", "It costs", "3.14", "dollars!", "OK"]
+
+    # 短句合并到同一段
+    assert split_sentences("你好。再见。", max_chars=100) == ["你好。再见。"]
+
+    # 超长句按逗号再切，没有标点时硬切
+    long_sentence = "一二三四五，六七八九十，" * 3
+    assert all(len(segment) <= 12 for segment in split_sentences(long_sentence, max_chars=12))
+    assert all(len(segment) <= 8 for segment in split_sentences("啊" * 30, max_chars=8))
+
+    assert split_sentences("  \n ", max_chars=10) == []
+
+
+def test_map_in_order():
+    async def work(delay):
+        await asyncio.sleep(delay)
+        return delay
+
+    async def run():
+        delays = [0.2, 0.05, 0.1, 0.05]
+        start = time.time()
+        results = [result async for result in map_in_order(delays, work, concurrency=4)]
+        assert results == delays
+        # 并发执行，总耗时接近最长的一段而不是总和
+        assert time.time() - start < 0.35
+
+    asyncio.run(run())
+
+
+def test_map_in_order_cancel():
+    started = []
+
+    async def work(index):
+        started.append(index)
+        await asyncio.sleep(0.05 if index == 0 else 1)
+        return index
+
+    async def run():
+        abandoned = []
+        results = map_in_order(range(10), work, concurrency=2, on_cancel=abandoned.extend)
+        assert await results.__anext__() == 0
+        await results.aclose()
+        await asyncio.sleep(0.1)
+        # 提前结束时只启动了有限的前瞻任务，其余条目全部计入被放弃的条目
+        assert len(started) <= 3
+        assert abandoned == list(range(1, 10))
+
+        # 消费方在等待结果时被取消，正在等待的条目同样计入
+        abandoned.clear()
+
+        async def consume():
+            async for _ in map_in_order(range(4), work, concurrency=2, on_cancel=abandoned.extend):
+                pass
+
+        task = asyncio.ensure_future(consume())
+        await asyncio.sleep(0.01)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        assert abandoned == [0, 1, 2, 3]
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    test_split_sentences()
+    test_map_in_order()
+    test_map_in_order_cancel()
+    print("所有分句测试通过!")
@@ -0,0 +1,92 @@
+import asyncio
+import json
+
+from oddtts.oddtts_segment import SentenceBuffer
+from oddtts.oddtts_session import SynthesisSession
+
+
+def test_sentence_buffer_incremental():
+    buffer = SentenceBuffer(max_chars=20)
+    tokens = ["你好", "，今天", "天气", "很好。", "我们", "去公园吧", "！", "Pi is 3", ".", "14 ok. ", "Bye"]
+    sentences = []
+    for token in tokens:
+        sentences += buffer.push(token)
+
+    # 句末标点后要收到下一个字符才切出；小数点后跟数字时不切
+    assert sentences == ["你好，今天天气很好。", "我们去公园吧！", "Pi is 3.14 ok."]
+    assert buffer.flush() == ["Bye"]
+    assert buffer.flush() == []
+
+    # 没有标点的长文本超过 max_chars 时提前切出
+    buffer = SentenceBuffer(max_chars=10)
+    assert buffer.push("one two three four five six ") == ["one two", "three four"]
+    assert buffer.push("seven.") == ["five six"]
+    assert buffer.flush() == ["seven."]
+
+
+class Recorder:
+    def __init__(self):
+        self.messages = []
+        self.started = asyncio.Event()
+        self.release = asyncio.Event()
+        self.closed = []
+
+    async def send_json(self, message):
+        self.messages.append(message)
+
+    async def send_bytes(self, data):
+        self.messages.append(data)
+
+    async def synthesize(self, text, tts_params):
+        try:
+            yield f"{tts_params.voice}:{text}".encode("utf-8")
+            if text.startswith("慢"):
+                self.started.set()
+                await self.release.wait()
+            yield b"|"
+        finally:
+            self.closed.append(text)
+
+
+def test_session_flush_and_cancel():
+    async def run():
+        recorder = Recorder()
+        session = SynthesisSession(recorder.synthesize, recorder.send_json, recorder.send_bytes, params={"voice": "v1"})
+
+        await session.handle_message(json.dumps({"type": "text", "text": "第一句。第二"}))
+        await session.handle_message(json.dumps({"type": "config", "voice": "v2"}))
+        await session.handle_message(json.dumps({"type": "text", "text": "句", "flush": True}))
+        while {"type": "flushed"} not in recorder.messages:
+            await asyncio.sleep(0.01)
+        assert recorder.messages[:3] == [{"type": "sentence", "seq": 0, "text": "第一句。"}, "v1:第一句。".encode("utf-8"), b"|"]
+        assert "v2:第二句".encode("utf-8") in recorder.messages
+        assert [m["seq"] for m in recorder.messages if isinstance(m, dict) and m["type"] == "sentence_end"] == [0, 1]
+
+        # 取消时中止正在合成的句子并丢弃排队的句子
+        recorder.messages.clear()
+        await session.handle_message(json.dumps({"type": "text", "text": "慢慢说。", "flush": True}))
+        await session.handle_message(json.dumps({"type": "text", "text": "后面。还有"}))
+        await recorder.started.wait()
+        await session.handle_message(json.dumps({"type": "cancel"}))
+        assert recorder.messages[-1] == {"type": "cancelled"}
+        assert session.cancelled == 2
+        assert "慢慢说。" in recorder.closed and "后面。" not in recorder.closed
+        assert len(session.buffer) == 0
+        assert not any(isinstance(m, dict) and m["type"] == "sentence_end" for m in recorder.messages)
+
+        # 取消后会话继续可用
+        await session.handle_message(json.dumps({"type": "text", "text": "再来", "flush": True}))
+        await session.handle_message("not json")
+        while {"type": "flushed"} not in recorder.messages:
+            await asyncio.sleep(0.01)
+        assert {"type": "error", "error": "消息必须是JSON格式"} in recorder.messages
+        await session.close()
+        assert session.sentences == 3
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    test_sentence_buffer_incremental()
+    test_session_flush_and_cancel()
+    print("所有WebSocket会话测试通过!")
@@ -0,0 +1,157 @@
+import asyncio
+
+from oddtts.oddtts_singleflight import SingleFlight
+
+
+def test_do_coalesces_concurrent_calls():
+    async def run():
+        flight = SingleFlight()
+        calls = []
+
+        async def synthesize():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return b"audio"
+
+        results = await asyncio.gather(*[flight.do("key", synthesize) for _ in range(10)])
+        assert results == [b"audio"] * 10
+        assert len(calls) == 1
+        assert flight.stats() == {"coalesced": 9, "inflight_calls": 0, "inflight_streams": 0}
+
+        # 任务完成后不再合并，相同键重新执行
+        assert await flight.do("key", synthesize) == b"audio"
+        assert len(calls) == 2
+
+    asyncio.run(run())
+
+
+class Producer:
+    def __init__(self, count=5, delay=0.02):
+        self.count = count
+        self.delay = delay
+        self.started = 0
+        self.produced = []
+        self.closed = False
+
+    async def __call__(self):
+        self.started += 1
+        try:
+            for index in range(self.count):
+                await asyncio.sleep(self.delay)
+                chunk = bytes([index]) * 4
+                self.produced.append(chunk)
+                yield chunk
+        finally:
+            self.closed = True
+
+
+async def collect(flight, key, producer, delay=0.0):
+    await asyncio.sleep(delay)
+    return [chunk async for chunk in flight.stream(key, producer)]
+
+
+def test_stream_late_joiner_replays():
+    async def run():
+        flight = SingleFlight()
+        producer = Producer()
+        expected = [bytes([index]) * 4 for index in range(producer.count)]
+
+        # 第二个消费者在生产者已产出部分音频块后加入，仍从第一个音频块开始读取
+        first, late = await asyncio.gather(collect(flight, "key", producer), collect(flight, "key", producer, delay=0.05))
+        assert first == expected and late == expected
+        assert producer.started == 1
+        assert flight.stats()["coalesced"] == 1 and flight.stats()["inflight_streams"] == 0
+
+    asyncio.run(run())
+
+
+def test_stream_cancelled_when_last_consumer_leaves():
+    async def run():
+        flight = SingleFlight()
+        producer = Producer(count=100)
+
+        async def read(count):
+            stream = flight.stream("key", producer)
+            chunks = [await stream.__anext__() for _ in range(count)]
+            await stream.aclose()
+            return chunks
+
+        # 一个消费者离开时生产者继续为另一个消费者合成
+        first = flight.stream("key", producer)
+        await first.__anext__()
+        assert len(await read(2)) == 2
+        await asyncio.sleep(0.05)
+        assert not producer.closed
+
+        # 最后一个消费者离开后生产者被取消，不再合成剩余的音频块
+        await first.aclose()
+        await asyncio.sleep(0.05)
+        assert producer.closed
+        produced = len(producer.produced)
+        await asyncio.sleep(0.1)
+        assert len(producer.produced) == produced < producer.count
+        assert flight.stats()["inflight_streams"] == 0
+
+        # 之后的相同请求重新开始合成
+        assert len(await read(1)) == 1
+        assert producer.started == 2
+
+    asyncio.run(run())
+
+
+def test_stream_replay_limit():
+    async def run():
+        flight = SingleFlight(max_replay_bytes=10)
+        producer = Producer(count=6)
+
+        stream = flight.stream("key", producer)
+        chunks = [await stream.__anext__() for _ in range(4)]
+        shared = flight._streams["key"]
+        # 缓存超过上限后只保留尚未被读取的音频块
+        assert shared.truncated and shared.size <= 10
+
+        # 超过上限后新的相同请求不再加入，各自合成完整音频
+        late = await collect(flight, "key", producer)
+        assert late == [bytes([index]) * 4 for index in range(6)]
+        assert producer.started == 2
+
+        chunks += [chunk async for chunk in stream]
+        assert chunks == late
+
+    asyncio.run(run())
+
+
+def test_stream_waits_for_slowest_consumer():
+    async def run():
+        # 每个音频块 4 字节，生产者最多领先最慢的消费者 8 字节
+        flight = SingleFlight(max_lag_bytes=8)
+        producer = Producer(count=50, delay=0)
+
+        stalled = flight.stream("key", producer)
+        assert await stalled.__anext__() == bytes([0]) * 4
+        fast = asyncio.ensure_future(collect(flight, "key", producer))
+
+        # 一个消费者停止读取后，生产者只领先它两个音频块，其余的消费者也随之等待
+        await asyncio.sleep(0.1)
+        assert len(producer.produced) == 3
+        assert not fast.done()
+        shared = flight._streams["key"]
+        assert shared.size == 12
+
+        # 恢复读取后合成继续，两个消费者都收到完整的音频
+        rest = [chunk async for chunk in stalled]
+        expected = [bytes([index]) * 4 for index in range(producer.count)]
+        assert [bytes([0]) * 4] + rest == expected
+        assert await fast == expected
+        assert producer.started == 1
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    test_do_coalesces_concurrent_calls()
+    test_stream_late_joiner_replays()
+    test_stream_cancelled_when_last_consumer_leaves()
+    test_stream_replay_limit()
+    test_stream_waits_for_slowest_consumer()
+    print("所有请求合并测试通过!")
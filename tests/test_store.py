@@ -0,0 +1,56 @@
+import os
+import tempfile
+import time
+
+from oddtts.oddtts_store import OutputStore
+
+
+def write(store, size, age=0):
+    path = store.new_path("wav")
+    with open(path, "wb") as f:
+        f.write(b"\0" * size)
+    if age:
+        mtime = time.time() - age
+        os.utime(path, (mtime, mtime))
+    return store.file_id(path)
+
+
+def test_eviction_by_age_and_quota():
+    with tempfile.TemporaryDirectory() as directory:
+        store = OutputStore(directory, max_bytes=3000, max_age=60, sweep_interval=3600)
+        expired = write(store, 100, age=120)
+        oldest = write(store, 1000, age=30)
+        middle = write(store, 1000, age=20)
+        newest = write(store, 1000, age=10)
+        extra = write(store, 1000)
+
+        assert store.sweep() == 2
+        assert store.path_of(expired) is None
+        # 超出容量时先删除最旧的
+        assert store.path_of(oldest) is None
+        assert all(store.path_of(file_id) for file_id in (middle, newest, extra))
+
+
+def test_referenced_files_are_kept_until_served():
+    with tempfile.TemporaryDirectory() as directory:
+        store = OutputStore(directory, max_age=60, served_ttl=0, sweep_interval=3600)
+        file_id = write(store, 100, age=120)
+
+        # 发送期间即使已过期也不删除
+        assert store.acquire(file_id) is not None
+        assert store.sweep() == 0
+        store.release(file_id)
+
+        time.sleep(0.01)
+        assert store.sweep() == 1
+        assert store.acquire(file_id) is None
+
+        # 不合法的文件ID不会访问目录以外的文件
+        assert store.path_of("../../etc/passwd") is None
+        assert store.file_id("/etc/passwd") is None
+
+
+if __name__ == "__main__":
+    test_eviction_by_age_and_quota()
+    test_referenced_files_are_kept_until_served()
+    print("所有音频文件存储测试通过!")
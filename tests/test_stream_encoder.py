@@ -0,0 +1,137 @@
+import io
+import subprocess
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+from oddtts.oddtts_encoder import SAMPLE_RATE, StreamEncoder, FFmpegStreamEncoder, create_stream_encoder, float_to_pcm16
+from oddtts.oddtts_ffmpeg import get_ffmpeg_pool
+
+
+def sine(seconds, frequency=440.0):
+    t = np.arange(int(SAMPLE_RATE * seconds)) / SAMPLE_RATE
+    return (0.5 * np.sin(2 * np.pi * frequency * t)).astype(np.float32)
+
+
+# 三个片段模拟逐句合成的流式输出
+SEGMENTS = [sine(0.3), sine(0.5, 660.0), sine(0.2)]
+AUDIO = np.concatenate(SEGMENTS)
+
+requires_ffmpeg = pytest.mark.skipif(not get_ffmpeg_pool().available(), reason="未找到 ffmpeg")
+
+
+def stream_encode(encoder):
+    chunks = [encoder.feed(segment) for segment in SEGMENTS]
+    chunks.append(encoder.close())
+    return b"".join(chunks)
+
+
+def decode_with_ffmpeg(data):
+    '''解码为单声道 16 位 PCM'''
+    result = subprocess.run(
+        [get_ffmpeg_pool().ffmpeg_path, "-hide_banner", "-loglevel", "error", "-i", "pipe:0",
+         "-f", "s16le", "-ac", "1", "-ar", str(SAMPLE_RATE), "pipe:1"],
+        input=data, stdout=subprocess.PIPE, check=True,
+    )
+    return result.stdout
+
+
+def assert_lossless(pcm):
+    # libsndfile 与 float_to_pcm16 的浮点量化方式略有不同，允许 1 的误差
+    decoded = np.frombuffer(pcm, dtype=np.int16).astype(np.int32)
+    expected = np.frombuffer(float_to_pcm16(AUDIO), dtype=np.int16).astype(np.int32)
+    assert decoded.size == expected.size and np.abs(decoded - expected).max() <= 1
+
+
+def assert_duration(frames, tolerance=0.1):
+    # 有损编码器会在首尾补充少量采样（编码器延迟和最后一帧的填充）
+    assert abs(frames - AUDIO.size) <= SAMPLE_RATE * tolerance, (frames, AUDIO.size)
+
+
+def test_stream_encoder_is_abstract():
+    # 未实现 feed 时不能实例化
+    with pytest.raises(TypeError):
+        StreamEncoder()
+
+
+def test_pcm_and_wav():
+    data = stream_encode(create_stream_encoder("pcm", SAMPLE_RATE))
+    assert data == float_to_pcm16(AUDIO)
+
+    # wav 只在首段前输出一次流式WAV头
+    data = stream_encode(create_stream_encoder("wav", SAMPLE_RATE))
+    assert data[:4] == b"RIFF" and data[44:] == float_to_pcm16(AUDIO)
+
+
+def test_flac():
+    data = stream_encode(create_stream_encoder("flac", SAMPLE_RATE))
+    assert data[:4] == b"fLaC"
+    if not get_ffmpeg_pool().available():
+        pytest.skip("未找到 ffmpeg，跳过 flac 解码检查")
+    # 流式输出无法回写总采样数，libsndfile 不能读取，用 ffmpeg 解码；无损格式解码后与直接量化的结果一致
+    assert_lossless(decode_with_ffmpeg(data))
+
+
+def test_ogg_and_opus():
+    for output_format in ("ogg", "opus"):
+        data = stream_encode(create_stream_encoder(output_format, SAMPLE_RATE))
+        assert data[:4] == b"OggS", output_format
+        audio, _ = sf.read(io.BytesIO(data), dtype="float32")
+        assert_duration(audio.shape[0])
+
+
+@requires_ffmpeg
+def test_mp3_per_segment():
+    encoder = create_stream_encoder("mp3", SAMPLE_RATE)
+    chunks = [encoder.feed(segment) for segment in SEGMENTS]
+    chunks.append(encoder.close())
+    # 每个片段送入后就有完整的 MP3 帧输出，不等全部片段结束；开头是帧同步字，不是 Xing/Info 头
+    assert all(chunks[:len(SEGMENTS)])
+    data = b"".join(chunks)
+    assert data[0] == 0xFF and data[1] & 0xE0 == 0xE0
+
+    pcm = np.frombuffer(decode_with_ffmpeg(data), dtype=np.int16) / 32768
+    assert_duration(pcm.size)
+    # 片段之间没有静音或断开：跳过编码器延迟后，每 10ms 窗口的能量都接近正弦波的能量（振幅 0.5 时 RMS 约 0.35）
+    start = int(np.argmax(np.abs(pcm) > 0.05))
+    window = SAMPLE_RATE // 100
+    for offset in range(start, start + AUDIO.size - window, window):
+        rms = np.sqrt(np.mean(pcm[offset:offset + window] ** 2))
+        assert rms > 0.25, (offset, rms)
+
+
+@requires_ffmpeg
+def test_aac():
+    encoder = create_stream_encoder("aac", SAMPLE_RATE)
+    assert isinstance(encoder, FFmpegStreamEncoder)
+    data = stream_encode(encoder)
+    # ADTS 帧同步字
+    assert data[0] == 0xFF and data[1] & 0xF0 == 0xF0
+    assert_duration(len(decode_with_ffmpeg(data)) // 2)
+
+
+@requires_ffmpeg
+def test_ffmpeg_stream_encoder_formats():
+    # libsndfile 无法创建编码器时回退到 ffmpeg，输出同样可以完整解码，开头的音频不丢失
+    for output_format in ("opus", "ogg", "flac"):
+        data = stream_encode(FFmpegStreamEncoder(SAMPLE_RATE, output_format))
+        assert_duration(len(decode_with_ffmpeg(data)) // 2)
+    assert_lossless(decode_with_ffmpeg(stream_encode(FFmpegStreamEncoder(SAMPLE_RATE, "flac"))))
+
+    # 中途放弃时结束 ffmpeg 进程
+    encoder = FFmpegStreamEncoder(SAMPLE_RATE, "aac")
+    encoder.feed(SEGMENTS[0])
+    encoder.abort()
+    assert not encoder._encoder.is_alive()
+
+
+if __name__ == "__main__":
+    test_stream_encoder_is_abstract()
+    test_pcm_and_wav()
+    test_flac()
+    test_ogg_and_opus()
+    test_mp3_per_segment()
+    test_aac()
+    test_ffmpeg_stream_encoder_formats()
+    print("所有流式编码测试通过!")
@@ -2,10 +2,11 @@ import json
 import os
 import uuid
 
-import requests
 import logging
 
-from oddtts.oddtts_params import new_uuid, TTSParams
+from oddtts.oddtts_params import TTSParams
+from oddtts.oddtts_http import HttpClient, get_http_client
+from oddtts.oddtts_store import get_output_store
 
 logger = logging.getLogger(__name__)
 
@@ -106,47 +107,36 @@ bert_vits2_voices = [{ "id": "派蒙_ZH", "name": "派蒙_ZH" },
         
 
 class BertVits2API():
-    def __init__(self):
-        pass
-
-    def request(self, req_params:dict[str,any]) -> str:
+    def __init__(self, api_url: str = url, http: HttpClient = None):
+        self.api_url = api_url
+        # Gradio 服务的文件下载地址与接口同源
+        self.file_url = api_url.rsplit("/run/predict", 1)[0] + "/file="
+        self.http = http or get_http_client()
+
+    async def request(self, req_params:dict[str,any]) -> str:
+        '''
+        调用远端合成接口，返回生成的音频文件下载地址
+        '''
         logger.debug(f"params2={req_params}")
         # 合成语音
         body = json.dumps(req_params, ensure_ascii=False).encode('utf-8')
         logger.debug(f"body={body}")
-        response = requests.post(url, headers=headers, data=body, verify=False)
+        response = await self.http.request_json("POST", self.api_url, headers=headers, data=body, ssl=False)
 
         logger.debug("=======================================")
-        logger.debug(f"response={response.text}")
+        logger.debug(f"response={response}")
         logger.debug("=======================================")
 
-        # voice_result = json.loads(response.text)["data"]
-        # file_path = voice_result[1]["name"]
-
-        # logger.debug(f"body={body}, response={response}, file_path={file_path}, url={file_url + file_path}")
-
-        # # 下载文件
-        # response = requests.get(file_url + file_path, headers=headers, verify=False)
-
-        # 初始化文件夹
-        file_name = new_uuid() + ".wav"
-        # file_path = os.getcwd() + "/tmp/" + file_name
-        # dirPath = os.path.dirname(file_path)
-        # if not os.path.exists(dirPath):
-        #     os.makedirs(dirPath)
-        # if not os.path.exists(file_path):
-        #     # 用open创建文件 兼容mac
-        #     open(file_path, 'a').close()
-
-        # # 写入语音文件
-        # with open(file_path, 'wb') as file:
-        #     file.write(response.content)
-
-        return file_name
+        voice_result = response["data"]
+        file_path = voice_result[1]["name"]
+        logger.debug(f"file_path={file_path}, url={self.file_url + file_path}")
+        return self.file_url + file_path
 
-    def do_synthesis(self, text: str, speaker: str, noise: str, noisew: str, sdp_ratio: str) -> str:
+    def _build_params(self, text: str, tts_params: TTSParams, noise: float = 0.6, noisew: float = 0.9, sdp_ratio: float = 0.5) -> dict:
+        # 语速对应 Gradio 接口的 length（时长缩放），语速越快时长越短
+        length = 1 / max(0.1, 1 + tts_params.rate / 100)
         params = {
-            "data": [text, speaker, sdp_ratio, noise, noisew, 1, "ZH", False, 1, 0.2, None, "Happy", "", 0.7],
+            "data": [text, tts_params.voice, sdp_ratio, noise, noisew, length, "ZH", False, 1, 0.2, None, "Happy", "", 0.7],
             "event_data": None,
             "fn_index": 0,
             "session_hash": str(uuid.uuid4())
@@ -158,35 +148,35 @@ class BertVits2API():
         if isinstance(params_str_values["data"], list):  
             params_str_values["data"] = [str(item) if isinstance(item, (int, float, bool)) else item for item in params_str_values["data"]]  
         logger.debug(f"params={params_str_values}")  
-        return self.request(req_params=params_str_values)  
+        return params_str_values
 
-    def do_synthesis_test(self, text: str, speaker: str, noise: str, noisew: str, sdp_ratio: str) -> str:
-        params = {
-            "data": [text, speaker, sdp_ratio, noise, noisew, 1, "ZH", False, 1, 0.2, None, "Happy", "", 0.7],
-            "event_data": None,
-            "fn_index": 0,
-            "session_hash": str(uuid.uuid4())
-        }
-        logger.debug(f"params={params}")
-        return self.request(req_params=params)
+    async def do_synthesis(self, text: str, tts_params: TTSParams) -> str:
+        '''
+        合成语音，返回音频文件下载地址
+        '''
+        return await self.request(req_params=self._build_params(text, tts_params))
 
     async def get_voices(self) -> list:
         return bert_vits2_voices
 
     async def generate_tts_file(self, text: str, tts_params: TTSParams) -> str:
-        return self.do_synthesis(text, tts_params)
+        audio_url = await self.do_synthesis(text, tts_params)
+        # 流式下载到本地文件，不在内存中缓冲完整音频
+        file_path = get_output_store().new_path("wav")
+        await self.http.download(audio_url, file_path, headers=headers, ssl=False)
+        return file_path
 
     async def generate_tts_bytes(self, text: str, tts_params: TTSParams) -> bytes:
-        return self.do_synthesis(text, tts_params)
+        audio_url = await self.do_synthesis(text, tts_params)
+        return await self.http.request_bytes("GET", audio_url, headers=headers, ssl=False)
 
-    async def generate_tts_stream(self, text: str, tts_params: TTSParams) -> bytes:
-        audio_path = self.do_synthesis(text, tts_params)
-        logger.debug(f"audio_path={audio_path}")
-        with open(audio_path, 'rb') as f:
-            audio_data = f.read()
-        return audio_data
+    async def generate_tts_stream(self, text: str, tts_params: TTSParams):
+        audio_url = await self.do_synthesis(text, tts_params)
+        async for chunk in self.http.stream(audio_url, headers=headers, ssl=False):
+            yield chunk
 
 if __name__ == '__main__':
+    import asyncio
     client = BertVits2API()
-    tts_params = TTSParams(voice="流萤_ZH", rate=1, volume=1, pitch=1)
-    client.do_synthesis(text="晚上好", tts_params=tts_params)
+    tts_params = TTSParams(voice="流萤_ZH", rate=0, volume=0, pitch=0)
+    print(asyncio.run(client.generate_tts_file(text="晚上好", tts_params=tts_params)))
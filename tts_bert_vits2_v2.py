@@ -1,9 +1,10 @@
 import os
-import requests
 import logging
 import yaml
 from uuid import uuid4
 from oddtts.oddtts_params import TTSParams
+from oddtts.oddtts_http import HttpClient, get_http_client
+from oddtts.oddtts_store import get_output_store
 # from plugins.GenshinVoice.pkg.audio_converter import convert_to_silk
 
 logger = logging.getLogger(__name__)
@@ -17,7 +18,9 @@ bert_vits2_voices = [
 ]
 
 class BertVits2V2API:
-    def __init__(self, config = None, character=None):
+    def __init__(self, config = None, character=None, api: str = "https://bv2.firefly.matce.cn", http: HttpClient = None):
+        self.api = api
+        self.http = http or get_http_client()
         if config is None:
             config = {
                 "character": "流萤_ZH",
@@ -40,8 +43,7 @@ class BertVits2V2API:
     async def get_voices(self) -> list:
         return bert_vits2_voices
 
-    def get_audio_url(self, text: str, session_hash):
-        api = "https://bv2.firefly.matce.cn/"
+    async def get_audio_url(self, text: str, session_hash):
         data = {
             "data": [
                 text,
@@ -70,12 +72,12 @@ class BertVits2V2API:
         }
 
         try:
-            resp = requests.post(api + "/run/predict", json=data, headers=headers)
-            response_data = resp.json()["data"]
+            response = await self.http.request_json("POST", self.api + "/run/predict", json=data, headers=headers)
+            response_data = response["data"]
             if response_data[0] == "Success":
                 file_name = response_data[1]["name"]
                 # print(api + f"/file={file_name}")
-                return api + f"/file={file_name}"
+                return self.api + f"/file={file_name}"
         except Exception as e:
             logger.error(f"Error generating audio: {str(e)}")
 
@@ -83,27 +85,29 @@ class BertVits2V2API:
 
     async def download_audio(self, url, save_path):
         try:
-            audio_content = requests.get(url)
-            if audio_content.status_code == 200:
-                with open(save_path, "wb") as f:
-                    f.write(audio_content.content)
-                logger.debug(f"Audio downloaded successfully to {save_path}")
-                return True
+            # 流式写入文件，不在内存中缓冲完整音频
+            await self.http.download(url, save_path)
+            logger.debug(f"Audio downloaded successfully to {save_path}")
+            return True
         except Exception as e:
             logger.error(f"Error downloading audio: {str(e)}")
         return False
 
-    async def generate_audio(self, text):
+    async def _get_audio_url_or_raise(self, text: str) -> str:
         session_hash = str(uuid4()).lower().split("-")[0]
-        audio_url = self.get_audio_url(text, session_hash)
+        audio_url = await self.get_audio_url(text, session_hash)
+        if not audio_url:
+            raise RuntimeError(f"Failed to generate audio. audio_url={audio_url}")
+        return audio_url
 
-        if not os.path.exists("./audio_temp"):
-            os.makedirs("./audio_temp")
+    async def generate_audio(self, text):
+        session_hash = str(uuid4()).lower().split("-")[0]
+        audio_url = await self.get_audio_url(text, session_hash)
 
         if audio_url:
-            save_path = os.path.join(os.getcwd(), "./audio_temp", f"{session_hash}.mp3")
+            save_path = get_output_store().new_path("mp3")
             # print(save_path)
-            success = self.download_audio(audio_url, save_path)
+            success = await self.download_audio(audio_url, save_path)
 
             if success:
                 # silk_path = convert_to_silk(save_path, "./audio_temp")
@@ -118,18 +122,17 @@ class BertVits2V2API:
         return None
     
     async def generate_tts_file(self, text: str, tts_params: TTSParams) -> str:
-        audio_path = self.generate_audio(text)
+        audio_path = await self.generate_audio(text)
         return audio_path
 
-    async def generate_tts_bytes(self, text: str, tts_params: TTSParams) -> str:
-        audio_path = self.generate_audio(text)
-        return audio_path
+    async def generate_tts_bytes(self, text: str, tts_params: TTSParams) -> bytes:
+        audio_url = await self._get_audio_url_or_raise(text)
+        return await self.http.request_bytes("GET", audio_url)
 
-    async def generate_tts_stream(self, text: str, tts_params: TTSParams) -> bytes:
-        audio_path = self.generate_audio(text)
-        with open(audio_path, 'rb') as f:
-            audio_data = f.read()
-        return audio_data
+    async def generate_tts_stream(self, text: str, tts_params: TTSParams):
+        audio_url = await self._get_audio_url_or_raise(text)
+        async for chunk in self.http.stream(audio_url):
+            yield chunk
 
 
 if __name__ == "__main__":
@@ -1,19 +1,60 @@
+import asyncio
 import logging
 import os
 import subprocess
-import tempfile
+import time
 import edge_tts
 
 from oddtts.oddtts_params import new_uuid, TTSParams
+from oddtts.oddtts_runtime import run_blocking
+from oddtts.oddtts_store import get_output_store
+import oddtts.oddtts_config as oddtts_config
 
 logger = logging.getLogger(__name__)
 
+# 音色列表刷新失败后的重试间隔（秒）
+VOICES_RETRY_INTERVAL = 60
+# 写入文件时每次写盘的最小字节数
+FILE_WRITE_SIZE = 64 * 1024
+
 class EdgeTTSAPI():
 
     def __init__(self) -> None:
-        pass
-    
+        # 音色列表缓存：过期后后台刷新，刷新失败时继续使用旧列表
+        self._voices = None
+        self._voices_time = 0
+        self._refresh_task = None
+
     async def get_voices(self) -> list[dict[str, str]]:
+        if self._voices is None:
+            # 首次调用只能等待拉取完成，并发的首次调用共用同一次拉取
+            await asyncio.shield(self._start_refresh())
+        elif time.time() - self._voices_time > oddtts_config.oddtts_cfg.get("edge_voices_ttl", 3600):
+            self._start_refresh()
+        return self._voices
+
+    def _start_refresh(self) -> asyncio.Task:
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.ensure_future(self._refresh_voices())
+        return self._refresh_task
+
+    async def _refresh_voices(self) -> None:
+        start_time = time.time()
+        try:
+            voices = await self._fetch_voices()
+        except Exception as e:
+            if self._voices is None:
+                raise
+            # 一段时间后再重试，避免上游故障期间每个请求都触发刷新
+            self._voices_time = time.time() - oddtts_config.oddtts_cfg.get("edge_voices_ttl", 3600) + VOICES_RETRY_INTERVAL
+            logger.warning(f"[缓存] 刷新EdgeTTS音色列表失败，继续使用旧列表 - 错误信息: {str(e)}")
+            return
+
+        self._voices = voices
+        self._voices_time = time.time()
+        logger.info(f"[缓存] EdgeTTS音色列表已更新 - 数量: {len(voices)}, 耗时: {time.time() - start_time:.3f}秒")
+
+    async def _fetch_voices(self) -> list[dict[str, str]]:
         voice_list = []
         voices = await edge_tts.list_voices()
         for v in voices:
@@ -33,70 +74,65 @@ class EdgeTTSAPI():
 
         return voice_list
     
-    async def generate_tts_file(self, text: str, tts_params: TTSParams) -> list[str]:
-
-        logger.info(f"生成语音文件，参数：locale={tts_params.locale}, voice={tts_params.voice}, rate={tts_params.rate}, volume={tts_params.volume}, pitch={tts_params.pitch}")
-
+    def _communicate(self, text: str, tts_params: TTSParams) -> edge_tts.Communicate:
         # 确保参数格式正确，包含正负符号
         rate_str = f"{tts_params.rate:+d}%"
         volume_str = f"{tts_params.volume:+d}%"
         pitch_str = f"{tts_params.pitch:+d}Hz"
         
-        communicate = edge_tts.Communicate(
+        return edge_tts.Communicate(
             text, 
             tts_params.voice, 
             rate=rate_str, 
             volume=volume_str, 
             pitch=pitch_str
         )
-        
-        # 创建临时文件
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".mp3") as f:
-            output_file = f.name
-        
-        # 生成音频
-        await communicate.save(output_file)
+
+    async def _audio_chunks(self, text: str, tts_params: TTSParams):
+        '''
+        逐块产出音频数据，忽略字幕边界等元数据
+        '''
+        async for chunk in self._communicate(text, tts_params).stream():
+            if chunk["type"] == "audio":
+                yield chunk["data"]
+
+    async def generate_tts_file(self, text: str, tts_params: TTSParams) -> list[str]:
+
+        logger.info(f"生成语音文件，参数：locale={tts_params.locale}, voice={tts_params.voice}, rate={tts_params.rate}, volume={tts_params.volume}, pitch={tts_params.pitch}")
+
+        # 在托管存储中创建文件，音频块边接收边写入，攒够 FILE_WRITE_SIZE 再交给线程池写盘，避免阻塞事件循环
+        output_file = get_output_store().new_path("mp3")
+        f = await run_blocking(open, output_file, "wb")
+        try:
+            pending = []
+            pending_size = 0
+            async for data in self._audio_chunks(text, tts_params):
+                pending.append(data)
+                pending_size += len(data)
+                if pending_size >= FILE_WRITE_SIZE:
+                    await run_blocking(f.write, b"".join(pending))
+                    pending.clear()
+                    pending_size = 0
+            if pending:
+                await run_blocking(f.write, b"".join(pending))
+        except BaseException:
+            f.close()
+            os.remove(output_file)
+            raise
+        await run_blocking(f.close)
 
         return output_file
 
     async def generate_tts_bytes(self, text: str, tts_params: TTSParams) -> bytes:
         logger.info(f"生成语音文件，参数：locale={tts_params.locale}, voice={tts_params.voice}, rate={tts_params.rate}, volume={tts_params.volume}, pitch={tts_params.pitch}")
-        rate_str = f"{tts_params.rate:+d}%"
-        volume_str = f"{tts_params.volume:+d}%"
-        pitch_str = f"{tts_params.pitch:+d}Hz"
-        
-        communicate = edge_tts.Communicate(
-            text, 
-            tts_params.voice, 
-            rate=rate_str, 
-            volume=volume_str, 
-            pitch=pitch_str
-        )
-        
-        # 将音频数据保存到字节流
-        audio_data = b""
-        async for chunk in communicate.stream():
-            if chunk["type"] == "audio":
-                audio_data += chunk["data"]
-        
-        return audio_data
+
+        # 先收集所有音频块，最后一次性拼接；逐块 += 每次都会复制已有数据，耗时随音频长度平方增长
+        chunks = [data async for data in self._audio_chunks(text, tts_params)]
+        return b"".join(chunks)
     
     async def generate_tts_stream(self, text: str, tts_params: TTSParams):
         logger.info(f"生成语音文件，参数：locale={tts_params.locale}, voice={tts_params.voice}, rate={tts_params.rate}, volume={tts_params.volume}, pitch={tts_params.pitch}")
         
-        rate_str = f"{tts_params.rate:+d}%"
-        volume_str = f"{tts_params.volume:+d}%"
-        pitch_str = f"{tts_params.pitch:+d}Hz"
-        
-        communicate = edge_tts.Communicate(
-            text, 
-            tts_params.voice, 
-            rate=rate_str, 
-            volume=volume_str, 
-            pitch=pitch_str
-        )
-        
         # 直接yield音频数据块，而不是收集后返回
-        async for chunk in communicate.stream():
-            if chunk["type"] == "audio":
-                yield chunk["data"]
\ No newline at end of file
+        async for data in self._audio_chunks(text, tts_params):
+            yield data
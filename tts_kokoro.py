@@ -7,6 +7,7 @@ import asyncio
 import io
 import time
 import sys
+import threading
 
 from kokoro import KPipeline
 import soundfile as sf
@@ -15,7 +16,12 @@ import torch
 
 from oddtts.oddtts_params import convert_audio_to_format
 from oddtts.oddtts_params import convert_audio_format
+from oddtts.oddtts_encoder import create_stream_encoder
 from oddtts.oddtts_params import TTSParams
+from oddtts.oddtts_runtime import call_timed, get_cancellation_stats, get_inference_pool, run_blocking, run_inference
+from oddtts.oddtts_segment import map_in_order, split_sentences
+from oddtts.oddtts_g2p import CachedG2P, create_phoneme_cache
+import oddtts.oddtts_config as oddtts_config
 
 logger = logging.getLogger(__name__)
 
@@ -31,10 +37,15 @@ Kokoro_voices = {
 }
 
 class KokoroAPI():
+    # 流式输出由流式编码器按请求格式编码，合成缓存可以收录
+    stream_encoded = True
 
     def __init__(self) -> None:
         self.pipeline = None
-        pass
+        # 管道在线程池中创建，并发的首批请求只创建一次
+        self._pipeline_lock = threading.Lock()
+        # G2P 结果缓存
+        self.phoneme_cache = create_phoneme_cache(oddtts_config.oddtts_cfg)
     
     async def get_voices(self) -> list[dict[str, str]]:
         return list(Kokoro_voices.values())
@@ -59,22 +70,64 @@ class KokoroAPI():
 
         return rate_, volume_, pitch_, lang_
 
+    def preload(self) -> None:
+        """
+        启动时创建管道，管道会加载模型
+        """
+        with self._pipeline_lock:
+            if self.pipeline is None:
+                start_time = time.time()
+                pipeline = KPipeline(lang_code='z')
+                pipeline.g2p = CachedG2P(pipeline.g2p, self.phoneme_cache, "zh")
+                self.pipeline = pipeline
+                logger.info(f"加载管道耗时：{time.time() - start_time}秒")
+
+    def is_busy(self) -> bool:
+        return get_inference_pool().is_full()
+
+    def g2p_cache_stats(self) -> dict:
+        return self.phoneme_cache.stats()
+
     async def _load_pipeline(self, lang_:str, tts_params: TTSParams) -> None:
         """
-        加载管道
+        加载管道，创建管道会加载模型，在线程池中执行
         """
         if self.pipeline is None:
-            start_time = time.time()
-            self.pipeline = KPipeline(lang_code='z')
-            logger.info(f"加载管道耗时：{time.time() - start_time}秒")
+            await run_blocking(self.preload)
 
-    async def _generate_audio(self, text: str, tts_params: TTSParams) -> np.ndarray:
+    async def _synthesize_sentence(self, sentence: str, voice: str, speed: float) -> np.ndarray:
+        """
+        合成一个句段，返回完整音频
         """
-        生成语音
+        generator = self.pipeline(sentence, voice=voice, speed=speed, split_pattern=r'\n+')
+        segments = []
+        inference_seconds = 0.0
+        while True:
+            # 每段推理都是阻塞调用，提交到有界推理线程池执行，避免阻塞事件循环
+            result, seconds = await run_inference(call_timed, next, generator, None, admitted=True)
+            inference_seconds += seconds
+            if result is None:
+                break
+            # result.audio 是 KModel.Output.audio 的快捷访问，类型为 tensor
+            if result.audio is not None:
+                segments.append(result.audio.detach().cpu().numpy())
+        # 推理耗时（不含排队）用于估算取消时节省的时间
+        get_cancellation_stats().observe(len(sentence), inference_seconds)
+
+        if not segments:
+            return np.zeros(0, dtype=np.float32)
+        return np.concatenate(segments)
+
+    async def _generate_segments(self, text: str, tts_params: TTSParams):
+        """
+        逐句生成语音：文本先按标点切成句段，多个句段并发合成，按原文顺序产出，句段之间插入静音
         """
         logger.info(f"生成语音，参数：locale={tts_params.locale}, voice={tts_params.voice}, rate={tts_params.rate}, volume={tts_params.volume}, pitch={tts_params.pitch}")
         rate_, volume_, pitch_, lang_ = self._params_adjustments(tts_params)
 
+        # 准入检查只在请求开始时做一次，之后的句段推理只排队，不会在返回部分音频后被拒绝
+        get_inference_pool().admit()
+
         start_time = time.time()
 
         # 生成语音
@@ -83,24 +136,46 @@ class KokoroAPI():
 
         # 生成音频数据
         await self._load_pipeline(lang_, tts_params)
-        
+
+        cfg = oddtts_config.oddtts_cfg
+        sentences = split_sentences(text, cfg.get("segment_max_chars", 100))
+        # 默认只占用一半推理线程，其余留给并发的其他请求
+        concurrency = cfg.get("segment_concurrency", 0) or max(1, get_inference_pool().max_workers // 2)
+        silence = np.zeros(24000 * cfg.get("segment_silence_ms", 0) // 1000, dtype=np.float32)
+
         start_time_generate = time.time()
-        generator = self.pipeline(text, voice=tts_params.voice, speed=rate_, split_pattern=r'\n+')
 
-        # 获取生成结果 (这是一个 KPipeline.Result 对象)
-        result = next(generator)
+        async def synthesize(sentence: str) -> np.ndarray:
+            return await self._synthesize_sentence(sentence, tts_params.voice, rate_)
 
-        logger.info(f"文本长度：{len(text)}，生成语音耗时：{time.time() - start_time_generate}秒，总耗时：{time.time() - start_time}秒")
+        segment_count = 0
+        # 客户端断开时取消尚未合成的句段，并计入节省的推理时间
+        results = map_in_order(sentences, synthesize, concurrency, on_cancel=get_cancellation_stats().record_segments)
+        try:
+            async for audio in results:
+                if audio.size == 0:
+                    continue
 
-        # 1. 访问 result.output.audio 获取 tensor
-        # 根据日志: result.output 是 KModel.Output 对象，里面有个 audio 属性是 tensor
-        audio_tensor = result.output.audio
+                if segment_count == 0:
+                    logger.info(f"首段语音生成耗时：{time.time() - start_time_generate}秒")
+                elif silence.size:
+                    yield silence
+                segment_count += 1
+                yield audio
+        finally:
+            await results.aclose()
 
-        # 2. 将 PyTorch Tensor 转换为 NumPy 数组
-        # .detach() 移除梯度追踪，.cpu() 确保在CPU内存中，.numpy() 转为 numpy
-        audio_numpy = audio_tensor.detach().cpu().numpy()
+        logger.info(f"文本长度：{len(text)}，片段数：{segment_count}，生成语音耗时：{time.time() - start_time_generate}秒，总耗时：{time.time() - start_time}秒")
 
-        return audio_numpy
+    async def _generate_audio(self, text: str, tts_params: TTSParams) -> np.ndarray:
+        """
+        生成语音，拼接所有片段
+        """
+        segments = [segment async for segment in self._generate_segments(text, tts_params)]
+        if not segments:
+            raise RuntimeError("语音生成失败：管道未产出任何音频")
+
+        return np.concatenate(segments)
 
     async def generate_tts_file(self, text: str, tts_params: TTSParams) -> list[str]:
         logger.info(f"生成语音文件，参数：locale={tts_params.locale}, voice={tts_params.voice}, rate={tts_params.rate}, volume={tts_params.volume}, pitch={tts_params.pitch}")
@@ -118,7 +193,8 @@ class KokoroAPI():
 
         # 5. 根据输出格式生成文件
         output_format = tts_params.response_format if hasattr(tts_params, 'response_format') else 'wav'
-        output_file = convert_audio_to_format(audio_numpy, sample_rate, output_format)
+        # 编码和写文件都是阻塞调用，交给线程池执行，不阻塞共享事件循环上的其他请求
+        output_file = await run_blocking(convert_audio_to_format, audio_numpy, sample_rate, output_format)
 
         return output_file
 
@@ -129,7 +205,8 @@ class KokoroAPI():
         
         output_format = tts_params.response_format if hasattr(tts_params, 'response_format') else 'wav'
                 
-        return convert_audio_format(
+        return await run_blocking(
+            convert_audio_format,
             input_data=audio_numpy,
             input_type="numpy",
             output_format=output_format,
@@ -141,19 +218,24 @@ class KokoroAPI():
 
         logger.info(f"生成语音流，参数：locale={tts_params.locale}, voice={tts_params.voice}, rate={tts_params.rate}, volume={tts_params.volume}, pitch={tts_params.pitch}")
 
-        audio_numpy = await self._generate_audio(text, tts_params)
-        
         output_format = tts_params.response_format if hasattr(tts_params, 'response_format') else 'wav'
-                
-        audio_data = convert_audio_format(
-            input_data=audio_numpy,
-            input_type="numpy",
-            output_format=output_format,
-            output_type="bytes",
-            sample_rate=24000
-        )
-        
-        yield audio_data
+
+        # 同一个编码器连续编码所有片段，每个片段编码后立即输出
+        encoder = create_stream_encoder(output_format, 24000)
+        segments = self._generate_segments(text, tts_params)
+        try:
+            async for segment in segments:
+                chunk = await run_blocking(encoder.feed, segment)
+                if chunk:
+                    yield chunk
+            chunk = await run_blocking(encoder.close)
+        except BaseException:
+            encoder.abort()
+            # 客户端断开时立即关闭句段生成器，取消尚未完成的句段推理
+            await segments.aclose()
+            raise
+        if chunk:
+            yield chunk
 
 
 def test_kokoro():
@@ -8,6 +8,8 @@ import io
 import time
 import json
 import sys
+import threading
+from collections import OrderedDict
 
 from kokoro import KPipeline, KModel
 import soundfile as sf
@@ -17,7 +19,13 @@ from huggingface_hub import snapshot_download, try_to_load_from_cache
 
 from oddtts.oddtts_params import convert_audio_to_format
 from oddtts.oddtts_params import convert_audio_format
+from oddtts.oddtts_encoder import create_stream_encoder
 from oddtts.oddtts_params import TTSParams
+from oddtts.oddtts_runtime import call_timed, get_cancellation_stats, get_inference_pool, run_blocking, run_inference
+from oddtts.oddtts_segment import map_in_order, split_sentences
+from oddtts.oddtts_prefork import PreforkInferencePool
+from oddtts.oddtts_g2p import CachedG2P, create_phoneme_cache
+import oddtts.oddtts_config as oddtts_config
 
 logger = logging.getLogger(__name__)
 
@@ -32,7 +40,72 @@ KokoroV11_voices = {
     'Kokoro Voice (zh-CN, zm_012)': {'name': 'zm_012', 'gender': 'Male', 'locale': 'zh-CN', 'short_name': 'zm_012'},
 }
 
+class VoiceTensorCache:
+    '''
+    音色张量缓存
+
+    每个音色在首次使用时从 voices/{voice}.pt 加载，按张量占用的字节数做 LRU 淘汰，
+    不同音色的请求各自拿到自己的张量
+    '''
+
+    def __init__(self, loader, max_bytes: int) -> None:
+        self.loader = loader
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.loads = 0
+        self.hits = 0
+        self._tensors: OrderedDict[str, torch.Tensor] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _nbytes(tensor) -> int:
+        return tensor.element_size() * tensor.nelement()
+
+    def get(self, voice: str):
+        with self._lock:
+            tensor = self._tensors.get(voice)
+            if tensor is not None:
+                self._tensors.move_to_end(voice)
+                self.hits += 1
+                return tensor
+
+        # 在锁外读取文件，加载一个音色时不阻塞其他音色的请求
+        start_time = time.time()
+        tensor = self.loader(voice)
+        self.loads += 1
+        logger.info(f"[响应] 加载音色完成 - 音色: {voice}, 耗时: {time.time() - start_time:.3f}秒")
+        self.put(voice, tensor)
+        return tensor
+
+    def put(self, voice: str, tensor) -> None:
+        with self._lock:
+            if voice in self._tensors:
+                self.size -= self._nbytes(self._tensors.pop(voice))
+            self._tensors[voice] = tensor
+            self.size += self._nbytes(tensor)
+            # 至少保留当前音色，避免容量过小时刚加载就被淘汰
+            while self.size > self.max_bytes and len(self._tensors) > 1:
+                evicted, evicted_tensor = self._tensors.popitem(last=False)
+                self.size -= self._nbytes(evicted_tensor)
+                logger.info(f"[响应] 淘汰音色张量 - 音色: {evicted}")
+
+    def values(self):
+        with self._lock:
+            return list(self._tensors.values())
+
+    def stats(self) -> dict:
+        return {
+            "voices": len(self._tensors),
+            "bytes": self.size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "loads": self.loads,
+        }
+
+
 class KokoroAPIV11():
+    # 流式输出由流式编码器按请求格式编码，合成缓存可以收录
+    stream_encoded = True
 
     def __init__(self) -> None:
         self.model = None
@@ -40,13 +113,20 @@ class KokoroAPIV11():
         self.local_model_dir = "ckpts"
         self.local_model_name = "kokoro-v1_1-zh.pth"
         self.default_text = "关注我的公众号：奥德元，一起学习 AI，一起追赶时代。Good good study, day day up."
-        # 中文音色张量
+        # 中文管道，音色张量按请求从缓存中取
         self.pipeline = None
-        self.voice_tensor_cn = None
+        self.voice_tensors = VoiceTensorCache(
+            self._load_voice_tensor_cn,
+            oddtts_config.oddtts_cfg.get("voice_cache_max_bytes", 64 * 1024 * 1024),
+        )
         # 中英混合-英文管道
         self.pipeline_en = None
         self.voice_en = "af_maple"
         self.voice_tensor_en = None
+        # 预派生推理进程池
+        self.process_pool = None
+        # G2P 结果缓存和自定义发音词典，中文管道和 en_callable 共用
+        self.phoneme_cache = create_phoneme_cache(oddtts_config.oddtts_cfg)
     
     async def get_voices(self) -> list[dict[str, str]]:
         return list(KokoroV11_voices.values())
@@ -71,7 +151,7 @@ class KokoroAPIV11():
 
         return rate_, volume_, pitch_, lang_
 
-    async def _load_model(self, repo_id: str, local_dir: str, device: str = 'cpu') -> None:
+    def _load_model_sync(self, repo_id: str, local_dir: str, device: str = 'cpu') -> None:
         '''
         加载模型，如果模型不存在则自动从 HuggingFace 下载
         '''
@@ -101,11 +181,22 @@ class KokoroAPIV11():
             logger.info(f"[响应] 模型已加载，无需重新加载")
             self.model.to(device).eval()
 
-    async def _load_pipeline_en(self) -> None:
+    async def _load_model(self, repo_id: str, local_dir: str, device: str = 'cpu') -> None:
+        await run_blocking(self._load_model_sync, repo_id, local_dir, device)
+
+    def _load_voice_tensor(self, voice: str):
+        return torch.load(f'{self.local_model_dir}/voices/{voice}.pt', weights_only=True)
+
+    def _load_voice_tensor_cn(self, voice: str):
+        if voice not in [v['name'] for v in KokoroV11_voices.values()]:
+            raise ValueError(f"不支持的音色: {voice}")
+        return self._load_voice_tensor(voice)
+
+    def _load_pipeline_en_sync(self) -> None:
         if self.voice_tensor_en is None:
             logger.info(f"[响应] 加载管道: 开始加载英文音色...")
             start_time = time.time()
-            self.voice_tensor_en = torch.load(f'{self.local_model_dir}/voices/{self.voice_en}.pt', weights_only=True)
+            self.voice_tensor_en = self._load_voice_tensor(self.voice_en)
             logger.info(f"[响应] 加载英文音色完成 - 耗时: {time.time() - start_time:.3f}秒")
 
         if self.pipeline_en is None:
@@ -116,75 +207,222 @@ class KokoroAPIV11():
             self.pipeline_en = KPipeline(lang_code='a', repo_id=self.local_repo_id, model=False)
             logger.info(f"[响应] 创建英文管道完成 - 耗时: {time.time() - start_time:.3f}秒")
 
+    async def _load_pipeline_en(self) -> None:
+        await run_blocking(self._load_pipeline_en_sync)
 
-    def en_callable(self, text):
-        # 可以为特定单词定制发音
-        if text == 'Kokoro':
-            return 'kˈOkəɹO'
 
-        # 默认使用英文管道和英文音色来处理
+    def _en_g2p(self, text):
+        # 使用英文管道和英文音色来处理
         return next(self.pipeline_en(text, voice=self.voice_tensor_en)).phonemes
 
+    def en_callable(self, text):
+        # 自定义发音词典优先，其次是缓存，都未命中时才调用英文管道
+        return self.phoneme_cache.lookup("en", text, self._en_g2p)
+
 
-    async def _load_pipeline(self, tts_params: TTSParams) -> None:
+    def _load_pipeline_sync(self) -> None:
         '''
         加载管道
         '''
         if self.pipeline is None:
-            start_time = time.time()
-
-            # 加载一个中文音色和一个英文音色
-            logger.info(f"[响应] 加载管道: 开始加载权重...")
-            self.voice_tensor_cn = torch.load(f'{self.local_model_dir}/voices/{tts_params.voice}.pt', weights_only=True)
-            logger.info(f"[响应] 加载中文音色完成 - 耗时: {time.time() - start_time:.3f}秒")
-
-            # 创建中文管道，并传入 en_callable
+            # 创建中文管道，并传入 en_callable；音色不绑定在管道上，每次调用时传入
             logger.info(f"[响应] 加载管道: 开始创建中文管道...")
             start_time_pipeline = time.time()
             self.pipeline = KPipeline(lang_code='z', repo_id=self.local_repo_id, model=self.model, en_callable=self.en_callable)
+            self.pipeline.g2p = CachedG2P(self.pipeline.g2p, self.phoneme_cache, "zh")
             logger.info(f"[响应] 管道加载完成 - 耗时: {time.time() - start_time_pipeline:.3f}秒")
 
+    async def _load_pipeline(self) -> None:
+        await run_blocking(self._load_pipeline_sync)
 
-    async def _generate_audio(self, text: str, tts_params: TTSParams) -> np.ndarray:
+    def preload_voices(self) -> None:
+        '''
+        预加载全部音色张量，超出缓存容量的部分会按 LRU 淘汰
+        '''
+        start_time = time.time()
+        for v in KokoroV11_voices.values():
+            self.voice_tensors.get(v['name'])
+        logger.info(f"[响应] 预加载音色完成 - 音色数: {len(KokoroV11_voices)}, 耗时: {time.time() - start_time:.3f}秒")
+
+    def preload(self) -> None:
+        '''
+        启动时加载模型、中英文管道和音色张量
+        '''
+        self._load_model_sync(repo_id=self.local_repo_id, local_dir=self.local_model_dir)
+        self._load_pipeline_en_sync()
+        self._load_pipeline_sync()
+        if oddtts_config.oddtts_cfg.get("voice_preload", False):
+            self.preload_voices()
+
+    def is_ready(self) -> bool:
+        return self.process_pool is None or self.process_pool.is_ready()
+
+    def _active_pool(self):
+        '''当前使用的推理池：启用预派生时为推理进程池，否则为推理线程池'''
+        return self.process_pool if self.process_pool is not None else get_inference_pool()
+
+    def is_busy(self) -> bool:
+        return self._active_pool().is_full()
+
+    def inference_workers(self) -> int:
+        if self.process_pool is not None:
+            return self.process_pool.num_processes
+        return get_inference_pool().max_workers
+
+    def g2p_cache_stats(self) -> dict:
+        return self.phoneme_cache.stats()
+
+    def _init_inference_process(self, num_threads: int) -> None:
+        # 多个推理进程共享CPU，限制每个进程的 torch 线程数，避免互相争抢
+        torch.set_num_threads(num_threads)
+
+        # 每个推理进程各自预热，主进程在 fork 前不能执行推理
+        voice = next(iter(KokoroV11_voices.values()))['name']
+        try:
+            for text in oddtts_config.oddtts_cfg.get("warmup_texts", []):
+                for _ in self._synthesize_sync(text, voice, 1.0):
+                    pass
+        except Exception as e:
+            logger.warning(f"[系统] 推理进程预热失败 - 错误信息: {str(e)}")
+
+    def _synthesize_sync(self, text: str, voice: str, speed: float):
+        '''
+        在推理进程中逐段生成语音
+        '''
+        voice_tensor = self.voice_tensors.get(voice)
+        for result in self.pipeline(text, voice=voice_tensor, speed=speed, split_pattern=r'\n+'):
+            if result.audio is not None:
+                yield result.audio.detach().cpu().numpy()
+
+    def start_inference_processes(self, num_processes: int) -> None:
+        '''
+        预派生推理进程：主进程加载一次模型、管道和全部音色张量，
+        移入共享内存后再 fork，各推理进程共用同一份权重
+        '''
+        start_time = time.time()
+        self.preload()
+        self.preload_voices()
+
+        self.model.share_memory()
+        self.voice_tensor_en.share_memory_()
+        voice_tensors = self.voice_tensors.values()
+        for voice_tensor in voice_tensors:
+            voice_tensor.share_memory_()
+        logger.info(f"[响应] 预派生前加载完成 - 音色数: {len(voice_tensors)}, 耗时: {time.time() - start_time:.3f}秒")
+
+        self.process_pool = PreforkInferencePool(
+            self._synthesize_sync,
+            num_processes,
+            init_worker=self._init_inference_process,
+            max_queue=oddtts_config.oddtts_cfg.get("inference_queue_size", 32),
+            timeout=oddtts_config.oddtts_cfg.get("inference_timeout", 60) or None,
+        )
+        self.process_pool.start()
+
+
+    def _segment_concurrency(self) -> int:
+        """
+        同时合成的句段数，0 表示推理线程数/进程数的一半，其余留给并发的其他请求，避免一个长文本占满推理容量
+        """
+        concurrency = oddtts_config.oddtts_cfg.get("segment_concurrency", 0)
+        if concurrency > 0:
+            return concurrency
+        return max(1, self.inference_workers() // 2)
+
+    async def _synthesize_sentence(self, sentence: str, voice: str, voice_tensor, speed: float) -> np.ndarray:
+        """
+        合成一个句段，返回完整音频
+        """
+        # 预派生模式：交给推理进程执行，主进程只负责收集片段
+        # 推理耗时（不含排队）用于估算取消时节省的时间
+        cancellation_stats = get_cancellation_stats()
+        if self.process_pool is not None:
+            on_done = lambda seconds: cancellation_stats.observe(len(sentence), seconds)
+            segments = [segment async for segment in self.process_pool.stream(sentence, voice, speed, on_done=on_done, admitted=True)]
+        else:
+            generator = self.pipeline(sentence, voice=voice_tensor, speed=speed, split_pattern=r'\n+')
+            segments = []
+            inference_seconds = 0.0
+            while True:
+                # 每段推理都是阻塞调用，提交到有界推理线程池执行，避免阻塞事件循环
+                result, seconds = await run_inference(call_timed, next, generator, None, admitted=True)
+                inference_seconds += seconds
+                if result is None:
+                    break
+                # result.audio 是 KModel.Output.audio 的快捷访问，类型为 tensor
+                if result.audio is not None:
+                    segments.append(result.audio.detach().cpu().numpy())
+            cancellation_stats.observe(len(sentence), inference_seconds)
+
+        if not segments:
+            return np.zeros(0, dtype=np.float32)
+        return np.concatenate(segments)
+
+    async def _generate_segments(self, text: str, tts_params: TTSParams):
         """
-        生成语音
+        逐句生成语音：文本先按标点切成句段，多个句段并发合成，按原文顺序产出，句段之间插入静音
         """
         logger.info(f"生成语音，参数：locale={tts_params.locale}, voice={tts_params.voice}, rate={tts_params.rate}, volume={tts_params.volume}, pitch={tts_params.pitch}")
         rate_, volume_, pitch_, lang_ = self._params_adjustments(tts_params)
 
+        # 准入检查只在请求开始时做一次，之后的句段推理只排队，不会在返回部分音频后被拒绝
+        self._active_pool().admit()
+
         start_time = time.time()
+        voice_tensor = None
+        if self.process_pool is None:
+            # load model
+            await self._load_model(repo_id=self.local_repo_id, local_dir=self.local_model_dir)
 
-        # load model
-        await self._load_model(repo_id=self.local_repo_id, local_dir=self.local_model_dir)
+            # load pipeline_en
+            await self._load_pipeline_en()
 
-        # load pipeline_en
-        await self._load_pipeline_en()
+            # load pipeline
+            await self._load_pipeline()
+
+            # load voice tensor
+            voice_tensor = await run_blocking(self.voice_tensors.get, tts_params.voice)
+
+        cfg = oddtts_config.oddtts_cfg
+        sentences = split_sentences(text, cfg.get("segment_max_chars", 100))
+        concurrency = self._segment_concurrency()
+        silence = np.zeros(24000 * cfg.get("segment_silence_ms", 0) // 1000, dtype=np.float32)
 
-        # load pipeline
-        await self._load_pipeline(tts_params)
-        
         # 生成语音
-        logger.info(f"开始生成语音...")
+        logger.info(f"开始生成语音 - 句段数: {len(sentences)}, 并发数: {concurrency}")
         start_time_pipeline = time.time()
-        # 调用管道生成语音
-        # 注意：这里假设管道的参数是 text, voice, speed, split_pattern
-        # generator = self.pipeline(text, voice=tts_params.voice, speed=rate_, split_pattern=r'\n+')
-        generator = self.pipeline(text, voice=self.voice_tensor_cn, speed=rate_, split_pattern=r'\n+')
 
-        # 获取生成结果 (这是一个 KPipeline.Result 对象)
-        result = next(generator)
+        async def synthesize(sentence: str) -> np.ndarray:
+            return await self._synthesize_sentence(sentence, tts_params.voice, voice_tensor, rate_)
 
-        logger.info(f"文本长度：{len(text)}，生成语音耗时：{time.time() - start_time_pipeline:.3f}秒, 总耗时：{time.time() - start_time:.3f}秒")
+        segment_count = 0
+        # 客户端断开时取消尚未合成的句段，并计入节省的推理时间
+        results = map_in_order(sentences, synthesize, concurrency, on_cancel=get_cancellation_stats().record_segments)
+        try:
+            async for audio in results:
+                if audio.size == 0:
+                    continue
 
-        # 1. 访问 result.output.audio 获取 tensor
-        # 根据日志: result.output 是 KModel.Output 对象，里面有个 audio 属性是 tensor
-        audio_tensor = result.output.audio
+                if segment_count == 0:
+                    logger.info(f"首段语音生成耗时：{time.time() - start_time_pipeline:.3f}秒")
+                elif silence.size:
+                    yield silence
+                segment_count += 1
+                yield audio
+        finally:
+            await results.aclose()
 
-        # 2. 将 PyTorch Tensor 转换为 NumPy 数组
-        # .detach() 移除梯度追踪，.cpu() 确保在CPU内存中，.numpy() 转为 numpy
-        audio_numpy = audio_tensor.detach().cpu().numpy()
+        logger.info(f"文本长度：{len(text)}，片段数：{segment_count}，生成语音耗时：{time.time() - start_time_pipeline:.3f}秒, 总耗时：{time.time() - start_time:.3f}秒")
 
-        return audio_numpy
+    async def _generate_audio(self, text: str, tts_params: TTSParams) -> np.ndarray:
+        """
+        生成语音，拼接所有片段
+        """
+        segments = [segment async for segment in self._generate_segments(text, tts_params)]
+        if not segments:
+            raise RuntimeError("语音生成失败：管道未产出任何音频")
+
+        return np.concatenate(segments)
 
     async def generate_tts_file(self, text: str, tts_params: TTSParams) -> list[str]:
         logger.info(f"生成语音文件，参数：locale={tts_params.locale}, voice={tts_params.voice}, rate={tts_params.rate}, volume={tts_params.volume}, pitch={tts_params.pitch}")
@@ -202,7 +440,8 @@ class KokoroAPIV11():
 
         # 5. 根据输出格式生成文件
         output_format = tts_params.response_format if hasattr(tts_params, 'response_format') else 'wav'
-        output_file = convert_audio_to_format(audio_numpy, sample_rate, output_format)
+        # 编码和写文件都是阻塞调用，交给线程池执行，不阻塞共享事件循环上的其他请求
+        output_file = await run_blocking(convert_audio_to_format, audio_numpy, sample_rate, output_format)
 
         return output_file
 
@@ -213,7 +452,8 @@ class KokoroAPIV11():
         
         output_format = tts_params.response_format if hasattr(tts_params, 'response_format') else 'wav'
                 
-        return convert_audio_format(
+        return await run_blocking(
+            convert_audio_format,
             input_data=audio_numpy,
             input_type="numpy",
             output_format=output_format,
@@ -225,19 +465,24 @@ class KokoroAPIV11():
 
         logger.info(f"生成语音流，参数：locale={tts_params.locale}, voice={tts_params.voice}, rate={tts_params.rate}, volume={tts_params.volume}, pitch={tts_params.pitch}")
 
-        audio_numpy = await self._generate_audio(text, tts_params)
-        
         output_format = tts_params.response_format if hasattr(tts_params, 'response_format') else 'wav'
 
-        audio_data = convert_audio_format(
-            input_data=audio_numpy,
-            input_type="numpy",
-            output_format=output_format,
-            output_type="bytes",
-            sample_rate=24000
-        )
-        
-        yield audio_data
+        # 同一个编码器连续编码所有片段，每个片段编码后立即输出
+        encoder = create_stream_encoder(output_format, 24000)
+        segments = self._generate_segments(text, tts_params)
+        try:
+            async for segment in segments:
+                chunk = await run_blocking(encoder.feed, segment)
+                if chunk:
+                    yield chunk
+            chunk = await run_blocking(encoder.close)
+        except BaseException:
+            encoder.abort()
+            # 客户端断开时立即关闭句段生成器，取消尚未完成的句段推理
+            await segments.aclose()
+            raise
+        if chunk:
+            yield chunk
 
 
 def test_kokoro():
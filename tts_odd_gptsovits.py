@@ -1,7 +1,6 @@
 import logging
 import os
 import subprocess
-import tempfile
 import uuid
 import asyncio
 
@@ -10,7 +9,9 @@ import soundfile as sf
 import numpy as np
 import torch
 
-from oddtts.oddtts_params import new_uuid, TTSParams
+from oddtts.oddtts_params import TTSParams
+from oddtts.oddtts_encoder import encode_audio, encode_audio_to_file
+from oddtts.oddtts_runtime import run_blocking
 
 logger = logging.getLogger(__name__)
 
@@ -37,13 +38,14 @@ class OddGptSovitsAPI():
             text = "关注我的公众号：奥德元，一起学习 AI，一起追赶时代。"
 
         # 生成音频数据
+        # 创建管道和推理都是阻塞调用，交给线程池执行
         if self.pipeline is None:
-            self.pipeline = KPipeline(lang_code=lang_)
+            self.pipeline = await run_blocking(KPipeline, lang_code=lang_)
         
         generator = self.pipeline(text, voice=voice, speed=rate_, split_pattern=r'\n+')
 
         # 获取生成结果 (这是一个 KPipeline.Result 对象)
-        result = next(generator)
+        result = await run_blocking(next, generator)
 
         # 1. 访问 result.output.audio 获取 tensor
         # 根据日志: result.output 是 KModel.Output 对象，里面有个 audio 属性是 tensor
@@ -60,19 +62,13 @@ class OddGptSovitsAPI():
     
     async def generate_tts_file(self, text: str, tts_params: TTSParams) -> str:
         audio_numpy = await self._generate_audio(text, tts_params)
-        audio_path = sf.write(tempfile.gettempdir() + '/' + new_uuid() + '.wav', audio_numpy, 22050)[0]
-        return audio_path
+        # 写入托管存储目录
+        return await run_blocking(encode_audio_to_file, audio_numpy, 22050, tts_params.response_format)
     
     async def generate_tts_bytes(self, text: str, tts_params: TTSParams) -> bytes:
         audio_numpy = await self._generate_audio(text, tts_params)
-        audio_path = sf.write(tempfile.gettempdir() + '/' + new_uuid() + '.wav', audio_numpy, 22050)[0]
-        with open(audio_path, 'rb') as f:
-            audio_data = f.read()
-        return audio_data
+        # 直接在内存中编码，不经过临时文件
+        return await run_blocking(encode_audio, audio_numpy, 22050, tts_params.response_format)
     
-    async def generate_tts_stream(self, text: str, tts_params: TTSParams) -> bytes:
-        audio_numpy = await self._generate_audio(text, tts_params)
-        audio_path = sf.write(tempfile.gettempdir() + '/' + new_uuid() + '.wav', audio_numpy, 22050)[0]
-        with open(audio_path, 'rb') as f:
-            audio_data = f.read()
-        return audio_data
+    async def generate_tts_stream(self, text: str, tts_params: TTSParams):
+        yield await self.generate_tts_bytes(text, tts_params)